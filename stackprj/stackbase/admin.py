@@ -1,22 +1,61 @@
 from django.contrib import admin
-from .models import Question, Comment, Tag, Category, Report
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from . import caching, deletion, trending
+from .models import Question, Comment, Tag, Category, Report, ExportJob, BlockedWord
 
 admin.site.register(Question)
 admin.site.register(Comment)
 admin.site.register(Tag)
 admin.site.register(Category)
+admin.site.register(ExportJob)
+admin.site.register(BlockedWord)
 
+# The actions below work on whole sets of reports with a constant number of
+# queries, in one transaction, so moderators can clear thousands of reports
+# at once.
+
+def reported_questions(queryset):
+    return Question.objects.filter(pk__in=queryset.values('question_id'))
+
+@transaction.atomic
 def delete_reported_questions(modeladmin, request, queryset):
-    for report in queryset:
-        question = report.question
-        question.delete()
-    modeladmin.message_user(request, f"Deleted {queryset.count()} reported questions.")
+    count = deletion.delete_questions(reported_questions(queryset))
+    modeladmin.message_user(request, f"Deleted {count} reported questions.")
 
 delete_reported_questions.short_description = "Delete reported questions"
 
+@transaction.atomic
+def hide_reported_questions(modeladmin, request, queryset):
+    questions = reported_questions(queryset)
+    # update() sends no signals, so drop the cached pages here
+    caching.invalidate_on_commit(caching.scopes_for_questions(questions.values('pk')))
+    question_ids = list(questions.values_list('pk', flat=True))
+    day_buckets = trending.buckets(question_ids)
+    count = questions.update(hidden=True, date_updated=timezone.now())
+    trending.apply_change(day_buckets, question_ids)
+    modeladmin.message_user(request, f"Hid {count} reported questions.")
+
+hide_reported_questions.short_description = "Hide reported questions"
+
+@transaction.atomic
+def dismiss_reports(modeladmin, request, queryset):
+    count, _ = queryset.delete()
+    modeladmin.message_user(request, f"Dismissed {count} reports.")
+
+dismiss_reports.short_description = "Dismiss selected reports"
+
 class ReportAdmin(admin.ModelAdmin):
     list_display = ['question_title', 'reason', 'reported_question_creation_date']
-    actions = [delete_reported_questions]
+    list_filter = ['reason', 'question__hidden']
+    list_select_related = ['question']
+    actions = [delete_reported_questions, hide_reported_questions, dismiss_reports]
+    change_list_template = 'admin/stackbase/report/change_list.html'
+    summary_per_page = 100
 
     def question_title(self, obj):
         return obj.question.title
@@ -28,6 +67,38 @@ class ReportAdmin(admin.ModelAdmin):
 
     reported_question_creation_date.short_description = 'Reported Question Creation Date'
 
-admin.site.register(Report, ReportAdmin)
+    def get_urls(self):
+        summary = self.admin_site.admin_view(self.summary_view)
+        return [
+            path('summary/', summary, name='stackbase_report_summary'),
+        ] + super().get_urls()
 
+    def summary_view(self, request):
+        """Reports grouped by question, most reported first."""
+        reasons = Report.REASON_CHOICES
+        rows = (
+            Report.objects.values('question_id', 'question__title', 'question__hidden')
+            .annotate(
+                reports=Count('id'),
+                reporters=Count('user', distinct=True),
+                last_reported=Max('created_at'),
+                **{
+                    f'reason_{value}': Count('id', filter=Q(reason=value))
+                    for value, _ in reasons
+                },
+            )
+            .order_by('-reports', '-last_reported')
+        )
+        page = Paginator(rows, self.summary_per_page).get_page(request.GET.get('p'))
+        for row in page:
+            row['reasons'] = [(label, row[f'reason_{value}']) for value, label in reasons]
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Reports by question',
+            'page': page,
+            'reasons': reasons,
+        }
+        return TemplateResponse(request, 'admin/stackbase/report/summary.html', context)
 
+admin.site.register(Report, ReportAdmin)
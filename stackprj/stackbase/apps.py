@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class StackbaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stackbase'
+
+    def ready(self):
+        import stackbase.signals
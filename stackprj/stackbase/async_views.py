@@ -0,0 +1,85 @@
+"""Async versions of the read-heavy views.
+
+Served instead of their sync counterparts in ``stackbase.views`` when
+``ASYNC_VIEWS`` is on, which ``stackprj/asgi.py`` turns on by default, so an
+ASGI worker doesn't tie up a thread per request while a page waits on the
+database or a slow client. Queries go through the async ORM (``aget``,
+``async for``); the lazy ``request.user`` and the leaderboard's cache logic
+are blocking and resolved through ``sync_to_async``. Pages are returned as
+``TemplateResponse`` so Django's handler renders them off the event loop.
+
+The querysets, context and templates are the sync views', so both paths
+serve identical pages (``loadtest`` compares them under WSGI and ASGI).
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from stackusers import leaderboard as ranking
+from . import taxonomy, views
+from .likes import aliked_by
+from .models import Question
+from .pagination import AsyncKeysetPaginationMixin
+from .routers import replica_view
+
+
+@sync_to_async
+def resolve_user(request):
+    # request.user is lazy; its first use reads the session and user tables
+    request.user.is_authenticated
+    return request.user
+
+
+class QuestionListView(AsyncKeysetPaginationMixin, views.QuestionListView):
+    pass
+
+
+class TagQuestionListView(AsyncKeysetPaginationMixin, views.TagQuestionListView):
+    pass
+
+
+class CategoryQuestionListView(AsyncKeysetPaginationMixin, views.CategoryQuestionListView):
+    pass
+
+
+class QuestionDetailView(views.QuestionDetailView):
+    async def get(self, request, *args, **kwargs):
+        user = await resolve_user(request)
+        try:
+            self.object = await self.get_queryset().aget(pk=kwargs["pk"])
+        except Question.DoesNotExist:
+            raise Http404("No question found matching the query")
+        self.liked_ids = await aliked_by(user, self.object)
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+    def get_liked_ids(self):
+        return self.liked_ids
+
+
+async def get_tags(request):
+    # Same responses as views.get_tags, whose decorators are sync-only
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    category_id = request.GET.get("category_id")
+    etag = quote_etag(f"{await taxonomy.acurrent_version()}-{category_id or ''}")
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        tags = await taxonomy.atags_for(category_id)
+        response = JsonResponse([{"id": pk, "name": name} for pk, name in tags], safe=False)
+    response["ETag"] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@replica_view
+async def leaderboard(request):
+    user = await resolve_user(request)
+    page = views.leaderboard_page(request)
+    entries = await sync_to_async(ranking.get_page)(page, views.LEADERBOARD_PER_PAGE)
+    my_rank = None
+    if user.is_authenticated:
+        my_rank = await sync_to_async(ranking.get_rank)(user.id)
+    context = views.leaderboard_context(page, entries, my_rank)
+    return TemplateResponse(request, "stackbase/chart.html", context)
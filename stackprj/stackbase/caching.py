@@ -0,0 +1,200 @@
+"""Page cache for anonymous reads.
+
+Pages are stored in the ``pages`` cache under a key built from the URL and
+the current *generation* of every scope the page depends on, e.g. the
+question detail page depends on ``question:<id>``, a tag page on
+``tag:<slug>`` and ``taxonomy`` (tag and category names). Invalidation never
+deletes pages: the signal handlers in ``stackbase.signals`` bump the generations of
+the scopes a change touches, so only the affected pages miss on their next
+hit and stale entries age out of the cache.
+
+Hits and misses are counted in the cache (``page_cache_stats`` management
+command) and reported per response in the ``X-Cache`` header.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = "pages"
+STATS_KEYS = ("page-stats:hits", "page-stats:misses")
+
+
+def page_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(scope):
+    # Scopes carry tag/category slugs, which may be non-ASCII
+    return "page-gen:" + hashlib.md5(scope.encode()).hexdigest()
+
+
+def get_generations(scopes):
+    cache = page_cache()
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Unknown (or evicted) scope: start a fresh generation
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def invalidate(*scopes):
+    if scopes:
+        now = time.time_ns()
+        page_cache().set_many({_generation_key(scope): now for scope in scopes}, None)
+
+
+def invalidate_on_commit(scopes):
+    # Bumping before the commit would let a concurrent reader cache the old data
+    scopes = list(scopes)
+    if scopes:
+        transaction.on_commit(lambda: invalidate(*scopes))
+
+
+def _count(key):
+    cache = page_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def stats():
+    found = page_cache().get_many(STATS_KEYS)
+    hits, misses = (found.get(key, 0) for key in STATS_KEYS)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    page_cache().delete_many(STATS_KEYS)
+
+
+def _cacheable_request(request):
+    return (
+        getattr(settings, "PAGE_CACHE_ENABLED", True)
+        and request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        # Pending flash messages are rendered into the page
+        and not len(get_messages(request))
+    )
+
+
+def _cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+    )
+
+
+def _page_key(request, scopes):
+    generations = get_generations(scopes)
+    raw = "|".join([request.get_full_path(), *map(str, generations)])
+    return "page:" + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _lookup(key):
+    response = page_cache().get(key)
+    _count(STATS_KEYS[0] if response is not None else STATS_KEYS[1])
+    if response is not None:
+        response["X-Cache"] = "HIT"
+    return response
+
+
+def _store(key, request, response):
+    if hasattr(response, "render") and callable(response.render):
+        response.render()
+    if _cacheable_response(request, response):
+        page_cache().set(key, response, settings.PAGE_CACHE_TIMEOUT)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+def cached_page(scopes):
+    """Cache a view's anonymous responses.
+
+    ``scopes(request, **kwargs)`` returns the invalidation scopes the page
+    depends on. Works on sync and async views, e.g. ``as_view()`` results
+    in the URLconf.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # The session, user and cache lookups are all blocking
+                if not await sync_to_async(_cacheable_request)(request):
+                    return await view(request, *args, **kwargs)
+                key = await sync_to_async(_page_key)(request, scopes(request, **kwargs))
+                response = await sync_to_async(_lookup)(key)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    response = await sync_to_async(_store)(key, request, response)
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable_request(request):
+                return view(request, *args, **kwargs)
+            key = _page_key(request, scopes(request, **kwargs))
+            response = _lookup(key)
+            if response is None:
+                response = _store(key, request, view(request, *args, **kwargs))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# Scopes for the stackbase pages
+def home_scopes(request, **kwargs):
+    return ["home"]
+
+
+def list_scopes(request, **kwargs):
+    if "tag" in kwargs:
+        return ["taxonomy", f"tag:{kwargs['tag']}"]
+    if "category" in kwargs:
+        return ["taxonomy", f"category:{kwargs['category']}"]
+    return ["taxonomy", "lists:all"]
+
+
+def question_scopes(request, **kwargs):
+    return [f"question:{kwargs['pk']}"]
+
+
+def scopes_for_questions(question_ids):
+    """Every page showing one of these questions: its detail page, the main
+    list and the pages of its category and tags."""
+    from .models import Question
+
+    scopes = set()
+    rows = Question.objects.filter(pk__in=question_ids).values_list(
+        "pk", "category__slug", "tags__slug"
+    )
+    for pk, category, tag in rows:
+        scopes.update([f"question:{pk}", "lists:all"])
+        if category:
+            scopes.add(f"category:{category}")
+        if tag:
+            scopes.add(f"tag:{tag}")
+    return scopes
@@ -0,0 +1,107 @@
+"""Stored like and answer counters.
+
+``Question.like_count``, ``Question.comment_count`` and ``Comment.like_count``
+replace the ``likes.count()`` and ``COUNT(*)`` queries the pages used to run.
+The signal handlers in ``stackbase.signals`` keep them exact with ``F()``
+updates, so concurrent likes never overwrite each other, and
+``reconcile_counters`` recounts them from the source tables in case they
+ever drift (e.g. after raw SQL edits).
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Question
+
+LIKE_FIELDS = {
+    Question.likes.through: Question._meta.get_field("likes"),
+    Comment.likes.through: Comment._meta.get_field("likes"),
+}
+
+
+def existing_like_ids(sender, instance, reverse, pk_set=None):
+    """Ids on the other side of a likes relation actually linked to ``instance``."""
+    field = LIKE_FIELDS[sender]
+    source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+    if reverse:
+        source, target = target, source
+    rows = sender.objects.filter(**{source: instance.pk})
+    if pk_set is not None:
+        rows = rows.filter(**{f"{target}__in": pk_set})
+    return set(rows.values_list(target, flat=True))
+
+
+def add(model, field, deltas, key="pk"):
+    """Add ``deltas[value]`` to ``field`` of the ``model`` rows whose ``key``
+    is ``value``, never below zero.
+
+    Rows sharing the same delta are updated together, so a typical event
+    costs a single UPDATE. Also used for the reputation scores
+    (``stackusers.scoring``).
+    """
+    by_delta = defaultdict(list)
+    for value, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(value)
+    for delta, values in by_delta.items():
+        if delta > 0:
+            total = F(field) + delta
+        else:
+            total = Greatest(F(field) + delta, Value(0))
+        model.objects.filter(**{f"{key}__in": values}).update(**{field: total})
+
+
+def likes_changed(sender, instance, reverse, pk_set, delta):
+    model = Question if sender is Question.likes.through else Comment
+    if reverse:
+        # instance is the user, pk_set holds the questions/comments
+        add(model, "like_count", {pk: delta for pk in pk_set})
+    else:
+        add(model, "like_count", {instance.pk: delta * len(pk_set)})
+
+
+def user_deleted(user):
+    # The user's likes go with it, without any m2m_changed signal
+    for model in (Question, Comment):
+        liked = model.likes.through.objects.filter(user_id=user.pk)
+        add(model, "like_count", {pk: -1 for pk in liked.values_list(model._meta.model_name, flat=True)})
+
+
+def comments_changed(question_ids, delta):
+    add(Question, "comment_count", {pk: delta * n for pk, n in Counter(question_ids).items()})
+
+
+def count_rows(queryset, field, outer="pk"):
+    """``COUNT(*)`` of the ``queryset`` rows whose ``field`` matches the outer
+    query's ``outer`` column, 0 when there are none."""
+    counts = (
+        queryset.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def true_counts():
+    """The recounted value of every counter, as ``(model, field, expression)``."""
+    return [
+        (Question, "like_count", count_rows(Question.likes.through.objects.all(), "question")),
+        (Question, "comment_count", count_rows(Comment.objects.all(), "question")),
+        (Comment, "like_count", count_rows(Comment.likes.through.objects.all(), "comment")),
+    ]
+
+
+def reconcile(fix=True):
+    """Recount every counter; returns ``{"Model.field": rows that were off}``."""
+    drift = {}
+    for model, field, expression in true_counts():
+        stale = model.objects.alias(actual=expression).exclude(**{field: F("actual")})
+        label = f"{model.__name__}.{field}"
+        if fix:
+            drift[label] = stale.update(**{field: expression})
+        else:
+            drift[label] = stale.count()
+    return drift
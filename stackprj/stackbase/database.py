@@ -0,0 +1,28 @@
+"""Per-connection database tuning, see the DATABASES notes in settings."""
+from django.conf import settings
+
+# Only with SQLITE_WAL: NORMAL is safe with WAL and fsyncs at checkpoints only
+WAL_PRAGMAS = {"journal_mode": "WAL", "synchronous": "NORMAL"}
+
+
+def use_wal(connection):
+    # journal_mode=WAL is written to the database file and outlives the
+    # connection; leave throwaway test and in-memory databases alone
+    test_name = connection.settings_dict.get("TEST", {}).get("NAME")
+    return (
+        getattr(settings, "SQLITE_WAL", False)
+        and not connection.is_in_memory_db()
+        and not (test_name and connection.settings_dict["NAME"] == test_name)
+    )
+
+
+def apply_sqlite_pragmas(connection):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = dict(getattr(settings, "SQLITE_PRAGMAS", {}))
+    if use_wal(connection):
+        pragmas.update(WAL_PRAGMAS)
+    # On the raw connection: these are setup, not queries made by the request
+    # that happened to open the connection (see stackbase.instrumentation)
+    for name, value in pragmas.items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,50 @@
+"""Deleting many questions at once.
+
+Deleting a question runs the scoring, search, page cache and trending
+receivers for it and for each of its answers, a few queries apiece, and
+keeps the collector from deleting the cascades in bulk. ``delete_questions``
+does the receivers' work once for the whole set, with a constant number of
+queries, and then deletes inside ``bulk_delete()``, which the per-row delete
+receivers check to stand aside.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from stackusers import scoring
+from . import caching, search, trending
+from .models import Question
+
+_state = threading.local()
+
+
+def in_bulk_delete():
+    return getattr(_state, "active", False)
+
+
+@contextmanager
+def bulk_delete():
+    previous = in_bulk_delete()
+    _state.active = True
+    try:
+        yield
+    finally:
+        _state.active = previous
+
+
+@transaction.atomic
+def delete_questions(questions):
+    """Delete ``questions`` with their answers, likes and reports; returns
+    how many questions were deleted."""
+    ids = list(questions.values_list("pk", flat=True))
+    if not ids:
+        return 0
+    selected = Question.objects.filter(pk__in=questions.values("pk"))
+    scoring.questions_deleted(selected.values("pk"))
+    caching.invalidate_on_commit(caching.scopes_for_questions(selected.values("pk")))
+    trending.add({key: -count for key, count in trending.buckets(selected.values("pk")).items()})
+    search.remove_questions(ids)
+    with bulk_delete():
+        deleted = selected.delete()[1]
+    return deleted.get(Question._meta.label, 0)
@@ -0,0 +1,316 @@
+"""CSV export of questions and their comments.
+
+Rows are generated lazily: questions are read in chunks with their author,
+category, tags and comments fetched per chunk, so an export costs a handful
+of queries per ``chunk_size`` questions and never holds the whole file in
+memory.
+
+Large dumps can also run as an ``ExportJob``: the request only enqueues the
+job, and the ``run_export_worker`` management command writes a compressed
+CSV under ``MEDIA_ROOT/exports``. Finished files are reused by later
+requests for the same filter until its questions or comments change or the
+job expires; renaming a user, category or tag counts as a change of the rows
+that show the name (``names_changed``). Each user polls jobs of their own,
+which share the file when somebody else asked for the same export first.
+A worker refreshes ``claimed_at`` while it writes; a running job whose
+worker stopped doing so (it crashed or was killed) is requeued by the next
+``claim_next_job``, and failed after ``EXPORT_JOB_MAX_ATTEMPTS`` claims.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Max, Prefetch, Sum
+from django.utils import timezone
+from django.utils.encoding import smart_str
+
+from .models import Category, Comment, ExportJob, Question, Tag
+from .routers import read_alias, replica_reads
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+EXPORT_HEADER = [
+    "Title",
+    "Content",
+    "Asked By",
+    "Date Asked",
+    "Category",
+    "Tags",
+    "Comment",
+    "Commented By",
+]
+
+CHUNK_SIZE = 500
+
+
+def export_queryset(category=None, tag=None):
+    questions = Question.objects.visible()
+    if category is not None:
+        questions = questions.filter(category=category)
+    elif tag is not None:
+        questions = questions.filter(tags=tag)
+    return (
+        questions.select_related("user", "category")
+        .prefetch_related(
+            "tags",
+            Prefetch(
+                "comment",
+                queryset=Comment.objects.select_related("author").order_by("id"),
+            ),
+        )
+        .order_by("id")
+    )
+
+
+def export_rows(questions, chunk_size=CHUNK_SIZE):
+    """Yield one CSV row per comment, or one per question without comments."""
+    for question in questions.iterator(chunk_size=chunk_size):
+        title = smart_str(question.title)
+        content = smart_str(question.content)
+        asked_by = smart_str(question.user.username)
+        date_asked = question.date_created.strftime("%Y-%m-%d %H:%M:%S")
+        category = smart_str(question.category.name if question.category else "")
+        tags = ", ".join([smart_str(tag.name) for tag in question.tags.all()])
+        row = [title, content, asked_by, date_asked, category, tags]
+
+        comments = question.comment.all()
+        if comments:
+            for comment in comments:
+                yield row + [smart_str(comment.content), smart_str(comment.author_name)]
+        else:
+            yield row + ["", ""]
+
+
+def available_compressions():
+    return ["gzip", "zstd"] if zstandard is not None else ["gzip"]
+
+
+def scope_filter(scope, value):
+    """``export_queryset`` kwargs for a job scope; raises DoesNotExist."""
+    if scope == "category":
+        return {"category": Category.objects.get(slug=value)}
+    if scope == "tag":
+        return {"tag": Tag.objects.get(slug=value)}
+    return {}
+
+
+def artifact_key(scope, value, compression):
+    filters = scope_filter(scope, value)
+    questions = export_queryset(**filters).order_by()
+    # Any question or comment added, edited, hidden or deleted changes one of
+    # these; the id sums tell apart sets that swapped one row for another
+    latest = questions.aggregate(
+        last_date=Max("date_created"),
+        last_id=Max("id"),
+        total=Count("id"),
+        id_sum=Sum("id"),
+        last_edit=Max("date_updated"),
+    )
+    comments = Comment.objects.filter(question__in=questions.values("id")).aggregate(
+        last_comment_id=Max("id"),
+        comments=Count("id"),
+        comment_id_sum=Sum("id"),
+        last_comment_edit=Max("date_updated"),
+    )
+    raw = ":".join(
+        str(part)
+        for part in (scope, value, compression, *latest.values(), *comments.values())
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def names_changed(instance):
+    """Mark the rows showing the name of ``instance`` (a user, category or
+    tag) as edited, so that exports covering them get a new key."""
+    now = timezone.now()
+    if isinstance(instance, Category):
+        Question.objects.filter(category=instance).update(date_updated=now)
+    elif isinstance(instance, Tag):
+        Question.objects.filter(tags=instance).update(date_updated=now)
+    elif isinstance(instance, User):
+        Question.objects.filter(user=instance).update(date_updated=now)
+        Comment.objects.filter(author=instance).update(date_updated=now)
+
+
+def stale_before():
+    """Running jobs claimed (or refreshed) before this have lost their worker."""
+    return timezone.now() - timedelta(seconds=settings.EXPORT_JOB_CLAIM_TIMEOUT)
+
+
+def enqueue_export(scope, value="", compression="gzip", user=None):
+    """Return a job of ``user`` for this export, reusing a live one with the
+    same key, or sharing its file if somebody else requested it."""
+    if scope == "all":
+        value = ""
+    key = artifact_key(scope, value, compression)
+    now = timezone.now()
+    existing = (
+        ExportJob.objects.filter(artifact_key=key, status__in=["pending", "running", "done"])
+        .exclude(status="done", expires_at__lte=now)
+        .exclude(status="running", claimed_at__lt=stale_before())
+        .order_by("-created_at")
+        .first()
+    )
+    if existing is not None and (user is None or existing.requested_by_id == user.pk):
+        return existing
+    job = ExportJob(scope=scope, value=value, compression=compression, artifact_key=key, requested_by=user)
+    if existing is not None and existing.status == "done":
+        job.status = "done"
+        job.file = existing.file.name
+        job.finished_at = now
+        job.expires_at = existing.expires_at
+    # Otherwise a worker picks up the other job's file once it is written
+    job.save()
+    return job
+
+
+def release_stale_jobs():
+    """Requeue running jobs whose worker went away, or fail them once they
+    have used up their attempts. Returns how many were released."""
+    stale = ExportJob.objects.filter(status="running", claimed_at__lt=stale_before())
+    failed = stale.filter(attempts__gte=settings.EXPORT_JOB_MAX_ATTEMPTS).update(
+        status="failed",
+        error="The worker stopped before the export was written.",
+        finished_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=settings.EXPORT_JOB_MAX_ATTEMPTS).update(
+        status="pending", claimed_at=None
+    )
+    return failed + requeued
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None."""
+    release_stale_jobs()
+    while True:
+        job = ExportJob.objects.filter(status="pending").order_by("created_at").first()
+        if job is None:
+            return None
+        # Another worker may have taken it in the meantime
+        now = timezone.now()
+        claimed = ExportJob.objects.filter(pk=job.pk, status="pending").update(
+            status="running", claimed_at=now, attempts=F("attempts") + 1
+        )
+        if claimed:
+            job.status = "running"
+            job.claimed_at = now
+            job.attempts += 1
+            return job
+
+
+def _owned(job):
+    # Still ours unless it was released as stale and claimed again
+    return ExportJob.objects.filter(pk=job.pk, status="running", claimed_at=job.claimed_at)
+
+
+def heartbeat(job):
+    """Refresh the claim on ``job``; False if another worker has taken it over."""
+    now = timezone.now()
+    if not _owned(job).update(claimed_at=now):
+        return False
+    job.claimed_at = now
+    return True
+
+
+class JobReleased(Exception):
+    pass
+
+
+def _open_compressed(raw, compression):
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+    return gzip.GzipFile(fileobj=raw, mode="wb")
+
+
+def shared_artifact(job):
+    """A live file with the same key as ``job``, or None."""
+    return (
+        ExportJob.objects.filter(artifact_key=job.artifact_key, status="done", expires_at__gt=timezone.now())
+        .exclude(file="")
+        .values_list("file", flat=True)
+        .first()
+    )
+
+
+def delete_artifact(job):
+    # Other users' jobs may share the file
+    if job.file and not ExportJob.objects.filter(file=job.file.name).exclude(pk=job.pk).exists():
+        job.file.delete(save=False)
+
+
+def write_artifact(job):
+    shared = shared_artifact(job)
+    if shared is not None:
+        job.file = shared
+        return
+    with replica_reads():
+        # Bound now, the job itself is saved to the primary
+        questions = export_queryset(**scope_filter(job.scope, job.value)).using(read_alias())
+    extension = "zst" if job.compression == "zstd" else "gz"
+    # Check in well within the claim timeout
+    interval = settings.EXPORT_JOB_CLAIM_TIMEOUT / 4
+    checked_in = time.monotonic()
+    with tempfile.TemporaryFile() as raw:
+        with _open_compressed(raw, job.compression) as compressed:
+            text = io.TextIOWrapper(compressed, encoding="utf-8-sig", newline="")
+            writer = csv.writer(text)
+            writer.writerow(EXPORT_HEADER)
+            for row in export_rows(questions):
+                writer.writerow(row)
+                if time.monotonic() - checked_in > interval:
+                    if not heartbeat(job):
+                        raise JobReleased
+                    checked_in = time.monotonic()
+            text.flush()
+            text.detach()
+        raw.seek(0)
+        job.file.save(f"{job.artifact_key}.csv.{extension}", File(raw), save=False)
+
+
+def run_job(job):
+    """Write the job's file and record the outcome. The job is left
+    "running" if it was released as stale before it finished."""
+    try:
+        write_artifact(job)
+    except JobReleased:
+        return job
+    except Exception as exc:
+        job.status = "failed"
+        job.error = str(exc)
+    else:
+        job.status = "done"
+        job.expires_at = timezone.now() + timedelta(seconds=settings.EXPORT_JOB_TTL)
+    job.finished_at = timezone.now()
+    finished = _owned(job).update(
+        status=job.status,
+        error=job.error,
+        file=job.file.name or "",
+        expires_at=job.expires_at,
+        finished_at=job.finished_at,
+    )
+    if not finished:
+        # Released while it ran; the job's new owner writes its own file
+        delete_artifact(job)
+        job.status = "running"
+    return job
+
+
+def purge_expired():
+    """Delete expired artifacts and their jobs."""
+    expired = ExportJob.objects.filter(status="done", expires_at__lte=timezone.now())
+    count = 0
+    for job in expired.iterator():
+        delete_artifact(job)
+        job.delete()
+        count += 1
+    return count
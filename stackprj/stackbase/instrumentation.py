@@ -0,0 +1,202 @@
+"""Per-request profiling: SQL queries, SQL time, template time, response size.
+
+``InstrumentationMiddleware`` (``stackbase.middleware``) opens a
+``RequestStats`` for every request. It counts the queries on every database
+alias through ``execute_wrapper``, fingerprints them (the SQL without its
+parameters, ``IN`` lists collapsed) to spot N+1 patterns, and collects the
+render time of the top-level templates from ``InstrumentedTemplates``, the
+template backend configured in settings.
+
+Each response carries a ``Server-Timing`` header. The figures are also
+aggregated per URL name in this process and served as JSON at ``/_metrics``.
+Views listed in ``QUERY_BUDGETS`` log a warning when a request runs more
+queries than their budget, or raise ``QueryBudgetExceeded`` when
+``QUERY_BUDGET_STRICT`` is on (in the tests, see ``stackbase.testing``).
+"""
+import hashlib
+import logging
+import re
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+# "IN (%s, %s, %s)" and "IN (%s)" are the same statement
+IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+# Latencies kept per view for the percentiles
+SAMPLE_SIZE = 1000
+
+_current = Local()
+_lock = threading.Lock()
+_views = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    return hashlib.md5(IN_LIST_RE.sub("IN (...)", sql).encode()).hexdigest()[:12]
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.url_name = None
+        self.duration = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.response_size = 0
+        self.fingerprints = Counter()
+        self.statements = {}
+        self._stack = ExitStack()
+
+    def start(self):
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self.record_query))
+        _current.stats = self
+        return self
+
+    def stop(self):
+        self._stack.close()
+        if getattr(_current, "stats", None) is self:
+            del _current.stats
+        self.duration = time.perf_counter() - self.started
+
+    def record_query(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - began
+            self.queries += 1
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            self.statements.setdefault(key, sql)
+
+    @property
+    def duplicates(self):
+        """Fingerprints run more than once, with their counts."""
+        return {key: count for key, count in self.fingerprints.items() if count > 1}
+
+    def server_timing(self):
+        elapsed = (time.perf_counter() - self.started) * 1000
+        return ", ".join(
+            [
+                f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+                f"tpl;dur={self.template_time * 1000:.1f}",
+                f"total;dur={elapsed:.1f}",
+            ]
+        )
+
+
+def record_template(seconds):
+    stats = getattr(_current, "stats", None)
+    if stats is not None:
+        stats.template_time += seconds
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        began = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            record_template(time.perf_counter() - began)
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """The Django template backend, timing every top-level render."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def over_budget(stats):
+    """What went over the view's query budget, or None."""
+    budget = getattr(settings, "QUERY_BUDGETS", {}).get(stats.url_name)
+    if budget is None or stats.queries <= budget:
+        return None
+    message = f"{stats.url_name} ran {stats.queries} queries, its budget is {budget}"
+    if stats.duplicates:
+        repeated = max(stats.duplicates, key=stats.duplicates.get)
+        message += f"; repeated {stats.duplicates[repeated]} times: {stats.statements[repeated]}"
+    return message
+
+
+def budget_exceeded(message):
+    if getattr(settings, "QUERY_BUDGET_STRICT", False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def _view_totals():
+    return {
+        "requests": 0,
+        "queries": 0,
+        "max_queries": 0,
+        "sql_time": 0.0,
+        "template_time": 0.0,
+        "response_size": 0,
+        "over_budget": 0,
+        "durations": deque(maxlen=SAMPLE_SIZE),
+        "duplicates": Counter(),
+    }
+
+
+def record(stats, over_budget=False):
+    with _lock:
+        totals = _views.setdefault(stats.url_name, _view_totals())
+        totals["requests"] += 1
+        totals["queries"] += stats.queries
+        totals["max_queries"] = max(totals["max_queries"], stats.queries)
+        totals["sql_time"] += stats.sql_time
+        totals["template_time"] += stats.template_time
+        totals["response_size"] += stats.response_size
+        totals["over_budget"] += over_budget
+        totals["durations"].append(stats.duration)
+        for key, count in stats.duplicates.items():
+            totals["duplicates"][stats.statements[key]] += count
+
+
+def snapshot():
+    """Per URL name averages and latency percentiles, for ``/_metrics``."""
+    views = {}
+    with _lock:
+        for url_name, totals in _views.items():
+            requests = totals["requests"]
+            durations = sorted(totals["durations"])
+            views[url_name] = {
+                "requests": requests,
+                "queries_avg": totals["queries"] / requests,
+                "queries_max": totals["max_queries"],
+                "sql_ms_avg": totals["sql_time"] * 1000 / requests,
+                "template_ms_avg": totals["template_time"] * 1000 / requests,
+                "bytes_avg": totals["response_size"] / requests,
+                "latency_ms_p50": statistics.median(durations) * 1000,
+                "latency_ms_p99": durations[max(int(len(durations) * 0.99) - 1, 0)] * 1000,
+                "over_budget": totals["over_budget"],
+                "budget": getattr(settings, "QUERY_BUDGETS", {}).get(url_name),
+                "duplicate_queries": [
+                    {"sql": sql, "count": count}
+                    for sql, count in totals["duplicates"].most_common(5)
+                ],
+            }
+    return views
+
+
+def reset():
+    with _lock:
+        _views.clear()
@@ -0,0 +1,239 @@
+"""Liking and unliking straight on the likes through tables.
+
+``question.likes.add(user)`` checks which rows already exist, runs the
+``pre_*`` signals (which narrow removals with another query each) and only
+then writes. ``set_like`` writes first, letting the unique constraint on
+``(question, user)`` / ``(comment, user)`` decide whether anything changed,
+and then sends ``post_add``/``post_remove`` with the exact ``pk_set`` so the
+score, counter and page cache receivers run as for a regular ``add()``.
+
+With ``LIKES_WRITE_BEHIND`` on, ``queue_like`` only appends a ``LikeEvent``
+and the ``flush_likes`` command applies the events in batches: repeated
+toggles by the same user collapse into their last state, the through rows
+are inserted and deleted in bulk, and every counter and score gets one
+aggregated delta. Until then ``liked_by`` and the like buttons overlay the
+user's own pending events on the stored state.
+"""
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, router, transaction
+from django.db.models import BooleanField, Exists, OuterRef, Q, Subquery, Value
+from django.db.models.signals import m2m_changed
+
+from stackusers import scoring
+from . import caching, counters
+from .models import Comment, LikeEvent, Question
+
+
+def write_behind():
+    return getattr(settings, "LIKES_WRITE_BEHIND", False)
+
+
+def change_like(obj, user, liked=None):
+    """``set_like``, or ``queue_like`` when likes are written behind."""
+    if write_behind():
+        return queue_like(obj, user, liked)
+    return set_like(obj, user, liked)
+
+
+def set_like(obj, user, liked=None):
+    """Like (``liked=True``) or unlike (``False``) ``obj`` for ``user``.
+
+    ``liked=None`` toggles. Asking for the current state changes nothing,
+    so a repeated request is harmless. Returns ``(liked, like_count)``.
+    """
+    model = type(obj)
+    through = model.likes.through
+    using = router.db_for_write(through, instance=obj)
+    link = {f"{model._meta.model_name}_id": obj.pk, "user_id": user.pk}
+
+    with transaction.atomic(using=using):
+        action = None
+        if liked is not True:
+            deleted, _ = through.objects.using(using).filter(**link).delete()
+            if deleted:
+                action, liked = "post_remove", False
+        if liked is True or (liked is None and action is None):
+            liked = True
+            try:
+                with transaction.atomic(using=using):
+                    through.objects.using(using).create(**link)
+                action = "post_add"
+            except IntegrityError:
+                pass  # already liked
+        if action:
+            m2m_changed.send(
+                sender=through,
+                action=action,
+                instance=obj,
+                reverse=False,
+                model=User,
+                pk_set={user.pk},
+                using=using,
+            )
+        count = model.objects.using(using).filter(pk=obj.pk).values_list("like_count", flat=True).get()
+    return bool(liked), count
+
+
+def queue_like(obj, user, liked=None):
+    """Record that ``user`` likes (or unlikes) ``obj``, for ``flush_likes``.
+
+    Same arguments and result as ``set_like``; the count includes the
+    user's own pending change. Costs two queries whatever the state.
+    """
+    model = type(obj)
+    kind = model._meta.model_name
+    using = router.db_for_write(LikeEvent)
+    link = {f"{kind}_id": OuterRef("pk"), "user_id": user.pk}
+    last_event = LikeEvent.objects.filter(**link).order_by("-id").values("liked")[:1]
+    count, stored, pending = (
+        model.objects.using(using)
+        .filter(pk=obj.pk)
+        .annotate(
+            stored=Exists(model.likes.through.objects.filter(**link)),
+            pending=Subquery(last_event, output_field=BooleanField()),
+        )
+        .values_list("like_count", "stored", "pending")
+        .get()
+    )
+    current = stored if pending is None else pending
+    if liked is None:
+        liked = not current
+    if liked != current:
+        LikeEvent.objects.using(using).create(user=user, liked=liked, **{f"{kind}_id": obj.pk})
+    return bool(liked), max(count + liked - stored, 0)
+
+
+def _apply(model, wanted, using):
+    """Bring the likes of ``model`` to ``{(pk, user_id): liked}``.
+
+    Returns the added and removed ``(pk, user_id)`` pairs.
+    """
+    through = model.likes.through
+    column = f"{model._meta.model_name}_id"
+    existing = set(
+        through.objects.using(using)
+        .filter(**{f"{column}__in": {pk for pk, _ in wanted}}, user_id__in={u for _, u in wanted})
+        .values_list(column, "user_id")
+    )
+    added = [pair for pair, liked in wanted.items() if liked and pair not in existing]
+    removed = [pair for pair, liked in wanted.items() if not liked and pair in existing]
+    through.objects.using(using).bulk_create(
+        [through(**{column: pk, "user_id": user_id}) for pk, user_id in added],
+        ignore_conflicts=True,
+    )
+    if removed:
+        by_object = defaultdict(list)
+        for pk, user_id in removed:
+            by_object[pk].append(user_id)
+        through.objects.using(using).filter(
+            reduce(or_, (Q(**{column: pk, "user_id__in": users}) for pk, users in by_object.items()))
+        ).delete()
+    return added, removed
+
+
+def flush_likes(limit=1000):
+    """Apply the oldest ``limit`` queued like events; returns how many.
+
+    The through tables are written directly, without m2m_changed, so the
+    counters, scores and page cache are updated here, once per batch.
+    Run a single flusher: the events of one user must be applied in order.
+    """
+    using = router.db_for_write(LikeEvent)
+    with transaction.atomic(using=using):
+        events = list(
+            LikeEvent.objects.using(using)
+            .select_for_update()
+            .order_by("id")
+            .values_list("id", "user_id", "question_id", "comment_id", "liked")[:limit]
+        )
+        # The last event of each user on each object wins
+        wanted = {Question: {}, Comment: {}}
+        for _, user_id, question_id, comment_id, liked in events:
+            if question_id is not None:
+                wanted[Question][question_id, user_id] = liked
+            else:
+                wanted[Comment][comment_id, user_id] = liked
+
+        scores = Counter()
+        changed = {}
+        for model, pairs in wanted.items():
+            if not pairs:
+                continue
+            added, removed = _apply(model, pairs, using)
+            likes = Counter(pk for pk, _ in added)
+            likes.subtract(pk for pk, _ in removed)
+            counters.add(model, "like_count", likes)
+            scores.update(user_id for _, user_id in added)
+            scores.subtract(user_id for _, user_id in removed)
+            changed[model] = {pk for pk, _ in added + removed}
+        scoring.apply_deltas(scores)
+
+        # Lists show the like count of questions, only detail pages that of answers
+        caching.invalidate_on_commit(caching.scopes_for_questions(changed.get(Question, ())))
+        if changed.get(Comment):
+            question_ids = Comment.objects.using(using).filter(pk__in=changed[Comment])
+            caching.invalidate_on_commit(
+                f"question:{pk}" for pk in set(question_ids.values_list("question_id", flat=True))
+            )
+
+        LikeEvent.objects.using(using).filter(pk__in=[event[0] for event in events]).delete()
+    return len(events)
+
+
+def _liked_rows(user, question):
+    # Rows of (id, event id, liked, kind); stored likes have event id 0, so
+    # they sort before the pending events. Fields before expressions: the
+    # order the SQL of each part of the union selects them in.
+    stored = (Value(0), Value(True, output_field=BooleanField()))
+    questions = Question.likes.through.objects.filter(user_id=user.pk, question_id=question.pk)
+    comments = Comment.likes.through.objects.filter(user_id=user.pk, comment__question_id=question.pk)
+    events = LikeEvent.objects.filter(user_id=user.pk)
+    question_events = events.filter(question_id=question.pk)
+    comment_events = events.filter(comment__question_id=question.pk)
+    return questions.values_list("question_id", *stored, Value("question")).union(
+        comments.values_list("comment_id", *stored, Value("comment")),
+        question_events.values_list("question_id", "id", "liked", Value("question")),
+        comment_events.values_list("comment_id", "id", "liked", Value("comment")),
+        all=True,
+    )
+
+
+def _overlay(rows):
+    liked = {"question": set(), "comment": set()}
+    pending = {}
+    for pk, event_id, state, kind in sorted(rows, key=lambda row: row[1]):
+        if event_id:
+            pending[kind, pk] = bool(state)
+        else:
+            liked[kind].add(pk)
+    # Count changes the flusher hasn't applied yet
+    liked["pending"] = {"question": {}, "comment": {}}
+    for (kind, pk), state in pending.items():
+        if state != (pk in liked[kind]):
+            liked["pending"][kind][pk] = 1 if state else -1
+            if state:
+                liked[kind].add(pk)
+            else:
+                liked[kind].discard(pk)
+    return liked
+
+
+def liked_by(user, question):
+    """What ``user`` liked on the detail page of ``question``, in one query.
+
+    Returns ``{"question": {ids}, "comment": {ids}, "pending": {...}}``,
+    pending events included; ``pending`` maps ``"question"`` and
+    ``"comment"`` to ``{id: +1 or -1}``, the like count changes still queued.
+    """
+    rows = _liked_rows(user, question) if user.is_authenticated else []
+    return _overlay(rows)
+
+
+async def aliked_by(user, question):
+    rows = [row async for row in _liked_rows(user, question)] if user.is_authenticated else []
+    return _overlay(rows)
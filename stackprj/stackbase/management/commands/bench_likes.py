@@ -0,0 +1,100 @@
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from stackbase.likes import flush_likes, write_behind
+from stackbase.models import Question
+
+USERNAME = "bench-likes-{}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer the like toggle from concurrent clients against the configured "
+        "database and report throughput, latency, errors and counter drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=100, help="Per thread.")
+        parser.add_argument("--keep", action="store_true", help="Keep the bench users and question.")
+
+    def handle(self, *args, **options):
+        threads, per_thread = options["threads"], options["requests"]
+        users = [
+            User.objects.get_or_create(username=USERNAME.format(i))[0] for i in range(threads)
+        ]
+        question = Question.objects.create(
+            user=users[0], title="Like benchmark", content="<p>Like me, concurrently.</p>"
+        )
+        url = reverse("stackbase:question-like", args=[question.pk])
+        self.stdout.write(
+            f"{connection.vendor}: {threads} threads x {per_thread} toggles on question {question.pk}"
+        )
+
+        latencies, errors = [], Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(threads + 1)
+
+        def worker(user):
+            client = Client(SERVER_NAME="localhost")
+            client.force_login(user)
+            mine, failed = [], Counter()
+            start.wait()
+            for _ in range(per_thread):
+                began = time.perf_counter()
+                try:
+                    response = client.post(url)
+                    if response.status_code != 200:
+                        failed[f"HTTP {response.status_code}"] += 1
+                except Exception as exc:  # e.g. OperationalError: database is locked
+                    failed[f"{type(exc).__name__}: {exc}"] += 1
+                mine.append(time.perf_counter() - began)
+            with lock:
+                latencies.extend(mine)
+                errors.update(failed)
+            connections.close_all()
+
+        pool = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in pool:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        latencies.sort()
+        total = len(latencies)
+        self.stdout.write(f"{total} requests in {elapsed:.2f}s, {total / elapsed:.0f} req/s")
+        self.stdout.write(
+            "latency ms: p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  max {:.1f}".format(
+                statistics.median(latencies) * 1000,
+                latencies[int(total * 0.95) - 1] * 1000,
+                latencies[int(total * 0.99) - 1] * 1000,
+                latencies[-1] * 1000,
+            )
+        )
+        for error, count in errors.most_common():
+            self.stdout.write(self.style.ERROR(f"{count} x {error}"))
+
+        if write_behind():
+            began, events = time.perf_counter(), 0
+            while flushed := flush_likes():
+                events += flushed
+            self.stdout.write(f"flushed {events} like events in {time.perf_counter() - began:.2f}s")
+        question.refresh_from_db()
+        actual = question.likes.count()
+        drift = "" if actual == question.like_count else f" (stored {question.like_count})"
+        self.stdout.write(f"likes: {actual}{drift}")
+
+        if not options["keep"]:
+            question.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
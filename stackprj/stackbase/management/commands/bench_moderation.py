@@ -0,0 +1,53 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from stackbase import moderation
+from stackbase.models import BlockedWord
+
+
+def legacy_is_valid_text(text, blacklist_words):
+    # The original implementation: one lower() and one scan per word
+    for word in blacklist_words:
+        if word.lower() in text.lower():
+            return False
+    if len(text) < 10:
+        return False
+    return True
+
+
+def rich_text(paragraphs):
+    paragraph = (
+        '<p>How do I <strong>configure</strong> the <a href="https://example.com/docs">'
+        "router</a> so that reads go to the replica?</p>\n"
+        "<pre><code>DATABASE_ROUTERS = ['stackprj.routers.Router']</code></pre>\n"
+        "<ul><li>First item</li><li>Second item with &amp; entity</li></ul>\n"
+    )
+    return paragraph * paragraphs
+
+
+class Command(BaseCommand):
+    help = "Compare the compiled moderation filter with the old per-word scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1, 10, 100, 1000],
+            help="Number of rich-text paragraphs per input.",
+        )
+
+    def handle(self, *args, **options):
+        words = list(BlockedWord.objects.values_list("word", flat=True))
+        moderation.get_pattern()  # compile outside the timings
+        repeat = options["repeat"]
+
+        self.stdout.write(f"{len(words)} blocked words, {repeat} runs per input")
+        self.stdout.write(f"{'chars':>10} {'legacy ms':>12} {'compiled ms':>12} {'speedup':>8}")
+        for size in options["sizes"]:
+            text = rich_text(size)
+            legacy = timeit.timeit(lambda: legacy_is_valid_text(text, words), number=repeat)
+            compiled = timeit.timeit(lambda: moderation.is_valid_text(text), number=repeat)
+            self.stdout.write(
+                f"{len(text):>10} {legacy / repeat * 1000:>12.3f} "
+                f"{compiled / repeat * 1000:>12.3f} {legacy / compiled:>7.1f}x"
+            )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from stackbase.likes import flush_likes
+
+
+class Command(BaseCommand):
+    help = "Apply the queued like events (LIKES_WRITE_BEHIND) in batches. Run one at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue once and exit instead of polling.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the queue is empty.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while flushed := flush_likes(options["batch_size"]):
+                total += flushed
+            if total:
+                self.stdout.write(f"Applied {total} like events.")
+
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,212 @@
+import random
+import time
+from datetime import timedelta
+from functools import lru_cache
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from stackbase import caching, counters, search, taxonomy, trending
+from stackbase.models import Category, Comment, Question, Tag
+from stackusers import leaderboard
+from stackusers.models import Profile
+from stackusers.scoring import recompute_scores
+
+USERNAME = "synthetic-{}"
+
+WORDS = (
+    "django python query index cache database migration template view model "
+    "serializer middleware signal admin form field queryset join select async "
+    "worker deploy docker postgres sqlite redis session login token upload "
+    "image test fixture benchmark profile latency memory thread process"
+).split()
+
+
+@lru_cache(maxsize=16)
+def zipf_weights(count, exponent):
+    """Cumulative weights of ranks 1..count under Zipf's law."""
+    return list(accumulate(1 / rank**exponent for rank in range(1, count + 1)))
+
+
+def processed(obj):
+    # bulk_create skips save(), which sanitizes the content and fills the text fields
+    obj.process_content()
+    return obj
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic dataset for benchmarking (see "
+        "run_benchmarks). Tags, categories, askers and the questions that get "
+        "answers and likes follow Zipf distributions; rows are written with "
+        "bulk_create and the counters, scores and search index are rebuilt "
+        "afterwards. E.g. --users 100000 --questions 1000000 --comments 5000000 "
+        "--likes 5000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--questions", type=int, default=10000)
+        parser.add_argument("--comments", type=int, default=50000)
+        parser.add_argument("--likes", type=int, default=50000, help="Question likes; as many comment likes again.")
+        parser.add_argument("--categories", type=int, default=30)
+        parser.add_argument("--tags", type=int, default=500)
+        parser.add_argument("--days", type=int, default=365, help="Spread the questions over this many days.")
+        parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username=USERNAME.format(0)).exists():
+            raise CommandError("The database already holds a synthetic dataset.")
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.exponent = options["zipf"]
+        self.now = timezone.now()
+
+        self.step("users", self.create_users, options["users"])
+        self.step("taxonomy", self.create_taxonomy, options["categories"], options["tags"])
+        self.step("questions", self.create_questions, options["questions"], options["days"])
+        self.step("comments", self.create_comments, options["comments"])
+        self.step("likes", self.create_likes, options["likes"])
+        self.step("counters and scores", self.rebuild)
+        self.step("search index", self.index)
+
+    def step(self, name, func, *args):
+        began = time.perf_counter()
+        func(*args)
+        self.stdout.write(f"{name}: {time.perf_counter() - began:.1f}s")
+
+    def bulk_create(self, model, rows, **kwargs):
+        """Insert the ``rows`` iterable batch by batch; returns the new pks."""
+        pks = []
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                pks += [obj.pk for obj in model.objects.bulk_create(batch, **kwargs)]
+        return pks
+
+    def zipf_choices(self, population, count):
+        return self.rng.choices(population, cum_weights=zipf_weights(len(population), self.exponent), k=count)
+
+    def sentence(self, words):
+        return " ".join(self.rng.choices(WORDS, k=words))
+
+    def create_users(self, count):
+        # Hashing is the slow part of create_user; everybody shares one
+        password = make_password("synthetic")
+        usernames = [USERNAME.format(i) for i in range(count)]
+        user_ids = self.bulk_create(User, (User(username=name, password=password) for name in usernames))
+        self.usernames = dict(zip(user_ids, usernames))
+        # bulk_create sends no post_save, so no profiles either
+        self.bulk_create(Profile, (Profile(user_id=pk) for pk in user_ids))
+        # Shuffled so the busiest askers aren't simply the oldest accounts
+        self.user_ids = user_ids
+        self.rng.shuffle(self.user_ids)
+
+    def create_taxonomy(self, categories, tags):
+        # Named after their rank, so slugs are unique without lookups
+        self.category_ids = self.bulk_create(
+            Category, (Category(name=f"Category {i}", slug=f"category-{i}") for i in range(categories))
+        )
+        self.tag_ids = self.bulk_create(Tag, (Tag(name=f"tag{i}", slug=f"tag{i}") for i in range(tags)))
+        links = {
+            (category_id, tag_id)
+            for category_id in self.category_ids
+            for tag_id in self.zipf_choices(self.tag_ids, 20)
+        }
+        through = Category.tags.through
+        self.bulk_create(through, (through(category_id=c, tag_id=t) for c, t in links))
+
+    def create_questions(self, count, days):
+        askers = self.zipf_choices(self.user_ids, count)
+        categories = self.zipf_choices(self.category_ids, count)
+        # Oldest first, so ids and dates grow together
+        ages = sorted((self.rng.random() * days * 86400 for _ in range(count)), reverse=True)
+        dates = [self.now - timedelta(seconds=age) for age in ages]
+        questions = (
+            Question(
+                user_id=user_id,
+                title=self.sentence(8).capitalize() + "?",
+                content=f"<p>{self.sentence(40)}</p>\n<p>{self.sentence(25)}</p>",
+                category_id=category_id,
+                date_created=date,
+            )
+            for user_id, category_id, date in zip(askers, categories, dates)
+        )
+        self.question_ids = self.bulk_create(Question, map(processed, questions))
+        self.question_dates = dict(zip(self.question_ids, dates))
+
+        through = Question.tags.through
+        links = (
+            through(question_id=question_id, tag_id=tag_id)
+            for question_id in self.question_ids
+            for tag_id in set(self.zipf_choices(self.tag_ids, self.rng.randint(1, 3)))
+        )
+        self.bulk_create(through, links)
+
+    def popular_questions(self, count):
+        # Popularity is unrelated to age
+        if not hasattr(self, "by_popularity"):
+            self.by_popularity = self.question_ids[:]
+            self.rng.shuffle(self.by_popularity)
+        return self.zipf_choices(self.by_popularity, count)
+
+    def create_comments(self, count):
+        authors = self.zipf_choices(self.user_ids, count)
+        comments = (
+            Comment(
+                question_id=question_id,
+                author_id=author_id,
+                name=self.usernames[author_id],
+                content=f"<p>{self.sentence(30)}</p>",
+                date_created=self.question_dates[question_id]
+                + (self.now - self.question_dates[question_id]) * self.rng.random(),
+            )
+            for question_id, author_id in zip(self.popular_questions(count), authors)
+        )
+        self.comment_ids = self.bulk_create(Comment, map(processed, comments))
+
+    def create_likes(self, count):
+        likers = self.zipf_choices(self.user_ids, count)
+        question_likes = set(zip(self.popular_questions(count), likers))
+        through = Question.likes.through
+        self.bulk_create(
+            through,
+            (through(question_id=q, user_id=u) for q, u in question_likes),
+            ignore_conflicts=True,
+        )
+
+        likers = self.zipf_choices(self.user_ids, count)
+        comments = self.zipf_choices(self.comment_ids, count) if self.comment_ids else []
+        through = Comment.likes.through
+        self.bulk_create(
+            through,
+            (through(comment_id=c, user_id=u) for c, u in set(zip(comments, likers))),
+            ignore_conflicts=True,
+        )
+
+    def rebuild(self):
+        # Everything the skipped signal handlers would have maintained
+        counters.reconcile(fix=True)
+        recompute_scores()
+        leaderboard.invalidate()
+        taxonomy.invalidate()
+        trending.rebuild()
+        caching.page_cache().clear()
+
+    def index(self):
+        backend = search.get_backend()
+        rows = Question.objects.values_list("id", "title", "content_text")
+        for batch in batched(self.question_ids, self.batch_size):
+            with transaction.atomic():
+                backend.index(rows.filter(pk__range=(batch[0], batch[-1])))
@@ -0,0 +1,112 @@
+import http.client
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from stackbase.models import Category, Question, Tag
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the read-heavy pages against running servers, e.g. "
+        "`gunicorn stackprj.wsgi` and `uvicorn stackprj.asgi:application`, and "
+        "report throughput, latency and errors per server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "targets", nargs="+", metavar="URL", help="Base URL of each server, e.g. http://127.0.0.1:8000"
+        )
+        parser.add_argument("--concurrency", type=int, default=32, help="Open connections per server.")
+        parser.add_argument("--requests", type=int, default=2000, help="Per server.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def sample_paths(self, count, rng):
+        # Weighted like real traffic: mostly lists and question pages
+        lists = [reverse("stackbase:question-lists")]
+        lists += [f"{lists[0]}?tab={tab}" for tab in ("liked", "answered", "week")]
+        lists += [
+            reverse("stackbase:tag-question-lists", args=[slug])
+            for slug in Tag.objects.values_list("slug", flat=True)[:20]
+        ]
+        lists += [
+            reverse("stackbase:category-question-lists", args=[slug])
+            for slug in Category.objects.values_list("slug", flat=True)[:20]
+        ]
+        details = [
+            reverse("stackbase:question-detail", args=[pk])
+            for pk in Question.objects.order_by("-like_count").values_list("pk", flat=True)[:200]
+        ]
+        tags = [
+            f"{reverse('stackbase:get_tags')}?category_id={pk}"
+            for pk in Category.objects.values_list("pk", flat=True)[:20]
+        ]
+        pools = [(lists, 4), (details or lists, 4), (tags or lists, 1), ([reverse("stackbase:leaderboard")], 1)]
+        return [
+            rng.choice(rng.choices([pool for pool, _ in pools], [weight for _, weight in pools])[0])
+            for _ in range(count)
+        ]
+
+    def run(self, target, paths, concurrency):
+        url = urlsplit(target)
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        queue = iter(paths)
+        lock = threading.Lock()
+        latencies, errors = [], Counter()
+
+        def worker():
+            connection = connection_class(url.netloc, timeout=30)
+            mine, failed = [], Counter()
+            while True:
+                with lock:
+                    path = next(queue, None)
+                if path is None:
+                    break
+                began = time.perf_counter()
+                try:
+                    connection.request("GET", url.path.rstrip("/") + path)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        failed[f"HTTP {response.status}"] += 1
+                except (OSError, http.client.HTTPException) as exc:
+                    failed[f"{type(exc).__name__}: {exc}"] += 1
+                    connection.close()
+                mine.append(time.perf_counter() - began)
+            connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors.update(failed)
+
+        pool = [threading.Thread(target=worker) for _ in range(concurrency)]
+        began = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        return time.perf_counter() - began, sorted(latencies), errors
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        paths = self.sample_paths(options["requests"], rng)
+        for target in options["targets"]:
+            elapsed, latencies, errors = self.run(target, paths, options["concurrency"])
+            total = len(latencies)
+            self.stdout.write(
+                "{}: {} requests in {:.2f}s, {:.0f} req/s, latency ms p50 {:.1f}  p99 {:.1f}".format(
+                    target,
+                    total,
+                    elapsed,
+                    total / elapsed,
+                    statistics.median(latencies) * 1000,
+                    latencies[max(int(total * 0.99) - 1, 0)] * 1000,
+                )
+            )
+            for error, count in errors.most_common():
+                self.stdout.write(self.style.ERROR(f"  {count} x {error}"))
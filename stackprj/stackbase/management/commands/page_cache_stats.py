@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from stackbase import caching
+
+
+class Command(BaseCommand):
+    help = "Show the hit ratio of the anonymous page cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the counters afterwards.")
+
+    def handle(self, *args, **options):
+        stats = caching.stats()
+        self.stdout.write(
+            f"hits: {stats['hits']}  misses: {stats['misses']}  "
+            f"hit ratio: {stats['hit_ratio']:.1%}"
+        )
+        if options["reset"]:
+            caching.reset_stats()
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from stackbase.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recount the stored like and answer counters from the source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true", help="Only report drifted counters, don't fix them."
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = reconcile(fix=not options["check"])
+        for label, rows in drift.items():
+            self.stdout.write(f"{label}: {rows} rows off")
+        if options["check"]:
+            return
+        self.stdout.write(self.style.SUCCESS("Counters reconciled."))
@@ -0,0 +1,175 @@
+import json
+import platform
+import statistics
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from stackbase import instrumentation
+from stackbase.models import Category, Comment, Question, Tag
+from stackusers.models import Profile
+
+
+DETAIL_RANK = 100
+
+
+class Rollback(Exception):
+    pass
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main pages against the current database (e.g. one filled by "
+        "generate_data), count their queries and write the results as JSON. "
+        "Writes are rolled back, so runs are repeatable; --compare prints the "
+        "change against an earlier results file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per scenario.")
+        parser.add_argument("--output", default="benchmark.json")
+        parser.add_argument("--compare", metavar="JSON", help="Earlier results to compare with.")
+        parser.add_argument("--host", default="localhost", help="Must be in ALLOWED_HOSTS.")
+        parser.add_argument(
+            "--page-cache", action="store_true", help="Leave the anonymous page cache on."
+        )
+
+    def handle(self, *args, **options):
+        questions = Question.objects.order_by("-like_count", "-id")
+        # Popular but not the very top of the Zipf tail, whose thousands of
+        # answers would dominate every detail timing
+        question = questions[DETAIL_RANK : DETAIL_RANK + 1].first() or questions.first()
+        if question is None:
+            raise CommandError("No questions to benchmark, run generate_data first.")
+        self.repeat = options["repeat"]
+        self.client = Client(SERVER_NAME=options["host"])
+        self.user_client = Client(SERVER_NAME=options["host"])
+        self.user_client.force_login(Profile.objects.order_by("-score").first().user)
+
+        with override_settings(PAGE_CACHE_ENABLED=options["page_cache"], QUERY_BUDGET_STRICT=False):
+            results = {name: self.measure(*scenario) for name, scenario in self.scenarios(question).items()}
+
+        report = {
+            "commit": git_commit(),
+            "date": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "page_cache": options["page_cache"],
+            "repeat": self.repeat,
+            "dataset": {
+                model.__name__: model.objects.count() for model in (Question, Comment, Tag, Category, Profile)
+            },
+            "results": results,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+
+        previous = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                previous = json.load(f)["results"]
+        self.print_results(results, previous)
+        self.stdout.write(f"Results written to {options['output']}")
+
+    def scenarios(self, question):
+        """name -> (client, method, url, data)"""
+        tag = Tag.objects.annotate(uses=Count("question")).order_by("-uses").first()
+        # A mid-sized category keeps the export run bounded
+        categories = list(Category.objects.annotate(uses=Count("question")).order_by("-uses"))
+        category = categories[len(categories) // 2] if categories else None
+        lists = reverse("stackbase:question-lists")
+        word = question.title.split()[0].strip("?")
+        scenarios = {
+            "list": (self.client, "get", lists, {}),
+            "list_most_liked": (self.client, "get", lists, {"tab": "liked"}),
+            "list_this_week": (self.client, "get", lists, {"tab": "week"}),
+            "window_counts": (self.client, "get", reverse("stackbase:question-windows"), {}),
+            "list_json": (self.client, "get", lists, {"format": "json"}),
+            "search": (self.client, "get", lists, {"search-bar": word}),
+            "detail": (self.client, "get", question.get_absolute_url(), {}),
+            "detail_logged_in": (self.user_client, "get", question.get_absolute_url(), {}),
+            "leaderboard": (self.client, "get", reverse("stackbase:leaderboard"), {}),
+            "leaderboard_deep": (self.client, "get", reverse("stackbase:leaderboard"), {"page": 20}),
+            "like": (self.user_client, "post", reverse("stackbase:question-like", args=[question.pk]), {}),
+            "comment": (
+                self.user_client,
+                "post",
+                reverse("stackbase:question-comment", args=[question.pk]),
+                {"content": "<p>A benchmark answer, rolled back afterwards.</p>"},
+            ),
+        }
+        if tag is not None:
+            scenarios["tag_list"] = (self.client, "get", reverse("stackbase:tag-question-lists", args=[tag.slug]), {})
+        if category is not None:
+            scenarios["category_list"] = (
+                self.client, "get", reverse("stackbase:category-question-lists", args=[category.slug]), {}
+            )
+            scenarios["export"] = (
+                self.client, "get", reverse("stackbase:export-data-category", args=[category.slug]), {}
+            )
+        return scenarios
+
+    def request(self, client, method, url, data):
+        stats = instrumentation.RequestStats().start()
+        try:
+            response = getattr(client, method)(url, data)
+            size = (
+                sum(len(chunk) for chunk in response.streaming_content)
+                if response.streaming
+                else len(response.content)
+            )
+        finally:
+            stats.stop()
+        if response.status_code >= 400:
+            raise CommandError(f"{method.upper()} {url} returned {response.status_code}")
+        return stats.duration, stats.queries, size
+
+    def measure(self, client, method, url, data):
+        runs = []
+        try:
+            # Writes (likes, answers) are undone so every run sees the same data
+            with transaction.atomic():
+                self.request(client, method, url, data)  # warm-up
+                for _ in range(self.repeat):
+                    runs.append(self.request(client, method, url, data))
+                raise Rollback
+        except Rollback:
+            pass
+        durations = sorted(duration * 1000 for duration, _, _ in runs)
+        return {
+            "ms_min": durations[0],
+            "ms_median": statistics.median(durations),
+            "ms_p95": durations[max(int(len(durations) * 0.95) - 1, 0)],
+            "queries": max(queries for _, queries, _ in runs),
+            "bytes": runs[-1][2],
+        }
+
+    def print_results(self, results, previous=None):
+        self.stdout.write(f"{'scenario':<18} {'median ms':>10} {'p95 ms':>9} {'queries':>8} {'bytes':>10}")
+        for name, result in results.items():
+            line = (
+                f"{name:<18} {result['ms_median']:>10.2f} {result['ms_p95']:>9.2f} "
+                f"{result['queries']:>8} {result['bytes']:>10}"
+            )
+            before = (previous or {}).get(name)
+            if before:
+                change = result["ms_median"] / before["ms_median"] - 1
+                line += f"  {change:+.0%}"
+                if result["queries"] != before["queries"]:
+                    line += f", queries {before['queries']} -> {result['queries']}"
+            self.stdout.write(line)
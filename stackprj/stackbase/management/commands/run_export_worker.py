@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from stackbase.exports import claim_next_job, purge_expired, run_job
+
+
+class Command(BaseCommand):
+    help = "Process queued export jobs and purge expired export files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue once and exit instead of polling.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_expired()
+            if purged:
+                self.stdout.write(f"Purged {purged} expired exports.")
+
+            job = claim_next_job()
+            while job is not None:
+                run_job(job)
+                if job.status == "done":
+                    self.stdout.write(self.style.SUCCESS(f"Export {job.pk} written to {job.file.name}."))
+                elif job.status == "failed":
+                    self.stderr.write(f"Export {job.pk} failed: {job.error}")
+                else:
+                    self.stderr.write(f"Export {job.pk} was taken over by another worker.")
+                job = claim_next_job()
+
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,77 @@
+from django.conf import settings
+
+from . import instrumentation, routers
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class InstrumentationMiddleware:
+    """Profile every request, see stackbase.instrumentation."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "INSTRUMENTATION_ENABLED", True):
+            return self.get_response(request)
+        stats = instrumentation.RequestStats().start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            stats.stop()
+            raise
+        match = request.resolver_match
+        stats.url_name = match.view_name if match else "unresolved"
+        response["Server-Timing"] = stats.server_timing()
+        if response.streaming and not response.is_async:
+            # The body, and the queries that build it, come after we return
+            response.streaming_content = self.stream(stats, response.streaming_content)
+        else:
+            if not response.streaming:
+                stats.response_size = len(response.content)
+            self.finish(stats)
+        return response
+
+    def stream(self, stats, content):
+        try:
+            for chunk in content:
+                stats.response_size += len(chunk)
+                yield chunk
+        finally:
+            self.finish(stats)
+
+    def finish(self, stats):
+        stats.stop()
+        message = instrumentation.over_budget(stats)
+        instrumentation.record(stats, over_budget=message is not None)
+        if message:
+            instrumentation.budget_exceeded(message)
+
+
+class ReplicaMiddleware:
+    """Serve replica views from the replica, see stackbase.routers."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with routers.replica_reads(False):
+            response = self.get_response(request)
+        if request.method not in SAFE_METHODS and routers.replica_enabled():
+            # Read your own writes until the replica has caught up
+            response.set_cookie(
+                routers.STICKY_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ("GET", "HEAD")
+            and routers.STICKY_COOKIE not in request.COOKIES
+            and routers.is_replica_view(view_func)
+        ):
+            routers.use_replica()
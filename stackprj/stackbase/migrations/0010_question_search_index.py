@@ -0,0 +1,75 @@
+import html
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# Copied from stackbase.search as it was when this migration was written;
+# migrations must not change when the app code does
+BATCH_SIZE = 500
+
+
+def plain_text(value):
+    return " ".join(html.unescape(strip_tags(value or "")).split())
+
+
+def index_rows(connection, rows):
+    rows = [(pk, plain_text(title), plain_text(content)) for pk, title, content in rows]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.executemany(
+                "INSERT INTO stackbase_question_fts (rowid, title, content) VALUES (%s, %s, %s)",
+                rows,
+            )
+        else:
+            cursor.executemany(
+                "UPDATE stackbase_question SET search_vector = "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'B') WHERE id = %s",
+                [(title, content, pk) for pk, title, content in rows],
+            )
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE stackbase_question_fts USING fts5("
+            "title, content, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif connection.vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE stackbase_question ADD COLUMN search_vector tsvector")
+        schema_editor.execute(
+            "CREATE INDEX stackbase_question_search_vector ON stackbase_question "
+            "USING GIN (search_vector)"
+        )
+    else:
+        return
+
+    Question = apps.get_model("stackbase", "Question")
+    rows = Question.objects.using(connection.alias).values_list("id", "title", "content")
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            index_rows(connection, batch)
+            batch = []
+    index_rows(connection, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE stackbase_question_fts")
+    elif connection.vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE stackbase_question DROP COLUMN search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stackbase', '0009_report'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+# The list is_valid_text() used to hard-code
+INITIAL_WORDS = [
+    "fuck", "bitch", "whore", "asshole", "shit", "bastard", "cunt", "dick",
+    "pussy", "cock", "retard", "slut", "wanker", "jerk", "prick", "twat",
+    "douche", "douchebag", "moron", "idiot", "dumbass", "dipshit",
+    "motherfucker", "sonofabitch", "bullshit", "crap", "arse", "bollocks",
+    "frick", "tits", "boobs",
+]
+
+
+def add_initial_words(apps, schema_editor):
+    BlockedWord = apps.get_model("stackbase", "BlockedWord")
+    BlockedWord.objects.using(schema_editor.connection.alias).bulk_create([BlockedWord(word=word) for word in INITIAL_WORDS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stackbase", "0011_exportjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BlockedWord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("word", models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.RunPython(add_initial_words, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:53
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, field):
+    counts = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def count_existing(apps, schema_editor):
+    Question = apps.get_model("stackbase", "Question")
+    Comment = apps.get_model("stackbase", "Comment")
+    db = schema_editor.connection.alias
+    Question.objects.using(db).update(
+        like_count=_count(Question.likes.through.objects.all(), "question"),
+        comment_count=_count(Comment.objects.all(), "question"),
+    )
+    Comment.objects.using(db).update(
+        like_count=_count(Comment.likes.through.objects.all(), "comment"),
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stackbase", "0012_blockedword"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="comment_count",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="like_count",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
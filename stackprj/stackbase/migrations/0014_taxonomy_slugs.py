@@ -0,0 +1,72 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:57
+
+from django.db import migrations, models
+from django.utils.text import slugify
+import django.utils.timezone
+
+
+def fill_slugs(apps, schema_editor):
+    for model_name in ("Category", "Tag"):
+        model = apps.get_model("stackbase", model_name)
+        taken = set()
+        rows = list(model.objects.using(schema_editor.connection.alias).order_by("id"))
+        for row in rows:
+            base = slugify(row.name, allow_unicode=True)[:90] or model_name.lower()
+            slug, n = base, 1
+            while slug in taken:
+                n += 1
+                slug = f"{base}-{n}"
+            taken.add(slug)
+            row.slug = slug
+        model.objects.using(schema_editor.connection.alias).bulk_update(rows, ["slug"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stackbase", "0013_question_counters"),
+    ]
+
+    operations = [
+        # Added without the unique constraint, filled in, then made unique
+        migrations.AddField(
+            model_name="category",
+            name="slug",
+            field=models.SlugField(allow_unicode=True, blank=True, max_length=100, default=""),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="slug",
+            field=models.SlugField(allow_unicode=True, blank=True, max_length=100, default=""),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="category",
+            name="slug",
+            field=models.SlugField(
+                allow_unicode=True, blank=True, max_length=100, unique=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="tag",
+            name="slug",
+            field=models.SlugField(
+                allow_unicode=True, blank=True, max_length=100, unique=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="question",
+            name="date_created",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(
+                fields=["category", "date_created"], name="question_category_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def resolve_authors(apps, schema_editor):
+    # One UPDATE for all comments; names without a matching user stay NULL
+    Comment = apps.get_model("stackbase", "Comment")
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    users = User.objects.filter(username=OuterRef("name")).values("pk")[:1]
+    Comment.objects.using(schema_editor.connection.alias).filter(author__isnull=True).update(author=Subquery(users))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("stackbase", "0014_taxonomy_slugs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="author",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="answers",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(resolve_authors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stackbase", "0015_comment_author"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="hidden",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,213 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:41
+
+import html
+import re
+from html.parser import HTMLParser
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+# The sanitizer and search indexing are copied from stackbase.richtext and
+# stackbase.search as they were when this migration was written; migrations
+# must not change when the app code does
+BATCH_SIZE = 500
+EXCERPT_WORDS = 10
+
+ALLOWED_TAGS = {
+    "a", "b", "blockquote", "br", "caption", "code", "del", "div", "em",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i", "img", "li", "ol", "p",
+    "pre", "s", "span", "strike", "strong", "sub", "sup", "table", "tbody",
+    "td", "tfoot", "th", "thead", "tr", "u", "ul",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+}
+URL_ATTRIBUTES = {"href", "src"}
+SAFE_SCHEMES = {"http", "https", "mailto"}
+VOID_TAGS = {"br", "hr", "img"}
+# Dropped together with everything inside them
+SKIPPED_TAGS = {"script", "style", "iframe", "object", "embed", "template", "noscript", "textarea", "title"}
+# Tags that separate words in the plain text
+BLOCK_TAGS = {
+    "blockquote", "br", "caption", "div", "h1", "h2", "h3", "h4", "h5", "h6",
+    "hr", "li", "ol", "p", "pre", "table", "td", "th", "tr", "ul",
+}
+
+SCHEME_RE = re.compile(r"^([a-z][a-z0-9+.-]*):", re.IGNORECASE)
+# Browsers ignore these inside a URL, e.g. "java\tscript:"
+URL_IGNORED_RE = re.compile(r"[\x00-\x20\x7f]+")
+
+
+def plain_text(value):
+    return " ".join(html.unescape(strip_tags(value or "")).split())
+
+
+def safe_url(value):
+    match = SCHEME_RE.match(URL_IGNORED_RE.sub("", value))
+    return match is None or match.group(1).lower() in SAFE_SCHEMES
+
+
+class Cleaner(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if self.skipping or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, ())
+        kept = "".join(
+            f' {name}="{html.escape(value)}"'
+            for name, value in attrs
+            if name in allowed and value is not None and (name not in URL_ATTRIBUTES or safe_url(value))
+        )
+        if tag == "a":
+            kept += ' rel="nofollow noopener"'
+        self.html.append(f"<{tag}{kept}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(self.skipping - 1, 0)
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if self.skipping or tag not in self.open_tags:
+            return
+        # Also closes whatever was left open inside it
+        while self.open_tags:
+            name = self.open_tags.pop()
+            self.html.append(f"</{name}>")
+            if name == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.html.append(html.escape(data, quote=False))
+            self.text.append(data)
+
+    def close(self):
+        super().close()
+        self.html.extend(f"</{name}>" for name in reversed(self.open_tags))
+        self.open_tags = []
+
+
+def clean(value):
+    cleaner = Cleaner()
+    cleaner.feed(value or "")
+    cleaner.close()
+    return "".join(cleaner.html), " ".join("".join(cleaner.text).split())
+
+
+def excerpt(text, words=EXCERPT_WORDS):
+    parts = text.split()
+    if len(parts) <= words:
+        return text
+    return " ".join(parts[:words]) + "…"
+
+
+def index_rows(connection, rows):
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.executemany(
+                "DELETE FROM stackbase_question_fts WHERE rowid = %s",
+                [(pk,) for pk, _, _ in rows],
+            )
+            cursor.executemany(
+                "INSERT INTO stackbase_question_fts (rowid, title, content) VALUES (%s, %s, %s)",
+                rows,
+            )
+        elif connection.vendor == "postgresql":
+            cursor.executemany(
+                "UPDATE stackbase_question SET search_vector = "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'B') WHERE id = %s",
+                [(title, text, pk) for pk, title, text in rows],
+            )
+
+
+def process_existing(apps, schema_editor):
+    # Historical models have no RichTextMixin.save(); do its work here
+    connection = schema_editor.connection
+    db = connection.alias
+    for name in ("Question", "Comment"):
+        model = apps.get_model("stackbase", name)
+        batch = []
+        for obj in model.objects.using(db).only("content").iterator(chunk_size=BATCH_SIZE):
+            obj.content, obj.content_text = clean(obj.content)
+            obj.excerpt = excerpt(obj.content_text)
+            obj.word_count = len(obj.content_text.split())
+            batch.append(obj)
+            if len(batch) == BATCH_SIZE:
+                model.objects.using(db).bulk_update(batch, ["content", "content_text", "excerpt", "word_count"])
+                batch = []
+        model.objects.using(db).bulk_update(batch, ["content", "content_text", "excerpt", "word_count"])
+
+    # Search now indexes the stored text
+    Question = apps.get_model("stackbase", "Question")
+    rows = Question.objects.using(db).values_list("id", "title", "content_text")
+    batch = []
+    for pk, title, text in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append((pk, plain_text(title), text))
+        if len(batch) == BATCH_SIZE:
+            index_rows(connection, batch)
+            batch = []
+    index_rows(connection, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stackbase", "0017_likeevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="content_text",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="excerpt",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="content_text",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="excerpt",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(process_existing, migrations.RunPython.noop),
+    ]
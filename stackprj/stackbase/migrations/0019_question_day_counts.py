@@ -0,0 +1,121 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def day_counts(questions, tag_links):
+    # Copied from stackbase.trending as it was when this migration was
+    # written; migrations must not change when the app code does
+    tz = timezone.get_default_timezone()
+    counts = {}
+    by_category = (
+        questions.filter(hidden=False)
+        .annotate(day=TruncDate("date_created", tzinfo=tz))
+        .values_list("day", "category_id")
+        .annotate(questions=Count("id"))
+        .order_by()
+    )
+    for day, category_id, count in by_category:
+        counts[day, None, None] = counts.get((day, None, None), 0) + count
+        if category_id is not None:
+            counts[day, category_id, None] = count
+    by_tag = (
+        tag_links.filter(question__hidden=False)
+        .annotate(day=TruncDate("question__date_created", tzinfo=tz))
+        .values_list("day", "tag_id")
+        .annotate(questions=Count("*"))
+        .order_by()
+    )
+    for day, tag_id, count in by_tag:
+        counts[day, None, tag_id] = count
+    return counts
+
+
+def count_existing(apps, schema_editor):
+    Question = apps.get_model("stackbase", "Question")
+    QuestionDayCount = apps.get_model("stackbase", "QuestionDayCount")
+    db = schema_editor.connection.alias
+    counts = day_counts(Question.objects.using(db).all(), Question.tags.through.objects.using(db).all())
+    QuestionDayCount.objects.using(db).bulk_create(
+        [
+            QuestionDayCount(day=day, category_id=category_id, tag_id=tag_id, count=count)
+            for (day, category_id, tag_id), count in counts.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stackbase", "0018_rich_text"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestionDayCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="stackbase.category",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="stackbase.tag",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="questiondaycount",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("category", None), ("tag", None)),
+                fields=("day",),
+                name="questiondaycount_total_unique",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="questiondaycount",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("tag", None)),
+                fields=("category", "day"),
+                name="questiondaycount_category_unique",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="questiondaycount",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("category", None)),
+                fields=("tag", "day"),
+                name="questiondaycount_tag_unique",
+            ),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stackbase", "0019_question_day_counts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="date_updated",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="exportjob",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="exportjob",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="date_updated",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
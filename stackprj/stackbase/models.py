@@ -1,29 +1,135 @@
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.text import slugify
 from django.contrib.auth.models import User
 from ckeditor.fields import RichTextField
 
-class Category(models.Model):
+from . import richtext
+
+def unique_slug(model, name, pk=None):
+    """slugify(name), suffixed with -2, -3... if another row already has it."""
+    base = slugify(name, allow_unicode=True)[:90] or model._meta.model_name
+    taken = set(
+        model.objects.exclude(pk=pk).filter(slug__startswith=base).values_list('slug', flat=True)
+    )
+    slug, n = base, 1
+    while slug in taken:
+        n += 1
+        slug = f'{base}-{n}'
+    return slug
+
+
+class SlugMixin:
+    # Slugs are set once so URLs survive renames
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = unique_slug(type(self), self.name, self.pk)
+        super().save(*args, **kwargs)
+
+
+class Category(SlugMixin, models.Model):
     name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100, unique=True, allow_unicode=True, blank=True)
     tags = models.ManyToManyField('Tag', related_name='categories')
     def __str__(self):
         return self.name
-class Tag(models.Model):
+class Tag(SlugMixin, models.Model):
     name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100, unique=True, allow_unicode=True, blank=True)
 
     def __str__(self):
         return self.name
 
-class Question(models.Model):
+class CountersMixin:
+    """Leave the stored counters out of plain saves.
+
+    The counters are only changed with F() updates (stackbase.counters); a
+    full save of an instance loaded earlier would overwrite them with
+    stale values.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class RichTextMixin(models.Model):
+    """Sanitize ``content`` on save and store its text, see stackbase.richtext."""
+    content_text = models.TextField(blank=True, editable=False)
+    excerpt = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+
+    derived_fields = ('content_text', 'excerpt', 'word_count')
+
+    class Meta:
+        abstract = True
+
+    def process_content(self):
+        self.content, self.content_text = richtext.clean(self.content)
+        self.excerpt = richtext.excerpt(self.content_text)
+        self.word_count = len(self.content_text.split())
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.process_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.derived_fields}
+        super().save(*args, **kwargs)
+
+
+class QuestionQuerySet(models.QuerySet):
+    def visible(self):
+        # Hidden by a moderator, see ReportAdmin
+        return self.filter(hidden=False)
+
+    def in_window(self, tab):
+        """Questions asked in the today/week/month ``tab``; all of them for other tabs."""
+        from .trending import window_start
+
+        start = window_start(tab)
+        return self if start is None else self.filter(date_created__gte=start)
+
+    def for_listing(self):
+        """Visible questions with everything the lists render, in two queries per page."""
+        # The lists show the stored excerpt, not the content
+        return (
+            self.visible()
+            .defer('content', 'content_text')
+            .select_related('user', 'category')
+            .prefetch_related('tags')
+        )
+
+
+class Question(RichTextMixin, CountersMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=10000)
     # content = models.TextField(null=True, blank=True)
     content = RichTextField()
     likes = models.ManyToManyField(User, related_name='question_post')
-    date_created = models.DateTimeField(default=timezone.now)
+    date_created = models.DateTimeField(default=timezone.now, db_index=True)
+    date_updated = models.DateTimeField(auto_now=True)  # part of the export artifact key
     category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True)
     tags = models.ManyToManyField(Tag, blank=True)
+    # Kept up to date by stackbase.counters
+    like_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
+    hidden = models.BooleanField(default=False)
+
+    objects = QuestionQuerySet.as_manager()
+    counter_fields = ('like_count', 'comment_count')
+
+    class Meta:
+        indexes = [
+            # Category pages, newest first
+            models.Index(fields=['category', 'date_created'], name='question_category_date_idx'),
+        ]
     
     def __str__(self):
         return f'{self.user.username} - Question'
@@ -32,19 +138,19 @@ class Question(models.Model):
         return reverse('stackbase:question-detail', kwargs={'pk':self.pk})
     
     def total_likes(self):
-        return self.likes.count()
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.user.profile.update_score()
+        return self.like_count
 
-class Comment(models.Model):
+class Comment(RichTextMixin, CountersMixin, models.Model):
     question = models.ForeignKey(Question, related_name="comment", on_delete=models.CASCADE)
-    name = models.CharField(max_length=1000)
+    author = models.ForeignKey(User, related_name='answers', on_delete=models.SET_NULL, null=True, blank=True)
+    name = models.CharField(max_length=1000)  # author's username when posted, kept for deleted users
     content = RichTextField()
     date_created = models.DateTimeField(default=timezone.now)
+    date_updated = models.DateTimeField(auto_now=True)
     likes = models.ManyToManyField(User, related_name='comment_likes')
-   
+    like_count = models.PositiveIntegerField(default=0, editable=False)  # see stackbase.counters
+
+    counter_fields = ('like_count',)
 
     def __str__(self):
         return '%s - %s' % (self.question.title, self.question.user)
@@ -53,14 +159,57 @@ class Comment(models.Model):
         return reverse('stackbase:question-detail', kwargs={'pk':self.pk})
     
     def total_likes(self):
-        return self.likes.count()
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
+        return self.like_count
+
+    @property
+    def author_name(self):
+        return self.author.username if self.author_id else self.name
+
+class QuestionDayCount(models.Model):
+    """Visible questions asked on a day: overall (no category or tag), per
+    category or per tag. Kept up to date by stackbase.trending."""
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # One row per day and scope; the indexes behind them serve the day ranges
+            models.UniqueConstraint(
+                fields=['day'], condition=models.Q(category=None, tag=None), name='questiondaycount_total_unique'
+            ),
+            models.UniqueConstraint(
+                fields=['category', 'day'], condition=models.Q(tag=None), name='questiondaycount_category_unique'
+            ),
+            models.UniqueConstraint(
+                fields=['tag', 'day'], condition=models.Q(category=None), name='questiondaycount_tag_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.day}: {self.count}'
+
+
+class LikeEvent(models.Model):
+    """A like or unlike waiting for the flush_likes command, see stackbase.likes."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    liked = models.BooleanField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # The user's own pending state on the detail page and the like buttons
+            models.Index(fields=['user', 'question'], name='likeevent_user_question_idx'),
+            models.Index(fields=['user', 'comment'], name='likeevent_user_comment_idx'),
+        ]
+
+    def __str__(self):
+        target = f'question {self.question_id}' if self.question_id else f'answer {self.comment_id}'
+        return f'{self.user_id} {"likes" if self.liked else "unlikes"} {target}'
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.question.user.profile.update_score()
 class Report(models.Model):
     REASON_CHOICES = (
         ('inappropriate_content', 'Inappropriate Content'),
@@ -76,4 +225,51 @@ class Report(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
-        return f'Report by {self.user.username} on {self.question.title}'
\ No newline at end of file
+        return f'Report by {self.user.username} on {self.question.title}'
+
+class BlockedWord(models.Model):
+    # Text containing any of these (case-insensitive) is rejected, see stackbase.moderation
+    word = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.word
+
+
+class ExportJob(models.Model):
+    SCOPE_CHOICES = (
+        ('all', 'All Questions'),
+        ('category', 'Category'),
+        ('tag', 'Tag'),
+    )
+    COMPRESSION_CHOICES = (
+        ('gzip', 'gzip'),
+        ('zstd', 'zstd'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, default='all')
+    value = models.CharField(max_length=100, blank=True)  # category or tag slug
+    compression = models.CharField(max_length=10, choices=COMPRESSION_CHOICES, default='gzip')
+    # Filter plus the newest and last edited rows it covers; equal keys mean equal files
+    artifact_key = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    file = models.FileField(upload_to='exports', blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Set when a worker claims the job and refreshed while it writes
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Export {self.scope} {self.value} - {self.status}'
+
+    def get_absolute_url(self):
+        return reverse('stackbase:export-job', kwargs={'pk': self.pk})
@@ -0,0 +1,82 @@
+"""Text moderation for questions, answers and reports.
+
+The blocked words live in the ``BlockedWord`` table (editable in the admin).
+They are compiled into a single regular expression shaped like a trie
+(``a(?:rse|sshole)|b(?:...)...``), so a text is lowercased once and scanned
+in one pass instead of once per word, and at each position the regex engine
+only follows the branch for the current character. The compiled pattern
+is rebuilt when a word is added or removed in this process, and re-read from
+the database every ``MODERATION_RELOAD_SECONDS`` so other processes pick up
+admin edits without a restart.
+"""
+import html
+import re
+import threading
+import time
+
+from django.conf import settings
+
+# Minimum length required for the text
+MIN_LENGTH = 10
+
+# Cheaper than django.utils.html.strip_tags, which is plenty for matching
+TAG_RE = re.compile(r"<[^>]*>")
+
+_lock = threading.Lock()
+_pattern = None
+_loaded_at = 0.0
+
+
+def _trie_pattern(node):
+    if "" in node:
+        # A blocked word ends here; longer words sharing the prefix add nothing
+        return ""
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items())]
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:%s)" % "|".join(branches)
+
+
+def compile_words(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word.lower():
+            node = node.setdefault(char, {})
+        if node is not trie:
+            node[""] = {}
+    if not trie:
+        return None
+    return re.compile(_trie_pattern(trie))
+
+
+def get_pattern():
+    global _pattern, _loaded_at
+    max_age = getattr(settings, "MODERATION_RELOAD_SECONDS", 60)
+    if _loaded_at and time.monotonic() - _loaded_at < max_age:
+        return _pattern
+    with _lock:
+        if not _loaded_at or time.monotonic() - _loaded_at >= max_age:
+            from .models import BlockedWord
+
+            _pattern = compile_words(BlockedWord.objects.values_list("word", flat=True))
+            _loaded_at = time.monotonic()
+    return _pattern
+
+
+def invalidate():
+    global _loaded_at
+    _loaded_at = 0.0
+
+
+def is_valid_text(text):
+    """False if ``text`` contains a blocked word or is too short.
+
+    CKEditor markup is stripped first, so tags and attributes neither
+    trigger nor hide a match and don't count towards the length.
+    """
+    text = html.unescape(TAG_RE.sub("", text or "")).strip()
+    if len(text) < MIN_LENGTH:
+        return False
+    pattern = get_pattern()
+    return pattern is None or pattern.search(text.lower()) is None
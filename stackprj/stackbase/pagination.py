@@ -0,0 +1,202 @@
+"""Keyset (cursor) pagination for the question feeds.
+
+Instead of ``OFFSET n`` the next page is selected with a ``WHERE`` on the
+sort key of the last row already shown, e.g. for ``-date_created, -id``::
+
+    date_created < last.date_created
+    OR (date_created = last.date_created AND id < last.id)
+
+so page N costs the same as page 1. The position is handed to the client as
+an opaque ``cursor`` query parameter.
+"""
+
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+
+
+# Widest integer column on every backend
+BIGINT_MIN, BIGINT_MAX = -(2**63), 2**63 - 1
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _split(ordering):
+    return [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, next_cursor):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, per_page, ordering=("-date_created", "-id")):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.keys = _split(self.ordering)
+
+    def encode_cursor(self, obj):
+        values = []
+        for name, _ in self.keys:
+            value = getattr(obj, name)
+            if hasattr(value, "isoformat"):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps(values, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """The key values in ``cursor``; InvalidCursor for anything a client
+        could have tampered with."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(self.keys):
+                raise InvalidCursor(cursor)
+            return [
+                self._decode_value(name, value) for (name, _), value in zip(self.keys, values)
+            ]
+        except InvalidCursor:
+            raise
+        except Exception:
+            raise InvalidCursor(cursor)
+
+    def _decode_value(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotation, e.g. a search rank
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise InvalidCursor(value)
+        else:
+            value = field.to_python(value)
+            field.run_validators(value)
+        if value is None:
+            raise InvalidCursor(value)
+        # e.g. ids out of the column's range; SQLite has no validators for it
+        if isinstance(value, int) and not BIGINT_MIN <= value <= BIGINT_MAX:
+            raise InvalidCursor(value)
+        return value
+
+    def _after(self, values):
+        # (k1, k2, ...) strictly after (v1, v2, ...) in the feed order
+        condition = Q()
+        for i, (name, descending) in enumerate(self.keys):
+            step = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+            for (prev_name, _), prev_value in zip(self.keys[:i], values):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _page_queryset(self, cursor):
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+        # One extra row tells whether there is a next page
+        return queryset[: self.per_page + 1]
+
+    def _make_page(self, rows):
+        has_next = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        next_cursor = self.encode_cursor(rows[-1]) if has_next else None
+        return KeysetPage(rows, has_next, next_cursor)
+
+    def page(self, cursor=None):
+        return self._make_page(list(self._page_queryset(cursor)))
+
+    async def apage(self, cursor=None):
+        return self._make_page([obj async for obj in self._page_queryset(cursor)])
+
+
+class KeysetPaginationMixin:
+    """Cursor pagination for ListViews.
+
+    Adds ``next_page_url`` to the context, and answers ``?format=json``
+    with the page serialized through ``serialize_object`` so clients can
+    keep loading more results.
+    """
+
+    paginate_by = 20
+    cursor_kwarg = "cursor"
+    keyset_ordering = ("-date_created", "-id")
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.get_keyset_ordering())
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return (paginator, page, page.object_list, page.has_next)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.get_keyset_ordering())
+        try:
+            page = await paginator.apage(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404("Invalid cursor.")
+        return (paginator, page, page.object_list, page.has_next)
+
+    def get_next_page_url(self, page, fmt=None):
+        if not page.has_next:
+            return None
+        params = self.request.GET.copy()
+        params[self.cursor_kwarg] = page.next_cursor
+        if fmt:
+            params["format"] = fmt
+        return f"{self.request.path}?{params.urlencode()}"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["next_page_url"] = self.get_next_page_url(context["page_obj"])
+        return context
+
+    def serialize_object(self, obj):
+        return {"id": obj.pk}
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.GET.get("format") != "json":
+            return super().render_to_response(context, **response_kwargs)
+        page = context["page_obj"]
+        return JsonResponse(
+            {
+                "results": [self.serialize_object(obj) for obj in page.object_list],
+                "next": self.get_next_page_url(page, fmt="json"),
+            }
+        )
+
+
+class AsyncKeysetPaginationMixin:
+    """Async ``get`` for KeysetPaginationMixin list views.
+
+    The page is fetched with the async ORM first; building the context and
+    the JSON/template response afterwards doesn't touch the database (the
+    template is rendered by Django's handler).
+    """
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        self.paginated = await self.apaginate_queryset(
+            self.object_list, self.get_paginate_by(self.object_list)
+        )
+        return self.render_to_response(self.get_context_data())
+
+    def paginate_queryset(self, queryset, page_size):
+        return self.paginated
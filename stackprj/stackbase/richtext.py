@@ -0,0 +1,130 @@
+"""Rich text processing, done once when a question or answer is saved.
+
+CKEditor posts HTML, which the pages used to render as is (``|safe``) and
+the lists ran ``truncatewords``/``wordcount`` on for every row of every
+render. ``clean`` now parses the HTML once: it keeps an allowlist of tags
+and attributes, drops scripts and unsafe URLs, escapes everything else, and
+extracts the plain text. ``RichTextMixin`` (``stackbase.models``) stores
+both, with an excerpt and a word count, so the detail page can render the
+stored HTML, the lists read the excerpt and search indexes the text.
+"""
+import html
+import re
+from html.parser import HTMLParser
+
+from django.utils.html import strip_tags
+
+# Words in the excerpt shown on the question lists
+EXCERPT_WORDS = 10
+
+ALLOWED_TAGS = {
+    "a", "b", "blockquote", "br", "caption", "code", "del", "div", "em",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i", "img", "li", "ol", "p",
+    "pre", "s", "span", "strike", "strong", "sub", "sup", "table", "tbody",
+    "td", "tfoot", "th", "thead", "tr", "u", "ul",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+}
+URL_ATTRIBUTES = {"href", "src"}
+SAFE_SCHEMES = {"http", "https", "mailto"}
+VOID_TAGS = {"br", "hr", "img"}
+# Dropped together with everything inside them
+SKIPPED_TAGS = {"script", "style", "iframe", "object", "embed", "template", "noscript", "textarea", "title"}
+# Tags that separate words in the plain text
+BLOCK_TAGS = {
+    "blockquote", "br", "caption", "div", "h1", "h2", "h3", "h4", "h5", "h6",
+    "hr", "li", "ol", "p", "pre", "table", "td", "th", "tr", "ul",
+}
+
+SCHEME_RE = re.compile(r"^([a-z][a-z0-9+.-]*):", re.IGNORECASE)
+# Browsers ignore these inside a URL, e.g. "java\tscript:"
+URL_IGNORED_RE = re.compile(r"[\x00-\x20\x7f]+")
+
+
+def plain_text(value):
+    """Rich text as the words a reader sees."""
+    return " ".join(html.unescape(strip_tags(value or "")).split())
+
+
+def safe_url(value):
+    match = SCHEME_RE.match(URL_IGNORED_RE.sub("", value))
+    return match is None or match.group(1).lower() in SAFE_SCHEMES
+
+
+class Cleaner(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if self.skipping or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, ())
+        kept = "".join(
+            f' {name}="{html.escape(value)}"'
+            for name, value in attrs
+            if name in allowed and value is not None and (name not in URL_ATTRIBUTES or safe_url(value))
+        )
+        if tag == "a":
+            kept += ' rel="nofollow noopener"'
+        self.html.append(f"<{tag}{kept}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(self.skipping - 1, 0)
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if self.skipping or tag not in self.open_tags:
+            return
+        # Also closes whatever was left open inside it
+        while self.open_tags:
+            name = self.open_tags.pop()
+            self.html.append(f"</{name}>")
+            if name == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.html.append(html.escape(data, quote=False))
+            self.text.append(data)
+
+    def close(self):
+        super().close()
+        self.html.extend(f"</{name}>" for name in reversed(self.open_tags))
+        self.open_tags = []
+
+
+def clean(value):
+    """``(sanitized HTML, plain text)`` of the rich text ``value``."""
+    cleaner = Cleaner()
+    cleaner.feed(value or "")
+    cleaner.close()
+    return "".join(cleaner.html), " ".join("".join(cleaner.text).split())
+
+
+def excerpt(text, words=EXCERPT_WORDS):
+    """The first ``words`` words of ``text``, like ``truncatewords``."""
+    parts = text.split()
+    if len(parts) <= words:
+        return text
+    return " ".join(parts[:words]) + "…"
@@ -0,0 +1,77 @@
+"""Read-replica routing.
+
+With ``READ_REPLICA`` on (``DB_REPLICA_NAME``/``DB_REPLICA_HOST`` in the
+environment, see settings), reads go to the ``replica`` database while
+``replica_reads()`` is active: ``ReplicaMiddleware`` opens it for GET and
+HEAD requests to views marked with ``replica_view`` (or a ``replica_reads``
+class attribute), and the export worker for the rows it dumps. Everything
+else stays on ``default``: writes, the sessions (a stale session must not
+outlive a logout) and the reads of all other views.
+
+A replica lags behind the primary, so a client that just changed something
+would not see it on the next page. Every unsafe request therefore pins the
+client to the primary for ``REPLICA_STICKY_SECONDS`` with a cookie.
+"""
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_ALIAS = "replica"
+STICKY_COOKIE = "primary_reads"
+# Always read from the primary
+PRIMARY_APPS = {"sessions"}
+
+# Context-local, so it follows a request across sync_to_async/async_to_sync
+_state = Local()
+
+
+def replica_enabled():
+    return getattr(settings, "READ_REPLICA", False) and REPLICA_ALIAS in settings.DATABASES
+
+
+def read_alias():
+    """The alias reads go to right now."""
+    if getattr(_state, "replica", False) and replica_enabled():
+        return REPLICA_ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+def use_replica(enabled=True):
+    _state.replica = enabled
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    previous = getattr(_state, "replica", False)
+    use_replica(enabled)
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def replica_view(view):
+    """Mark a function view as safe to serve from the replica."""
+    view.replica_reads = True
+    return view
+
+
+def is_replica_view(view):
+    view_class = getattr(view, "view_class", None)
+    return getattr(view, "replica_reads", False) or getattr(view_class, "replica_reads", False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
@@ -0,0 +1,170 @@
+"""Full-text search over questions.
+
+The search bar used to OR together ``icontains`` lookups on the title and the
+raw CKEditor HTML, which is a full table scan. Questions are now indexed as
+plain text (``content_text``, see stackbase.richtext) when they are saved:
+
+* on SQLite, in the FTS5 table ``stackbase_question_fts`` (rowid = question id)
+* on PostgreSQL, in a ``search_vector`` tsvector column with a GIN index
+
+Both tables/columns are created by migration 0010 and kept in sync by the
+signal handlers in ``stackbase.signals``. Other databases fall back to the
+old ``icontains`` filter.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .richtext import plain_text
+
+TAG_PATTERN = r"\[([^]]+)\]"
+
+
+def parse_query(search_input):
+    """Split the search bar input into ``[tag]`` names and free-text words."""
+    tags = re.findall(TAG_PATTERN, search_input)
+    words = re.sub(TAG_PATTERN, "", search_input).split()
+    return tags, words
+
+
+class SearchBackend:
+    """Fallback for databases without a full-text index."""
+
+    # Keyset ordering for ranked results; None keeps the feed order.
+    ordering = None
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def index(self, rows):
+        """Index ``(id, title, content_text)`` rows."""
+
+    def remove(self, question_ids):
+        pass
+
+    def filter(self, queryset, words):
+        query = Q()
+        for word in words:
+            query |= Q(title__icontains=word) | Q(content_text__icontains=word)
+        return queryset.filter(query)
+
+
+class SQLiteSearchBackend(SearchBackend):
+    # bm25() is lower-is-better
+    ordering = ("rank", "-id")
+
+    def index(self, rows):
+        rows = [(pk, plain_text(title), text) for pk, title, text in rows]
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                "DELETE FROM stackbase_question_fts WHERE rowid = %s",
+                [(pk,) for pk, _, _ in rows],
+            )
+            cursor.executemany(
+                "INSERT INTO stackbase_question_fts (rowid, title, content) VALUES (%s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, question_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                "DELETE FROM stackbase_question_fts WHERE rowid = %s",
+                [(pk,) for pk in question_ids],
+            )
+
+    def match_expression(self, words):
+        # Every word as a quoted prefix term, any of them may match
+        return " OR ".join('"%s"*' % word.replace('"', '""') for word in words)
+
+    def filter(self, queryset, words):
+        match = self.match_expression(words)
+        matches = RawSQL(
+            "SELECT rowid FROM stackbase_question_fts WHERE stackbase_question_fts MATCH %s",
+            [match],
+        )
+        # bm25() of each hit, computed once per query: a bm25() subquery
+        # correlated on the row re-ran the MATCH for every hit (minutes for
+        # common words). LIMIT -1 keeps SQLite from folding the inner query
+        # into the correlated one. Title hits weigh more than content hits.
+        rank = RawSQL(
+            "SELECT ranked.score FROM ("
+            "SELECT rowid AS id, bm25(stackbase_question_fts, 10.0, 1.0) AS score "
+            "FROM stackbase_question_fts WHERE stackbase_question_fts MATCH %s LIMIT -1"
+            ") AS ranked WHERE ranked.id = stackbase_question.id",
+            [match],
+        )
+        return queryset.filter(id__in=matches).annotate(rank=rank)
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    ordering = ("-rank", "-id")
+
+    def index(self, rows):
+        rows = [(plain_text(title), text, pk) for pk, title, text in rows]
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                "UPDATE stackbase_question SET search_vector = "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'B') WHERE id = %s",
+                rows,
+            )
+
+    def tsquery(self, words):
+        terms = (re.sub(r"[^\w]", "", word) for word in words)
+        return " | ".join(f"{term}:*" for term in terms if term)
+
+    def filter(self, queryset, words):
+        tsquery = self.tsquery(words)
+        if not tsquery:
+            return queryset.none()
+        matches = RawSQL(
+            "SELECT id FROM stackbase_question "
+            "WHERE search_vector @@ to_tsquery('simple', %s)",
+            [tsquery],
+        )
+        rank = RawSQL(
+            "ts_rank(stackbase_question.search_vector, to_tsquery('simple', %s))",
+            [tsquery],
+        )
+        return queryset.filter(id__in=matches).annotate(rank=rank)
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgreSQLSearchBackend,
+}
+
+
+def get_backend(using="default"):
+    connection = connections[using]
+    return BACKENDS.get(connection.vendor, SearchBackend)(connection)
+
+
+def index_question(question, using="default"):
+    get_backend(using).index([(question.pk, question.title, question.content_text)])
+
+
+def remove_question(question_id, using="default"):
+    remove_questions([question_id], using=using)
+
+
+def remove_questions(question_ids, using="default"):
+    # PostgreSQL's search_vector goes with the row
+    get_backend(using).remove(question_ids)
+
+
+def search_questions(queryset, search_input):
+    """Filter ``queryset`` by the search bar input.
+
+    Returns the filtered queryset and the keyset ordering to page it with
+    (None when the results keep the feed order).
+    """
+    tags, words = parse_query(search_input)
+    if tags:
+        queryset = queryset.filter(tags__name__in=tags).distinct()
+    if not words:
+        return queryset, None
+    backend = get_backend(queryset.db)
+    return backend.filter(queryset, words), backend.ordering
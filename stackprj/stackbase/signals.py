@@ -0,0 +1,214 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+from stackusers import scoring
+from .models import Question, Comment, Tag, Category, BlockedWord
+from . import caching, counters, database, exports, moderation, search, taxonomy, trending
+from .deletion import in_bulk_delete
+
+# busy_timeout, and WAL where enabled, on every new SQLite connection
+@receiver(connection_created)
+def tune_connection(sender, connection, **kwargs):
+    database.apply_sqlite_pragmas(connection)
+
+# Full-text index. The delete receivers below leave bulk deletes to
+# stackbase.deletion, which does their work once for the whole set
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, using, **kwargs):
+    search.index_question(instance, using=using)
+
+@receiver(post_delete, sender=Question)
+def unindex_question(sender, instance, using, **kwargs):
+    if not in_bulk_delete():
+        search.remove_question(instance.pk, using=using)
+
+# Recompile the moderation filter when the word list changes
+@receiver(post_save, sender=BlockedWord)
+@receiver(post_delete, sender=BlockedWord)
+def reload_blocked_words(sender, **kwargs):
+    moderation.invalidate()
+
+
+# Category -> tags mapping used by the question forms
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reload_taxonomy(sender, **kwargs):
+    taxonomy.invalidate_on_commit()
+
+@receiver(m2m_changed, sender=Category.tags.through)
+def reload_category_tags(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        taxonomy.invalidate_on_commit()
+
+# Exports show these names; a rename changes the rows that show it
+NAME_FIELDS = {User: 'username', Category: 'name', Tag: 'name'}
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Tag)
+def export_names_before(sender, instance, update_fields=None, **kwargs):
+    field = NAME_FIELDS[sender]
+    if instance.pk and (update_fields is None or field in update_fields):
+        saved = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+        instance._export_renamed = saved is not None and saved != getattr(instance, field)
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+def export_names_after(sender, instance, **kwargs):
+    if instance.__dict__.pop('_export_renamed', False):
+        exports.names_changed(instance)
+
+@receiver(pre_delete, sender=Tag)
+def export_tag_deleted(sender, instance, **kwargs):
+    # The questions lose the tag without a save of their own
+    exports.names_changed(instance)
+
+# Stored like counters and the likers' reputation
+@receiver(m2m_changed, sender=Question.likes.through)
+@receiver(m2m_changed, sender=Comment.likes.through)
+def count_likes(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_remove':
+        # Django reports every requested id, even ones that were never liked
+        pk_set.intersection_update(counters.existing_like_ids(sender, instance, reverse, pk_set))
+    elif action == 'pre_clear':
+        instance._cleared_like_ids = counters.existing_like_ids(sender, instance, reverse)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        delta = 1 if action == 'post_add' else -1
+        if action == 'post_clear':
+            pk_set = instance.__dict__.pop('_cleared_like_ids', set())
+        counters.likes_changed(sender, instance, reverse, pk_set, delta)
+        scoring.likes_changed(instance, reverse, pk_set, delta)
+
+@receiver(pre_delete, sender=User)
+def count_deleted_user_likes(sender, instance, **kwargs):
+    counters.user_deleted(instance)
+
+@receiver(post_save, sender=Comment)
+def count_comment_added(sender, instance, created, **kwargs):
+    if created:
+        counters.comments_changed([instance.question_id], 1)
+
+@receiver(post_delete, sender=Comment)
+def count_comment_deleted(sender, instance, **kwargs):
+    if not in_bulk_delete():
+        counters.comments_changed([instance.question_id], -1)
+
+
+# Per-day question counts behind the time-window tabs: the buckets the
+# questions were in before the change, then the difference after it
+@receiver(pre_save, sender=Question)
+@receiver(pre_delete, sender=Question)
+def question_days_before(sender, instance, **kwargs):
+    if in_bulk_delete():
+        return
+    instance._day_buckets = trending.buckets([instance.pk]) if instance.pk else {}
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def count_question_days(sender, instance, **kwargs):
+    if in_bulk_delete():
+        return
+    trending.apply_change(instance.__dict__.pop('_day_buckets', {}), [instance.pk])
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def count_tag_days(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('pre_add', 'pre_remove', 'pre_clear'):
+        if not reverse:
+            question_ids = [instance.pk]
+        elif pk_set is None:
+            question_ids = list(instance.question_set.values_list('pk', flat=True))
+        else:
+            question_ids = list(pk_set)
+        instance._tag_day_buckets = (trending.buckets(question_ids), question_ids)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        before, question_ids = instance.__dict__.pop('_tag_day_buckets', ({}, []))
+        trending.apply_change(before, question_ids)
+
+
+# Page cache: bump the generation of every page a change shows up on
+@receiver(pre_save, sender=Question)
+@receiver(pre_delete, sender=Question)
+def question_pages_before(sender, instance, **kwargs):
+    if in_bulk_delete():
+        return
+    # Pages of the category and tags the question had before the change
+    instance._page_scopes = caching.scopes_for_questions([instance.pk]) if instance.pk else set()
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_pages_after(sender, instance, **kwargs):
+    if in_bulk_delete():
+        return
+    scopes = instance.__dict__.pop('_page_scopes', set())
+    scopes.update([f'question:{instance.pk}', 'lists:all'])
+    if instance.category_id:
+        scopes.add(f'category:{instance.category.slug}')
+    caching.invalidate_on_commit(scopes)
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_pages(sender, instance, **kwargs):
+    if in_bulk_delete():
+        return
+    # Lists show the answer count
+    caching.invalidate_on_commit(caching.scopes_for_questions([instance.question_id]))
+
+def _liked_question_ids(model, instance, action, reverse, pk_set):
+    # Questions whose like counts a likes change touches, reverse = from the user side
+    if not reverse:
+        return [instance.pk if model is Question else instance.question_id]
+    if action == 'pre_clear':
+        objects = model.objects.filter(likes=instance)
+    else:
+        objects = model.objects.filter(pk__in=pk_set)
+    if model is Question:
+        return list(objects.values_list('pk', flat=True))
+    return list(objects.values_list('question_id', flat=True))
+
+@receiver(m2m_changed, sender=Question.likes.through)
+@receiver(m2m_changed, sender=Comment.likes.through)
+def like_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    model = Question if sender is Question.likes.through else Comment
+    if action in ('pre_add', 'pre_remove', 'pre_clear'):
+        # From the user side the liked objects are gone after a clear
+        if reverse and (pk_set or action == 'pre_clear'):
+            instance._like_question_ids = _liked_question_ids(model, instance, action, reverse, pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse:
+            question_ids = instance.__dict__.pop('_like_question_ids', [])
+        else:
+            # Also reached without the pre_* signals, see stackbase.likes
+            question_ids = _liked_question_ids(model, instance, action, reverse, pk_set)
+        if model is Question:
+            # Lists show the like count of questions
+            caching.invalidate_on_commit(caching.scopes_for_questions(question_ids))
+        else:
+            caching.invalidate_on_commit(f'question:{pk}' for pk in set(question_ids))
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def question_tag_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('pre_add', 'pre_remove', 'pre_clear'):
+        if reverse:
+            scopes = {f'tag:{instance.slug}'}
+            question_ids = pk_set if pk_set is not None else instance.question_set.values_list('pk', flat=True)
+        else:
+            # Removed tags only show up here, before the change
+            scopes = {f'tag:{slug}' for slug in Tag.objects.filter(question=instance).values_list('slug', flat=True)}
+            question_ids = [instance.pk]
+            if pk_set:
+                scopes.update(f'tag:{slug}' for slug in Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True))
+        instance._tag_page_scopes = scopes | caching.scopes_for_questions(question_ids)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        caching.invalidate_on_commit(instance.__dict__.pop('_tag_page_scopes', set()))
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def taxonomy_pages(sender, instance, **kwargs):
+    # Every list renders tag and category names
+    caching.invalidate_on_commit(['taxonomy'])
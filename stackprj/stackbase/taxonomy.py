@@ -0,0 +1,132 @@
+"""In-process cache of the category -> tags mapping.
+
+The ask/edit forms and the ``get_tags`` endpoint need the tags of a
+category on every request, while categories and tags only change in the
+admin. Each process keeps the whole mapping in memory and tags it with a
+version number stored in the ``default`` cache; the signal handlers in
+``stackbase.signals`` bump that version when a category, a tag or the
+category/tag links change, and the process reloads on its next read.
+The version also serves as the ETag of ``get_tags``.
+
+Only a cache shared by all processes (``CACHE_BACKEND=redis`` or ``file``)
+carries a bump to the other processes. The version therefore also expires
+after ``TAXONOMY_RELOAD_SECONDS``, so with a per-process cache (locmem)
+every process still picks up admin edits, and serves a fresh ETag, within
+that time.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = "taxonomy:version"
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class Taxonomy:
+    def __init__(self, version, tags, category_tags):
+        self.version = version
+        self.tags = tags  # tag id -> name
+        self.category_tags = category_tags  # category id -> [tag ids]
+
+    def tags_for(self, category_id):
+        """``[(id, name)]`` of the tags of a category, [] if unknown."""
+        return [(pk, self.tags[pk]) for pk in self.category_tags.get(category_id, [])]
+
+
+def version_timeout():
+    return getattr(settings, "TAXONOMY_RELOAD_SECONDS", 300)
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), version_timeout())
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def acurrent_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), version_timeout())
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def _querysets():
+    from .models import Category, Tag
+
+    links = Category.tags.through.objects.order_by("tag_id")
+    return Tag.objects.values_list("id", "name"), links.values_list("category_id", "tag_id")
+
+
+def _build(version, tag_rows, link_rows):
+    category_tags = {}
+    for category_id, tag_id in link_rows:
+        category_tags.setdefault(category_id, []).append(tag_id)
+    return Taxonomy(version, dict(tag_rows), category_tags)
+
+
+def load(version):
+    tags, links = _querysets()
+    return _build(version, tags, links)
+
+
+async def aload(version):
+    tags, links = _querysets()
+    return _build(version, [row async for row in tags], [row async for row in links])
+
+
+def get_taxonomy():
+    global _snapshot
+    version = current_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = load(version)
+        return _snapshot
+
+
+async def aget_taxonomy():
+    # No lock: a concurrent reload only costs a duplicate load
+    global _snapshot
+    version = await acurrent_version()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        snapshot = _snapshot = await aload(version)
+    return snapshot
+
+
+def _category_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def tags_for(category_id):
+    category_id = _category_id(category_id)
+    return get_taxonomy().tags_for(category_id) if category_id is not None else []
+
+
+async def atags_for(category_id):
+    category_id = _category_id(category_id)
+    return (await aget_taxonomy()).tags_for(category_id) if category_id is not None else []
+
+
+def invalidate():
+    global _snapshot
+    _snapshot = None
+    cache.set(VERSION_KEY, time.time_ns(), version_timeout())
+
+
+def invalidate_on_commit():
+    # Reloading before the commit would cache the old mapping again
+    transaction.on_commit(invalidate)
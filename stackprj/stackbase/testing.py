@@ -0,0 +1,19 @@
+"""Test runner that makes query budgets fail the tests.
+
+Outside the tests a view over its ``QUERY_BUDGETS`` entry only logs a
+warning (see stackbase.instrumentation); ``TEST_RUNNER`` points here so the
+suite raises instead, however it is started.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class StrictQueryBudgetRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_budget_strict = settings.QUERY_BUDGET_STRICT
+        settings.QUERY_BUDGET_STRICT = True
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGET_STRICT = self._query_budget_strict
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1453 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.models import Session
+import base64
+import csv
+import gzip
+import json
+import os
+import random
+import re
+import tempfile
+import time
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Value
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from stackusers import leaderboard, scoring
+from stackusers.models import Profile
+from . import async_views, counters, database, exports, instrumentation, likes, moderation, pagination, richtext, routers, search, taxonomy, trending, views
+from .models import BlockedWord, Category, Comment, ExportJob, LikeEvent, Question, QuestionDayCount, Report, Tag
+
+
+class QueryBudgetMixin:
+    """Assert that a page costs a fixed number of queries, however much data
+    it shows."""
+
+    def assertQueryBudget(self, url, budget, data=None):
+        with self.assertNumQueries(budget):
+            response = self.client.get(url, data or {})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class QuestionListQueryTests(QueryBudgetMixin, TestCase):
+    # One query for the page of questions, one to prefetch their tags
+    LIST_BUDGET = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="asker", password="pass")
+        cls.category = Category.objects.create(name="python")
+        cls.tags = [Tag.objects.create(name=f"tag{i}") for i in range(3)]
+        cls.category.tags.set(cls.tags)
+
+    def add_questions(self, count):
+        for i in range(count):
+            question = Question.objects.create(
+                user=self.user,
+                title=f"How do I do thing {i}?",
+                content="<p>Some content about decorators</p>",
+                category=self.category,
+            )
+            question.tags.set(self.tags)
+            question.likes.add(self.user)
+            Comment.objects.create(
+                question=question, author=self.user, name="asker", content="An answer"
+            )
+
+    def assertFlatBudget(self, url, data=None):
+        self.add_questions(2)
+        self.assertQueryBudget(url, self.LIST_BUDGET, data)
+        self.add_questions(30)
+        response = self.assertQueryBudget(url, self.LIST_BUDGET, data)
+        self.assertTrue(response.context["next_page_url"])
+        return response
+
+    def test_question_list(self):
+        response = self.assertFlatBudget(reverse("stackbase:question-lists"))
+        question = response.context["questions"][0]
+        self.assertEqual((question.like_count, question.comment_count), (1, 1))
+
+    def test_question_list_tab(self):
+        self.assertFlatBudget(reverse("stackbase:question-lists"), {"tab": "week"})
+
+    def test_most_liked_tab(self):
+        self.assertFlatBudget(reverse("stackbase:question-lists"), {"tab": "liked"})
+
+    def test_search(self):
+        self.assertFlatBudget(
+            reverse("stackbase:question-lists"), {"search-bar": "[tag1] thing"}
+        )
+
+    def test_tag_list(self):
+        self.assertFlatBudget(reverse("stackbase:tag-question-lists", args=["tag0"]))
+
+    def test_category_list(self):
+        self.assertFlatBudget(
+            reverse("stackbase:category-question-lists", args=["python"])
+        )
+
+    def test_load_more_json(self):
+        self.add_questions(25)
+        url = reverse("stackbase:question-lists")
+        with self.assertNumQueries(self.LIST_BUDGET):
+            first = self.client.get(url, {"format": "json"}).json()
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(len(first["results"]) + len(second["results"]), 25)
+        self.assertIsNone(second["next"])
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "reads SQLite query plans")
+@override_settings(PAGE_CACHE_ENABLED=False)
+class QuestionListPlanTests(TestCase):
+    """The list pages must find their rows through an index, not by reading
+    the whole question (or tag/category) table."""
+
+    # "SCAN <table>" without "USING ... INDEX" is a full table scan
+    FULL_SCAN = re.compile(r"^SCAN (stackbase_\w+)$")
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="asker")
+        category = Category.objects.create(name="Web Dev")
+        tag = Tag.objects.create(name="C++")
+        for i in range(5):
+            question = Question.objects.create(
+                user=user, title=f"Question {i}", content="<p>Content</p>", category=category
+            )
+            question.tags.add(tag)
+        cls.category, cls.tag = category, tag
+
+    def full_scans(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, data or {}).status_code, 200)
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query["sql"].startswith("SELECT"):
+                    continue
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                for row in cursor.fetchall():
+                    match = self.FULL_SCAN.match(row[-1])
+                    if match:
+                        scans.append((match.group(1), query["sql"]))
+        return scans
+
+    def test_slugs(self):
+        self.assertEqual((self.category.slug, self.tag.slug), ("web-dev", "c"))
+        self.assertEqual(Tag.objects.create(name="C#").slug, "c-2")
+
+    def test_question_list(self):
+        self.assertEqual(self.full_scans(reverse("stackbase:question-lists")), [])
+
+    def test_question_list_tab(self):
+        url = reverse("stackbase:question-lists")
+        self.assertEqual(self.full_scans(url, {"tab": "week"}), [])
+
+    def test_category_list(self):
+        url = reverse("stackbase:category-question-lists", args=[self.category.slug])
+        self.assertEqual(self.full_scans(url), [])
+
+    def test_tag_list(self):
+        url = reverse("stackbase:tag-question-lists", args=[self.tag.slug])
+        self.assertEqual(self.full_scans(url), [])
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "SQLite pragmas")
+class SQLitePragmaTests(TestCase):
+    def pragma(self, name, using=connection):
+        with using.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_applied_on_connect(self):
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+
+    @override_settings(SQLITE_WAL=True)
+    def test_wal_only_where_enabled(self):
+        # Never on the test database, even with SQLITE_WAL
+        self.assertFalse(database.use_wal(connection))
+        self.assertNotEqual(self.pragma("journal_mode"), "wal")
+
+        with tempfile.TemporaryDirectory() as directory:
+            for enabled in (False, True):
+                name = os.path.join(directory, f"{enabled}.sqlite3")
+                other = type(connections["default"])({**connection.settings_dict, "NAME": name}, alias="wal")
+                try:
+                    with self.settings(SQLITE_WAL=enabled):
+                        other.ensure_connection()
+                    self.assertEqual(self.pragma("journal_mode", other) == "wal", enabled)
+                    self.assertEqual(self.pragma("synchronous", other), 1 if enabled else 2)  # NORMAL, FULL
+                finally:
+                    other.close()
+
+
+@override_settings(MODERATION_RELOAD_SECONDS=3600)
+class ModerationTests(TestCase):
+    def setUp(self):
+        moderation.invalidate()
+        self.addCleanup(moderation.invalidate)
+
+    def word_scan(self, text, words):
+        # The filter it replaced: one lowercase substring search per word
+        for word in words:
+            if word.lower() in text.lower():
+                return False
+        return len(text) >= moderation.MIN_LENGTH
+
+    def test_same_as_word_scan(self):
+        words = list(BlockedWord.objects.values_list("word", flat=True))
+        self.assertIn("douchebag", words)
+        samples = [
+            "How do I sort a list in Python?",
+            "What a DOUCHEBAG answer",
+            "Too short",
+            "Don't be a douche about it",
+            "Scunthorpe United results",
+            "This is dumbass-proof",
+            "A crapulent evening",
+            "Ärger mit Umlauten und Unicode",
+        ]
+        # Plus random text over the letters of the words, overlaps and all
+        letters = "".join(sorted(set("".join(words)))) + " "
+        rng = random.Random(7)
+        samples += ["".join(rng.choice(letters) for _ in range(rng.randint(5, 40))).strip() or "x" for _ in range(2000)]
+        for text in samples:
+            self.assertEqual(moderation.is_valid_text(text), self.word_scan(text, words), text)
+
+    def test_strips_markup(self):
+        self.assertFalse(moderation.is_valid_text("<p>Hello <strong>Bullshit</strong> world</p>"))
+        # Nor hide one
+        self.assertFalse(moderation.is_valid_text("<p>What is this <b>sh</b>it about</p>"))
+        # Attributes and tags neither match nor count towards the length
+        self.assertTrue(moderation.is_valid_text('<a href="/crap/">A perfectly fine link</a>'))
+        self.assertFalse(moderation.is_valid_text("<p><br><b>Short</b></p>"))
+        self.assertFalse(moderation.is_valid_text("Entities &amp; a &#99;rap hidden"))
+
+    def test_reloads_on_edit(self):
+        text = "Tell me about kumquats"
+        self.assertTrue(moderation.is_valid_text(text))
+        word = BlockedWord.objects.create(word="Kumquat")
+        self.assertFalse(moderation.is_valid_text(text))
+        word.delete()
+        self.assertTrue(moderation.is_valid_text(text))
+
+
+class RichTextTests(TestCase):
+    def test_clean(self):
+        cleaned, text = richtext.clean(
+            '<p onclick="steal()">Hello <b>world<script>alert(1)</script></b></p>'
+            '<a href="javascript:alert(1)">bad</a><a href=" JaVa\tScript:x">worse</a>'
+            '<a href="https://example.com" target="_blank">good</a>'
+            "<ul><li>one<li>two</ul><p>1 &lt; 2 &amp; <i>unclosed"
+        )
+        self.assertEqual(
+            cleaned,
+            '<p>Hello <b>world</b></p><a rel="nofollow noopener">bad</a><a rel="nofollow noopener">worse</a>'
+            '<a href="https://example.com" rel="nofollow noopener">good</a>'
+            "<ul><li>one<li>two</li></li></ul><p>1 &lt; 2 &amp; <i>unclosed</i></p>",
+        )
+        self.assertEqual(text, "Hello world badworsegood one two 1 < 2 & unclosed")
+
+    def test_excerpt(self):
+        self.assertEqual(richtext.excerpt("one two"), "one two")
+        self.assertEqual(richtext.excerpt(" ".join(["word"] * 11)), " ".join(["word"] * 10) + "…")
+
+    def test_processed_on_save(self):
+        user = User.objects.create_user(username="writer")
+        question = Question.objects.create(
+            user=user, title="Rich", content="<p>First</p><p>second <img src=x onerror=alert(1)></p>"
+        )
+        self.assertEqual(question.content, '<p>First</p><p>second <img src="x"></p>')
+        self.assertEqual((question.content_text, question.excerpt, question.word_count), ("First second", "First second", 2))
+
+        question.content = "<p>Edited</p>"
+        question.save(update_fields=["content"])
+        question.refresh_from_db()
+        self.assertEqual((question.content_text, question.word_count), ("Edited", 1))
+
+        comment = Comment.objects.create(question=question, author=user, name="writer", content="<em>An</em> answer")
+        self.assertEqual((comment.content_text, comment.word_count), ("An answer", 2))
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_lists_and_search_use_the_text(self):
+        user = User.objects.create_user(username="writer")
+        Question.objects.create(
+            user=user, title="Long", content="<p>%s</p><p>tail</p>" % " ".join(["lorem"] * 12)
+        )
+        response = self.client.get(reverse("stackbase:question-lists"))
+        self.assertContains(response, " ".join(["lorem"] * 10) + "…")
+        self.assertNotContains(response, "&lt;p&gt;")
+        self.assertContains(response, "Read More")
+
+        # Words either side of a block tag aren't glued together
+        response = self.client.get(reverse("stackbase:question-lists"), {"search-bar": "tail"})
+        self.assertEqual([q.title for q in response.context["questions"]], ["Long"])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="asker")
+        cls.tag = Tag.objects.create(name="django")
+
+    def ask(self, title, content, tags=()):
+        question = Question.objects.create(user=self.user, title=title, content=content)
+        question.tags.set(tags)
+        return question
+
+    def titles(self, search_input):
+        questions, ordering = search.search_questions(Question.objects.all(), search_input)
+        return [q.title for q in questions.order_by(*(ordering or ("-date_created", "-id")))]
+
+    def test_title_hits_rank_first(self):
+        self.ask("Caching views", "<p>How do I cache a page?</p>")
+        self.ask("Slow pages", "<p>Would caching help here?</p>")
+        self.ask("Unrelated", "<p>Nothing to see</p>")
+        self.assertEqual(self.titles("caching"), ["Caching views", "Slow pages"])
+        # Prefix terms, any word may match
+        self.assertEqual(set(self.titles("cach nothing")), {"Caching views", "Slow pages", "Unrelated"})
+
+    def test_tags_and_words(self):
+        self.ask("Tagged signals", "<p>About signals</p>", [self.tag])
+        self.ask("Untagged signals", "<p>About signals</p>")
+        self.ask("Tagged forms", "<p>About forms</p>", [self.tag])
+        self.assertEqual(self.titles("[django] signals"), ["Tagged signals"])
+        self.assertEqual(set(self.titles("[django]")), {"Tagged signals", "Tagged forms"})
+        self.assertEqual(self.titles("[flask] signals"), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        question = self.ask("Original", "<p>First draft</p>")
+        question.title = "Edited"
+        question.content = "<p>Second draft</p>"
+        question.save()
+        self.assertEqual(self.titles("second"), ["Edited"])
+        self.assertEqual(self.titles("first"), [])
+        self.assertEqual(self.titles("original"), [])
+        question.delete()
+        self.assertEqual(self.titles("draft"), [])
+
+    def test_markup_never_matches(self):
+        self.ask("Formatting", "<p>Some <strong>bold</strong> text</p>")
+        self.assertEqual(self.titles("p"), [])
+        self.assertEqual(self.titles("strong"), [])
+        self.assertEqual(self.titles("bold"), ["Formatting"])
+
+    def test_operators_are_plain_words(self):
+        self.ask("Templates in c++", "<p>Is it near the end?</p>")
+        for search_input in ['"', "*", "NEAR", 'NEAR(templates end)', "c++", "templates*", '"templates', "AND -"]:
+            with self.subTest(search_input=search_input):
+                self.assertIsInstance(self.titles(search_input), list)
+        self.assertEqual(self.titles("c++"), ["Templates in c++"])
+        self.assertEqual(self.titles("NEAR"), ["Templates in c++"])
+        self.assertEqual(self.titles('"templates'), ["Templates in c++"])
+        self.assertEqual(self.titles('" *'), [])
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_ranked_pages(self):
+        for i in range(25):
+            self.ask(f"Question {i}", "<p>Mentions caching</p>" if i % 2 else "<p>Caching, caching and caching</p>")
+        url = reverse("stackbase:question-lists")
+        first = self.client.get(url, {"search-bar": "caching", "format": "json"}).json()
+        second = self.client.get(first["next"]).json()
+        self.assertIsNone(second["next"])
+        ids = [row["id"] for row in first["results"] + second["results"]]
+        expected, ordering = search.search_questions(Question.objects.all(), "caching")
+        self.assertEqual(ids, list(expected.order_by(*ordering).values_list("id", flat=True)))
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class QuestionDetailQueryTests(QueryBudgetMixin, TestCase):
+    # The question with its user and category, then its answers
+    ANONYMOUS_BUDGET = 2
+    # Plus the session, the user and one query for everything they liked
+    USER_BUDGET = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="asker", password="pass")
+        cls.question = Question.objects.create(
+            user=cls.user,
+            title="How many queries?",
+            content="<p>A fixed number, hopefully</p>",
+            category=Category.objects.create(name="python"),
+        )
+        cls.url = reverse("stackbase:question-detail", args=[cls.question.pk])
+
+    def add_answers(self, count):
+        for i in range(count):
+            comment = Comment.objects.create(
+                question=self.question, author=self.user, name="asker", content=f"Answer {i}"
+            )
+            if i % 2:
+                comment.likes.add(self.user)
+
+    def test_anonymous(self):
+        self.add_answers(2)
+        self.assertQueryBudget(self.url, self.ANONYMOUS_BUDGET)
+        self.add_answers(20)
+        self.assertQueryBudget(self.url, self.ANONYMOUS_BUDGET)
+
+    def test_liked_by_me(self):
+        self.client.force_login(self.user)
+        self.question.likes.add(self.user)
+        self.add_answers(2)
+        self.assertQueryBudget(self.url, self.USER_BUDGET)
+        self.add_answers(20)
+        response = self.assertQueryBudget(self.url, self.USER_BUDGET)
+        self.assertTrue(response.context["liked"])
+        liked = [comment.liked for comment in response.context["comments"]]
+        self.assertEqual(liked, [False, True] * 11)
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="asker", password="pass")
+        cls.category = Category.objects.create(name="python")
+        cls.tag = Tag.objects.create(name="decorators")
+        cls.question = Question.objects.create(
+            user=cls.user,
+            title="How do decorators work?",
+            content="<p>Some content about decorators</p>",
+            category=cls.category,
+        )
+        cls.question.tags.add(cls.tag)
+
+    def setUp(self):
+        caches["pages"].clear()
+
+    def get(self, url):
+        return self.client.get(url)["X-Cache"]
+
+    def change(self, func, *args, **kwargs):
+        # Invalidation runs once the change is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            func(*args, **kwargs)
+
+    def test_anonymous_pages_are_cached(self):
+        url = reverse("stackbase:question-detail", args=[self.question.pk])
+        self.assertEqual(self.get(url), "MISS")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(url), "HIT")
+
+    def test_authenticated_pages_are_not_cached(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("stackbase:question-lists"))
+        self.assertNotIn("X-Cache", response)
+
+    def test_like_invalidates_question_pages(self):
+        detail = reverse("stackbase:question-detail", args=[self.question.pk])
+        tag = reverse("stackbase:tag-question-lists", args=["decorators"])
+        other = reverse("stackbase:tag-question-lists", args=["other"])
+        for url in (detail, tag, other):
+            self.get(url)
+        self.change(self.question.likes.add, self.user)
+        self.assertEqual(self.get(detail), "MISS")
+        self.assertEqual(self.get(tag), "MISS")
+        self.assertEqual(self.get(other), "HIT")
+
+    def test_comment_invalidates_lists(self):
+        lists = reverse("stackbase:question-lists")
+        self.get(lists)
+        self.change(
+            Comment.objects.create,
+            question=self.question,
+            author=self.user,
+            name="asker",
+            content="An answer",
+        )
+        self.assertEqual(self.get(lists), "MISS")
+
+    def test_retagging_invalidates_old_tag_page(self):
+        tag = reverse("stackbase:tag-question-lists", args=["decorators"])
+        self.get(tag)
+        self.change(self.question.tags.clear)
+        self.assertEqual(self.get(tag), "MISS")
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f"user{i}") for i in range(3)]
+        cls.question = Question.objects.create(
+            user=cls.users[0], title="Counting", content="<p>How do I count?</p>"
+        )
+        cls.comment = Comment.objects.create(
+            question=cls.question, author=cls.users[1], name="user1", content="With a counter"
+        )
+
+    def counts(self):
+        self.question.refresh_from_db()
+        self.comment.refresh_from_db()
+        return self.question.like_count, self.question.comment_count, self.comment.like_count
+
+    def test_likes(self):
+        self.question.likes.add(*self.users)
+        self.comment.likes.add(self.users[0])
+        self.assertEqual(self.counts(), (3, 1, 1))
+        # Unliking somebody who never liked changes nothing
+        self.comment.likes.remove(self.users[1])
+        self.question.likes.remove(self.users[1])
+        self.assertEqual(self.counts(), (2, 1, 1))
+        self.question.likes.clear()
+        self.assertEqual(self.counts(), (0, 1, 1))
+
+    def test_unlike_narrows_once(self):
+        self.question.likes.add(self.users[0])
+        with CaptureQueriesContext(connection) as queries:
+            self.question.likes.remove(self.users[0], self.users[1])
+        narrowing = [q for q in queries if q["sql"].startswith("SELECT") and "question_likes" in q["sql"]]
+        # One query narrows the set for both the counter and the scores
+        self.assertEqual(len(narrowing), 1)
+        self.assertEqual(self.counts(), (0, 1, 0))
+        self.assertEqual(
+            list(Profile.objects.filter(user__in=self.users[:2]).order_by("user").values_list("score", flat=True)),
+            [1, 1],  # the question, the comment
+        )
+
+    def test_likes_from_the_user_side(self):
+        self.users[1].question_post.add(self.question)
+        self.users[1].comment_likes.add(self.comment)
+        self.assertEqual(self.counts(), (1, 1, 1))
+        self.users[1].comment_likes.clear()
+        self.assertEqual(self.counts(), (1, 1, 0))
+
+    def test_comments(self):
+        other = Comment.objects.create(
+            question=self.question, author=self.users[2], name="user2", content="Or two"
+        )
+        self.assertEqual(self.counts(), (0, 2, 0))
+        other.delete()
+        self.assertEqual(self.counts(), (0, 1, 0))
+
+    def test_deleted_user_takes_likes(self):
+        self.question.likes.add(*self.users)
+        self.users[2].delete()
+        self.assertEqual(self.counts(), (2, 1, 0))
+
+    def test_save_keeps_counters(self):
+        stale = Question.objects.get(pk=self.question.pk)
+        self.question.likes.add(self.users[1])
+        stale.title = "Counting things"
+        stale.save()
+        self.assertEqual(self.counts(), (1, 1, 0))
+
+    def test_reconcile(self):
+        self.question.likes.add(self.users[1])
+        Question.objects.update(like_count=7, comment_count=0)
+        self.assertEqual(counters.reconcile(fix=False)["Question.like_count"], 1)
+        counters.reconcile()
+        self.assertEqual(self.counts(), (1, 1, 0))
+        self.assertEqual(set(counters.reconcile(fix=False).values()), {0})
+
+
+@override_settings(LIKES_WRITE_BEHIND=False)
+class LikeToggleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner")
+        cls.user = User.objects.create_user(username="liker", password="pass")
+        cls.question = Question.objects.create(
+            user=cls.owner, title="Likes", content="<p>Do you like it?</p>"
+        )
+        cls.comment = Comment.objects.create(
+            question=cls.question, author=cls.owner, name="owner", content="I do"
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def toggle(self, name, pk, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse(name, args=[pk]), data or {})
+
+    def test_toggle_question(self):
+        response = self.toggle("stackbase:question-like", self.question.pk)
+        self.assertEqual(response.json(), {"liked": True, "likes": 1})
+        self.assertTrue(self.question.likes.filter(pk=self.user.pk).exists())
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.score, 1)
+
+        response = self.toggle("stackbase:question-like", self.question.pk)
+        self.assertEqual(response.json(), {"liked": False, "likes": 0})
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.score, 0)
+
+    def test_explicit_state_is_idempotent(self):
+        for _ in range(2):
+            response = self.toggle("stackbase:comment-like", self.comment.pk, {"liked": "1"})
+            self.assertEqual(response.json(), {"liked": True, "likes": 1})
+        for _ in range(2):
+            response = self.toggle("stackbase:comment-like", self.comment.pk, {"liked": "0"})
+            self.assertEqual(response.json(), {"liked": False, "likes": 0})
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.score, 0)
+
+    def test_invalidates_cached_detail_page(self):
+        caches["pages"].clear()
+        url = reverse("stackbase:question-detail", args=[self.question.pk])
+        self.client.logout()
+        self.client.get(url)
+        self.client.force_login(self.user)
+        self.toggle("stackbase:comment-like", self.comment.pk)
+        self.client.logout()
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.post(reverse("stackbase:question-like", args=[self.question.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(LIKES_WRITE_BEHIND=True, PAGE_CACHE_ENABLED=False)
+class LikeWriteBehindTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner")
+        cls.user = User.objects.create_user(username="liker", password="pass")
+        cls.question = Question.objects.create(
+            user=cls.owner, title="Likes later", content="<p>Do you like it?</p>"
+        )
+        cls.comment = Comment.objects.create(
+            question=cls.question, author=cls.owner, name="owner", content="I do"
+        )
+        cls.detail_url = reverse("stackbase:question-detail", args=[cls.question.pk])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def toggle(self, name, pk, data=None):
+        return self.client.post(reverse(name, args=[pk]), data or {}).json()
+
+    def flush(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return likes.flush_likes()
+
+    def score(self, user):
+        user.profile.refresh_from_db()
+        return user.profile.score
+
+    def test_queued_until_flushed(self):
+        # Session, user, object, its like state and the event
+        with self.assertNumQueries(5):
+            response = self.toggle("stackbase:question-like", self.question.pk)
+        self.assertEqual(response, {"liked": True, "likes": 1})
+        self.assertFalse(self.question.likes.exists())
+        self.assertEqual(self.score(self.user), 0)
+
+        # The user sees their own pending like
+        response = self.client.get(self.detail_url)
+        self.assertTrue(response.context["liked"])
+        self.assertEqual(response.context["total_likes"], 1)
+
+        self.assertEqual(self.flush(), 1)
+        self.assertTrue(self.question.likes.filter(pk=self.user.pk).exists())
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.like_count, 1)
+        self.assertEqual(self.score(self.user), 1)
+        self.assertFalse(LikeEvent.objects.exists())
+
+    def test_toggles_collapse(self):
+        for _ in range(3):
+            self.toggle("stackbase:question-like", self.question.pk)
+        self.toggle("stackbase:comment-like", self.comment.pk)
+        self.toggle("stackbase:comment-like", self.comment.pk)
+        # A repeated explicit state queues nothing
+        self.toggle("stackbase:comment-like", self.comment.pk, {"liked": "0"})
+        self.assertEqual(LikeEvent.objects.count(), 5)
+
+        self.assertEqual(self.flush(), 5)
+        self.assertEqual(list(self.question.likes.all()), [self.user])
+        self.assertFalse(self.comment.likes.exists())
+        self.assertEqual(self.score(self.user), 1)
+        self.assertEqual(set(counters.reconcile(fix=False).values()), {0})
+
+    def test_pending_unlike(self):
+        self.comment.likes.add(self.user)
+        self.assertEqual(self.toggle("stackbase:comment-like", self.comment.pk), {"liked": False, "likes": 0})
+        response = self.client.get(self.detail_url)
+        [comment] = response.context["comments"]
+        self.assertFalse(comment.liked)
+        self.assertEqual(comment.total_likes(), 0)
+
+        self.flush()
+        self.assertFalse(self.comment.likes.exists())
+        self.assertEqual(self.score(self.user), 0)
+        self.assertEqual(set(counters.reconcile(fix=False).values()), {0})
+
+    def test_flush_invalidates_cached_pages(self):
+        self.toggle("stackbase:question-like", self.question.pk)
+        with override_settings(PAGE_CACHE_ENABLED=True):
+            caches["pages"].clear()
+            self.client.logout()
+            self.client.get(self.detail_url)
+            self.flush()
+            self.assertEqual(self.client.get(self.detail_url)["X-Cache"], "MISS")
+
+
+class TaxonomyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="python")
+        cls.tags = [Tag.objects.create(name=name) for name in ("django", "asyncio")]
+        cls.category.tags.set(cls.tags)
+        cls.url = reverse("stackbase:get_tags")
+
+    def setUp(self):
+        # The test data went in without committing, so nothing bumped the version
+        taxonomy.invalidate()
+
+    def get_tags(self, **headers):
+        return self.client.get(self.url, {"category_id": self.category.pk}, **headers)
+
+    def test_get_tags(self):
+        response = self.get_tags()
+        self.assertEqual(
+            response.json(),
+            [{"id": tag.pk, "name": tag.name} for tag in self.tags],
+        )
+        with self.assertNumQueries(0):
+            self.get_tags()
+        self.assertEqual(self.client.get(self.url, {"category_id": "x"}).json(), [])
+
+    def test_not_modified(self):
+        etag = self.get_tags()["ETag"]
+        response = self.get_tags(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_reload(self):
+        etag = self.get_tags()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.tags.add(Tag.objects.create(name="typing"))
+        response = self.get_tags(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_version_expires(self):
+        # A change another process made, whose bump this process's cache never saw
+        etag = self.get_tags()["ETag"]
+        Category.tags.through.objects.create(category=self.category, tag=Tag.objects.create(name="typing"))
+        self.assertEqual(self.get_tags(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        expired = time.time() + taxonomy.version_timeout() + 1
+        with mock.patch("time.time", return_value=expired):
+            response = self.get_tags(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+
+class AsyncViewTests(TestCase):
+    """The async views serve what their sync counterparts do."""
+
+    list_views = {
+        "question-lists": "QuestionListView",
+        "tag-question-lists": "TagQuestionListView",
+        "category-question-lists": "CategoryQuestionListView",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="asker", password="pass")
+        cls.category = Category.objects.create(name="python")
+        cls.tag = Tag.objects.create(name="asyncio")
+        cls.category.tags.add(cls.tag)
+        cls.questions = []
+        for i in range(3):
+            question = Question.objects.create(
+                user=cls.user, title=f"Question {i}", content="<p>Body</p>", category=cls.category
+            )
+            question.tags.add(cls.tag)
+            cls.questions.append(question)
+        comment = Comment.objects.create(
+            question=cls.questions[0], author=cls.user, name="asker", content="An answer"
+        )
+        comment.likes.add(cls.user)
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        taxonomy.invalidate()
+        leaderboard.invalidate()
+
+    def request(self, path, user=None, headers=None):
+        request = self.factory.get(path, headers=headers)
+        request.user = user or AnonymousUser()
+        return request
+
+    async def render(self, view, request, **kwargs):
+        response = await view(request, **kwargs)
+        if hasattr(response, "render"):
+            # Outside the event loop, like Django's async handler
+            await sync_to_async(response.render)()
+        return response
+
+    async def assertSameList(self, name, **kwargs):
+        path = reverse(f"stackbase:{name}", kwargs=kwargs)
+        sync_view = getattr(views, self.list_views[name]).as_view()
+        async_view = getattr(async_views, self.list_views[name]).as_view()
+        expected = await sync_to_async(sync_view)(self.request(path), **kwargs)
+        response = await self.render(async_view, self.request(path), **kwargs)
+        self.assertEqual(
+            list(response.context_data["questions"]), list(expected.context_data["questions"])
+        )
+
+    async def test_lists(self):
+        await self.assertSameList("question-lists")
+        await self.assertSameList("tag-question-lists", tag=self.tag.slug)
+        await self.assertSameList("category-question-lists", category=self.category.slug)
+
+    async def test_detail(self):
+        question = self.questions[0]
+        view = async_views.QuestionDetailView.as_view()
+        path = reverse("stackbase:question-detail", args=[question.pk])
+        response = await self.render(view, self.request(path, self.user), pk=question.pk)
+        self.assertEqual(response.context_data["question"], question)
+        self.assertEqual([comment.liked for comment in response.context_data["comments"]], [True])
+        with self.assertRaises(Http404):
+            await view(self.request(path), pk=0)
+
+    async def test_get_tags(self):
+        path = reverse("stackbase:get_tags") + f"?category_id={self.category.pk}"
+        response = await async_views.get_tags(self.request(path))
+        self.assertEqual(json.loads(response.content), [{"id": self.tag.pk, "name": self.tag.name}])
+        response = await async_views.get_tags(self.request(path, headers={"If-None-Match": response["ETag"]}))
+        self.assertEqual(response.status_code, 304)
+
+    async def test_leaderboard(self):
+        response = await self.render(
+            async_views.leaderboard, self.request(reverse("stackbase:leaderboard"), self.user)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data["entries"][0].username, "asker")
+
+
+@override_settings(READ_REPLICA=True, PAGE_CACHE_ENABLED=False)
+class ReplicaRoutingTests(TestCase):
+    # Two separate SQLite test databases; nothing replicates, so whatever was
+    # written to the primary only shows where a read went to the primary
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="asker", password="pass")
+        cls.question = Question.objects.create(
+            user=cls.user, title="On the primary", content="<p>Not replicated yet</p>"
+        )
+
+    def list_titles(self):
+        response = self.client.get(reverse("stackbase:question-lists"))
+        return [question.title for question in response.context["questions"]]
+
+    def test_router(self):
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Question), "default")
+        with routers.replica_reads():
+            self.assertEqual(router.db_for_read(Question), "replica")
+            self.assertEqual(router.db_for_read(Session), "default")
+            self.assertEqual(router.db_for_write(Question), "default")
+            with override_settings(READ_REPLICA=False):
+                self.assertEqual(router.db_for_read(Question), "default")
+
+    def test_replica_views(self):
+        self.assertEqual(self.list_titles(), [])
+        response = self.client.get(reverse("stackbase:question-detail", args=[self.question.pk]))
+        self.assertEqual(response.status_code, 404)
+        export = b"".join(self.client.get(reverse("stackbase:export-data")).streaming_content)
+        self.assertNotIn(b"On the primary", export)
+
+        # Replication copies rows, it doesn't send signals
+        User.objects.using("replica").bulk_create([User(pk=self.user.pk, username="asker")])
+        Question.objects.using("replica").bulk_create(
+            [Question(user=self.user, title="Replicated", content="<p>Here</p>")]
+        )
+        self.assertEqual(self.list_titles(), ["Replicated"])
+
+    def test_other_views_use_primary(self):
+        taxonomy.invalidate()
+        category = Category.objects.create(name="python")
+        category.tags.add(Tag.objects.create(name="django"))
+        response = self.client.get(reverse("stackbase:get_tags"), {"category_id": category.pk})
+        self.assertEqual([tag["name"] for tag in response.json()], ["django"])
+
+    def test_sticky_after_post(self):
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("stackbase:question-like", args=[self.question.pk]))
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.list_titles(), ["On the primary"])
+
+        del self.client.cookies[routers.STICKY_COOKIE]
+        self.assertEqual(self.list_titles(), [])
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="asker")
+        cls.category = Category.objects.create(name="python")
+        cls.tag = Tag.objects.create(name="django")
+
+    def ask(self, title, age, category=None, tags=()):
+        question = Question.objects.create(
+            user=self.user,
+            title=title,
+            content="<p>Asked</p>",
+            category=category,
+            date_created=timezone.now() - age,
+        )
+        question.tags.set(tags)
+        return question
+
+    def rows(self):
+        # Emptied buckets stay behind at 0
+        return set(QuestionDayCount.objects.filter(count__gt=0).values_list("day", "category_id", "tag_id", "count"))
+
+    def assertMatchesRecount(self):
+        rows = self.rows()
+        trending.rebuild()
+        self.assertEqual(self.rows(), rows)
+
+    @override_settings(TIME_ZONE="America/New_York")
+    def test_window_start_is_local_midnight(self):
+        # 23:00 on the 9th in New York
+        now = datetime(2026, 3, 10, 3, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(trending.window_start("today", now), datetime(2026, 3, 9, 4, 0, tzinfo=dt_timezone.utc))
+        # Back across the DST change on the 8th, still local midnight
+        self.assertEqual(trending.window_start("week", now), datetime(2026, 3, 3, 5, 0, tzinfo=dt_timezone.utc))
+        self.assertIsNone(trending.window_start("liked", now))
+
+    def test_counts_follow_changes(self):
+        first = self.ask("Today", timedelta(0), self.category, [self.tag])
+        self.ask("Last week", timedelta(days=3), self.category)
+        old = self.ask("Last month", timedelta(days=20), tags=[self.tag])
+        self.assertEqual(trending.window_counts(), {"today": 1, "week": 2, "month": 3})
+        self.assertEqual(trending.window_counts(category_slug="python"), {"today": 1, "week": 2, "month": 2})
+        self.assertEqual(trending.window_counts(tag_slug="django"), {"today": 1, "week": 1, "month": 2})
+        self.assertEqual(trending.trending_tags(), [{"tag__name": "django", "tag__slug": "django", "questions": 1}])
+
+        first.hidden = True
+        first.save()
+        old.tags.clear()
+        self.assertEqual(trending.window_counts(), {"today": 0, "week": 1, "month": 2})
+        self.assertEqual(trending.window_counts(tag_slug="django"), {"today": 0, "week": 0, "month": 0})
+        self.assertEqual(trending.trending_tags(), [])
+        self.tag.question_set.add(old)
+        old.delete()
+        self.assertEqual(trending.window_counts(), {"today": 0, "week": 1, "month": 1})
+        self.assertMatchesRecount()
+
+    def test_moved_question_leaves_its_old_day(self):
+        question = self.ask("Moved", timedelta(days=20), self.category, [self.tag])
+        question.date_created = timezone.now()
+        question.save()
+        self.assertEqual(trending.window_counts(), {"today": 1, "week": 1, "month": 1})
+        self.assertEqual(trending.window_counts(tag_slug="django"), {"today": 1, "week": 1, "month": 1})
+        # Moved out of the window altogether
+        question.date_created = timezone.now() - timedelta(days=40)
+        question.category = None
+        question.save()
+        self.assertEqual(trending.window_counts(), {"today": 0, "week": 0, "month": 0})
+        self.assertMatchesRecount()
+
+    def test_writes_cost_the_same_on_busy_days(self):
+        def queries():
+            with CaptureQueriesContext(connection) as captured:
+                self.ask("Another", timedelta(0), self.category, [self.tag])
+            return len(captured)
+
+        self.assertEqual(queries(), queries())
+        for i in range(5):
+            self.ask(f"Busy {i}", timedelta(0), self.category, [self.tag])
+        self.assertEqual(queries(), queries())
+        self.assertEqual(trending.window_counts(tag_slug="django")["today"], 9)
+        self.assertMatchesRecount()
+
+    def test_tabs_share_the_window(self):
+        self.ask("Today", timedelta(0), self.category, [self.tag])
+        self.ask("Long ago", timedelta(days=40), self.category, [self.tag])
+        urls = [
+            reverse("stackbase:question-lists"),
+            reverse("stackbase:category-question-lists", args=["python"]),
+            reverse("stackbase:tag-question-lists", args=["django"]),
+        ]
+        for url in urls:
+            for tab, titles in (("today", ["Today"]), ("month", ["Today"]), (None, ["Today", "Long ago"])):
+                response = self.client.get(url, {"tab": tab} if tab else {})
+                self.assertEqual([q.title for q in response.context["questions"]], titles)
+
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse("stackbase:question-windows"), {"category": "python"}).json()
+        self.assertEqual(data["counts"], {"today": 1, "week": 1, "month": 1})
+        self.assertEqual(data["trending"], [{"name": "django", "slug": "django", "questions": 1}])
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class ReportAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username="admin", password="pass")
+        cls.user = User.objects.create_user(username="asker")
+        cls.reported = Question.objects.create(user=cls.user, title="Reported", content="<p>Spam</p>")
+        cls.other = Question.objects.create(user=cls.user, title="Also reported", content="<p>Rude</p>")
+        cls.clean = Question.objects.create(user=cls.user, title="Clean", content="<p>Fine</p>")
+        for reason in ("spam", "spam", "harassment"):
+            Report.objects.create(user=cls.user, question=cls.reported, reason=reason)
+        Report.objects.create(user=cls.admin, question=cls.other, reason="spam")
+        cls.url = reverse("admin:stackbase_report_changelist")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def run_action(self, action, questions):
+        reports = Report.objects.filter(question__in=questions).values_list("pk", flat=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                self.url, {"action": action, "_selected_action": list(reports)}
+            )
+        self.assertEqual(response.status_code, 302)
+
+    def test_changelist_queries(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        for _ in range(10):
+            Report.objects.create(user=self.user, question=self.clean, reason="spam")
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(few), len(many))
+
+    def test_delete(self):
+        self.run_action("delete_reported_questions", [self.reported, self.other])
+        self.assertQuerysetEqual(Question.objects.all(), [self.clean])
+        self.assertFalse(Report.objects.exists())
+
+    def add_reported(self, count):
+        questions = []
+        for i in range(count):
+            question = Question.objects.create(user=self.user, title=f"Spam {i}", content="<p>Buy now</p>")
+            question.likes.add(self.admin)
+            for author in (self.user, self.admin, None):
+                comment = Comment.objects.create(question=question, author=author, name="gone", content="Me too")
+                comment.likes.add(self.user)
+            Report.objects.create(user=self.admin, question=question, reason="spam")
+            questions.append(question)
+        return questions
+
+    def test_delete_is_set_based(self):
+        counts = []
+        for size in (2, 8):
+            questions = self.add_reported(size)
+            with CaptureQueriesContext(connection) as queries:
+                self.run_action("delete_reported_questions", questions)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(Comment.objects.exists())
+        # The scores took back exactly what the deleted rows counted for
+        scores = list(Profile.objects.order_by("user").values_list("score", flat=True))
+        scoring.recompute_scores()
+        self.assertEqual(list(Profile.objects.order_by("user").values_list("score", flat=True)), scores)
+        self.assertEqual(search.search_questions(Question.objects.all(), "buy")[0].count(), 0)
+
+    def test_hide(self):
+        self.run_action("hide_reported_questions", [self.reported])
+        self.assertQuerysetEqual(Question.objects.filter(hidden=True), [self.reported])
+        self.assertEqual(Report.objects.count(), 4)
+        response = self.client.get(reverse("stackbase:question-lists"))
+        self.assertNotIn(self.reported, response.context["questions"])
+        response = self.client.get(reverse("stackbase:question-detail", args=[self.reported.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(LIKES_WRITE_BEHIND=False)
+    def test_hidden_questions_are_out_of_reach(self):
+        comment = Comment.objects.create(question=self.reported, author=self.user, name="asker", content="Answer")
+        self.run_action("hide_reported_questions", [self.reported])
+        pk = self.reported.pk
+        for url, data in [
+            (reverse("stackbase:export_question_comments", args=[pk]), None),
+            (reverse("stackbase:like_post", args=[pk]), {"question_id": pk}),
+            (reverse("stackbase:like_comment", args=[comment.pk]), {}),
+            (reverse("stackbase:question-like", args=[pk]), {}),
+            (reverse("stackbase:comment-like", args=[comment.pk]), {}),
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url) if data is None else self.client.post(url, data)
+                self.assertEqual(response.status_code, 404)
+        self.assertFalse(self.reported.likes.exists() or comment.likes.exists())
+        response = self.client.post(reverse("stackbase:question-like", args=[self.clean.pk]))
+        self.assertEqual(response.json()["likes"], 1)
+
+    def test_dismiss(self):
+        self.run_action("dismiss_reports", [self.reported])
+        self.assertEqual(Question.objects.count(), 3)
+        self.assertQuerysetEqual(Report.objects.values_list("question", flat=True), [self.other.pk])
+
+    def test_summary(self):
+        response = self.client.get(reverse("admin:stackbase_report_summary"))
+        rows = list(response.context["page"])
+        self.assertEqual([row["question_id"] for row in rows], [self.reported.pk, self.other.pk])
+        self.assertEqual((rows[0]["reports"], rows[0]["reporters"]), (3, 1))
+        self.assertEqual(
+            rows[0]["reasons"],
+            [("Inappropriate Content", 0), ("Spam", 2), ("Harassment", 1)],
+        )
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="asker", password="pass")
+        cls.staff = User.objects.create_user(username="staff", is_staff=True)
+        for i in range(3):
+            Question.objects.create(user=cls.user, title=f"Question {i}", content="<p>Body</p>")
+        cls.url = reverse("stackbase:question-lists")
+
+    def setUp(self):
+        instrumentation.reset()
+
+    def metrics(self):
+        self.client.force_login(self.staff)
+        return self.client.get(reverse("stackbase:metrics")).json()["views"]
+
+    def test_server_timing(self):
+        response = self.client.get(self.url)
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="2 queries", tpl;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+
+    def test_metrics(self):
+        self.client.get(self.url)
+        self.client.get(self.url, {"tab": "week"})
+        b"".join(self.client.get(reverse("stackbase:export-data")).streaming_content)
+        views = self.metrics()
+        lists = views["stackbase:question-lists"]
+        self.assertEqual((lists["requests"], lists["queries_max"], lists["budget"]), (2, 2, 4))
+        self.assertGreater(lists["template_ms_avg"], 0)
+        self.assertGreater(lists["bytes_avg"], 0)
+        # Counted while the rows were streamed
+        export = views["stackbase:export-data"]
+        self.assertGreater(export["queries_max"], 0)
+        self.assertGreater(export["bytes_avg"], 100)
+
+    def test_metrics_staff_only(self):
+        self.assertEqual(self.client.get(reverse("stackbase:metrics")).status_code, 403)
+
+    def test_duplicate_fingerprints(self):
+        stats = instrumentation.RequestStats().start()
+        try:
+            for question in Question.objects.all():
+                question.user.username
+            list(Question.objects.filter(pk__in=[1, 2]))
+            list(Question.objects.filter(pk__in=[1, 2, 3]))
+        finally:
+            stats.stop()
+        self.assertEqual(sorted(stats.duplicates.values()), [2, 3])
+
+    @override_settings(QUERY_BUDGETS={"stackbase:question-lists": 1})
+    def test_budget(self):
+        with self.assertRaisesMessage(
+            instrumentation.QueryBudgetExceeded, "stackbase:question-lists ran 2 queries"
+        ):
+            self.client.get(self.url)
+        with override_settings(QUERY_BUDGET_STRICT=False):
+            with self.assertLogs("stackbase.instrumentation", "WARNING"):
+                self.client.get(self.url)
+        self.assertEqual(self.metrics()["stackbase:question-lists"]["over_budget"], 2)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_generate_and_run(self):
+        call_command(
+            "generate_data", users=20, questions=60, comments=150, likes=150,
+            categories=4, tags=10, stdout=StringIO(),
+        )
+        self.assertEqual(Question.objects.count(), 60)
+        self.assertFalse(any(counters.reconcile(fix=False).values()))
+        self.assertTrue(Question.objects.filter(tags__isnull=False).exists())
+        # The Zipf head gets more questions than the tail
+        sizes = [category.question_set.count() for category in Category.objects.order_by("pk")]
+        self.assertGreater(sizes[0], sizes[-1])
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "bench.json")
+            options = {"repeat": 2, "output": output, "host": "testserver", "stdout": StringIO()}
+            call_command("run_benchmarks", **options)
+            call_command("run_benchmarks", compare=output, **options)
+            with open(output) as f:
+                report = json.load(f)
+        self.assertEqual(report["dataset"]["Question"], 60)
+        self.assertLessEqual({"list", "detail", "search", "like", "comment", "export", "leaderboard"}, set(report["results"]))
+        self.assertEqual(report["results"]["list"]["queries"], 2)
+        # Writes were rolled back
+        self.assertEqual(Comment.objects.count(), 150)
+
+
+class ExportDataTests(TestCase):
+    # The category or tag, then the questions, their tags and their answers
+    SCOPED_BUDGET = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="exporter")
+        cls.category = Category.objects.create(name="python")
+        cls.tag = Tag.objects.create(name="django")
+
+    def ask(self, title, category=None, tags=(), answers=0, hidden=False):
+        question = Question.objects.create(
+            user=self.user, title=title, content="<p>Asked</p>", category=category, hidden=hidden
+        )
+        question.tags.set(tags)
+        for i in range(answers):
+            Comment.objects.create(question=question, author=self.user, name="exporter", content=f"Answer {i}")
+        return question
+
+    def export(self, url, budget):
+        with self.assertNumQueries(budget):
+            response = self.client.get(url)
+            content = b"".join(response.streaming_content).decode("utf-8")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertTrue(content.startswith("\ufeff"))
+        header, *rows = csv.reader(StringIO(content[1:]))
+        self.assertEqual(header, exports.EXPORT_HEADER)
+        return rows
+
+    def test_rows(self):
+        self.ask("Answered", self.category, [self.tag], answers=2)
+        self.ask("Unanswered")
+        self.ask("Hidden", self.category, [self.tag], answers=1, hidden=True)
+        rows = self.export(reverse("stackbase:export-data"), self.SCOPED_BUDGET - 1)
+        self.assertEqual(
+            [(row[0], row[4], row[5], row[6], row[7]) for row in rows],
+            [
+                ("Answered", "python", "django", "Answer 0", "exporter"),
+                ("Answered", "python", "django", "Answer 1", "exporter"),
+                ("Unanswered", "", "", "", ""),
+            ],
+        )
+        self.assertEqual(rows[0][1:3], ["<p>Asked</p>", "exporter"])
+
+    def test_scopes(self):
+        self.ask("In the category", self.category, answers=1)
+        self.ask("Tagged", tags=[self.tag])
+        self.ask("Neither")
+        url = reverse("stackbase:export-data-category", args=["python"])
+        self.assertEqual([row[0] for row in self.export(url, self.SCOPED_BUDGET)], ["In the category"])
+        url = reverse("stackbase:export-data-tag", args=["django"])
+        self.assertEqual([row[0] for row in self.export(url, self.SCOPED_BUDGET)], ["Tagged"])
+        self.assertEqual(self.client.get(reverse("stackbase:export-data-tag", args=["flask"])).status_code, 404)
+
+    def test_flat_query_count(self):
+        url = reverse("stackbase:export-data-category", args=["python"])
+        self.ask("First", self.category, [self.tag], answers=2)
+        self.assertEqual(len(self.export(url, self.SCOPED_BUDGET)), 2)
+        for i in range(20):
+            self.ask(f"More {i}", self.category, [self.tag], answers=2)
+        self.assertEqual(len(self.export(url, self.SCOPED_BUDGET)), 42)
+
+
+class ExportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="exporter", password="pw")
+        cls.question = Question.objects.create(
+            user=cls.user, title="Exporting", content="<p>How do I export?</p>"
+        )
+        Comment.objects.create(question=cls.question, author=cls.user, name="exporter", content="Like this")
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def test_requires_login(self):
+        response = self.client.post(reverse("stackbase:export-job-create"), {"scope": "all"})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_enqueue_and_reuse(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("stackbase:export-job-create"), {"scope": "all"})
+        self.assertEqual(response.status_code, 202)
+        job = ExportJob.objects.get()
+        self.assertEqual((job.status, job.requested_by), ("pending", self.user))
+        self.assertEqual(exports.enqueue_export("all"), job)
+
+    def test_key_changes_with_comments_and_edits(self):
+        key = exports.artifact_key("all", "", "gzip")
+        comment = Comment.objects.create(question=self.question, author=self.user, name="exporter", content="Or this")
+        self.assertNotEqual(exports.artifact_key("all", "", "gzip"), key)
+        key = exports.artifact_key("all", "", "gzip")
+        comment.content = "Or rather this"
+        comment.save()
+        self.assertNotEqual(exports.artifact_key("all", "", "gzip"), key)
+        key = exports.artifact_key("all", "", "gzip")
+        comment.delete()
+        self.assertNotEqual(exports.artifact_key("all", "", "gzip"), key)
+
+    def test_key_changes_with_swaps_and_renames(self):
+        other = Question.objects.create(user=self.user, title="Hidden", content="<p>Not yet</p>", hidden=True)
+        Comment.objects.create(question=other, author=self.user, name="exporter", content="Hidden too")
+        newest = Question.objects.create(user=self.user, title="Newest", content="<p>Asked last</p>")
+        Comment.objects.create(question=newest, author=self.user, name="exporter", content="Answered last")
+        key = exports.artifact_key("all", "", "gzip")
+        # Same counts and newest rows, different questions
+        Question.objects.filter(pk=self.question.pk).update(hidden=True)
+        Question.objects.filter(pk=other.pk).update(hidden=False)
+        self.assertNotEqual(exports.artifact_key("all", "", "gzip"), key)
+
+        category = Category.objects.create(name="python")
+        tag = Tag.objects.create(name="django")
+        Question.objects.filter(pk=other.pk).update(category=category)
+        other.tags.add(tag)
+        for renamed in (self.user, category, tag):
+            with self.subTest(renamed=renamed):
+                Question.objects.update(date_updated=timezone.now() - timedelta(days=1))
+                key = exports.artifact_key("all", "", "gzip")
+                if isinstance(renamed, User):
+                    renamed.username = "renamed"
+                else:
+                    renamed.name = "renamed"
+                renamed.save()
+                self.assertNotEqual(exports.artifact_key("all", "", "gzip"), key)
+        # Other saves leave the rows alone
+        key = exports.artifact_key("all", "", "gzip")
+        self.user.save(update_fields=["last_login"])
+        category.save()
+        self.assertEqual(exports.artifact_key("all", "", "gzip"), key)
+
+    def test_status_is_private(self):
+        job = exports.enqueue_export("all", user=self.user)
+        url = reverse("stackbase:export-job", args=[job.pk])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user(username="someone"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).json()["status"], "pending")
+        self.client.force_login(User.objects.create_user(username="admin", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_users_share_files(self):
+        other = User.objects.create_user(username="someone")
+        first = exports.enqueue_export("all", user=self.user)
+        waiting = exports.enqueue_export("all", user=other)
+        self.assertNotEqual(waiting, first)
+        self.assertEqual(exports.enqueue_export("all", user=other), waiting)
+        call_command("run_export_worker", once=True, stdout=StringIO())
+        call_command("run_export_worker", once=True, stdout=StringIO())
+        first.refresh_from_db()
+        waiting.refresh_from_db()
+        self.assertEqual((waiting.status, waiting.file.name), ("done", first.file.name))
+        # Finished files are handed out straight away
+        third = exports.enqueue_export("all", user=User.objects.create_user(username="third"))
+        self.assertEqual((third.status, third.file.name), ("done", first.file.name))
+
+        path = first.file.path
+        ExportJob.objects.filter(pk__in=[first.pk, waiting.pk]).update(expires_at=timezone.now())
+        self.assertEqual(exports.purge_expired(), 2)
+        self.assertTrue(os.path.exists(path))
+        ExportJob.objects.update(expires_at=timezone.now())
+        self.assertEqual(exports.purge_expired(), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_worker_writes_and_purges(self):
+        job = exports.enqueue_export("all")
+        call_command("run_export_worker", once=True, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        with job.file.open("rb") as f:
+            self.assertIn(b"Like this", gzip.decompress(f.read()))
+        # Reused until it expires
+        self.assertEqual(exports.enqueue_export("all"), job)
+        ExportJob.objects.filter(pk=job.pk).update(expires_at=timezone.now())
+        self.assertNotEqual(exports.enqueue_export("all"), job)
+        path = job.file.path
+        self.assertEqual(exports.purge_expired(), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_stuck_job_is_requeued_then_failed(self):
+        job = exports.enqueue_export("all")
+        self.assertEqual(exports.claim_next_job(), job)
+        # The worker died: nobody refreshes the claim
+        stale = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_CLAIM_TIMEOUT + 1)
+        ExportJob.objects.filter(pk=job.pk).update(claimed_at=stale)
+        self.assertNotEqual(exports.enqueue_export("all"), job)
+        ExportJob.objects.exclude(pk=job.pk).delete()
+
+        claimed = exports.claim_next_job()
+        self.assertEqual((claimed, claimed.attempts), (job, 2))
+        # The first worker comes back and finds the job taken over
+        self.assertFalse(exports.heartbeat(job))
+        exports.run_job(claimed)
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, "done")
+
+        ExportJob.objects.filter(pk=job.pk).update(
+            status="running", claimed_at=stale, attempts=settings.EXPORT_JOB_MAX_ATTEMPTS
+        )
+        self.assertIsNone(exports.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="pager")
+        # Ties on date_created are broken by id
+        asked = timezone.now()
+        Question.objects.bulk_create(
+            Question(user=user, title=f"Page {i}", content="x", date_created=asked - timedelta(hours=i // 3))
+            for i in range(45)
+        )
+
+    def cursor(self, values):
+        raw = json.dumps(values).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def test_pages_cover_the_feed_once(self):
+        seen = []
+        url = reverse("stackbase:question-lists") + "?format=json"
+        while url:
+            data = self.client.get(url).json()
+            seen += [question["id"] for question in data["results"]]
+            url = data["next"]
+        expected = list(Question.objects.order_by("-date_created", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursors_are_404(self):
+        for cursor in [
+            "not base64!",
+            self.cursor({"id": 1}),
+            self.cursor(["2024-01-01T00:00:00+00:00"]),
+            self.cursor(["2024-01-01T00:00:00+00:00", "abc"]),
+            self.cursor(["yesterday", 1]),
+            self.cursor([20240101, 1]),
+            self.cursor([None, 1]),
+            self.cursor(["2024-01-01T00:00:00+00:00", 10**30]),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse("stackbase:question-lists"), {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_annotation_keys(self):
+        paginator = pagination.KeysetPaginator(
+            Question.objects.annotate(rank=Value(1.5)), 10, ordering=("rank", "-id")
+        )
+        self.assertEqual(paginator.decode_cursor(self.cursor([1.5, "7"])), [1.5, 7])
+        with self.assertRaises(pagination.InvalidCursor):
+            paginator.decode_cursor(self.cursor(["1.5", 7]))
@@ -0,0 +1,187 @@
+"""Time-window tabs and per-day question counts.
+
+The today/week/month tabs of every question list go through
+``window_start``: local midnight (``TIME_ZONE``) of the first day in the
+window, so "today" is the site's calendar day rather than the server's, and
+the tabs line up with the day buckets below.
+
+``QuestionDayCount`` holds how many visible questions were asked each day,
+overall, per category and per tag. Every change is applied as +1/-1 deltas
+to the buckets it touches: the signal handlers in ``stackbase.signals`` take
+the ``buckets`` of the changed questions before and after the change and
+``apply_change`` adds the difference, with ``F()`` updates as in
+``stackbase.counters``. A write costs the same however many questions were
+asked that day, and concurrent writes add up instead of overwriting each
+other. ``window_counts`` and ``trending_tags`` then add up a few dozen of
+these rows instead of scanning questions. ``rebuild`` recounts everything,
+for backfills such as ``generate_data``, which writes rows without signals.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import counters
+from .models import Question, QuestionDayCount
+
+# Days in each tab's window, today included
+WINDOWS = {"today": 1, "week": 7, "month": 30}
+
+
+def site_timezone():
+    return timezone.get_default_timezone()
+
+
+def day_of(value):
+    """The site's calendar day ``value`` falls on."""
+    if settings.USE_TZ:
+        value = timezone.localtime(value, site_timezone())
+    return value.date()
+
+
+def day_start(day):
+    start = datetime.combine(day, time.min)
+    return timezone.make_aware(start, site_timezone()) if settings.USE_TZ else start
+
+
+def window_start(tab, now=None):
+    """Where the ``tab`` window starts, or None for tabs without one."""
+    days = WINDOWS.get(tab)
+    if days is None:
+        return None
+    return day_start(day_of(now or timezone.now()) - timedelta(days=days - 1))
+
+
+def day_counts(questions, tag_links):
+    """``{(day, category_id, tag_id): count}`` of the visible ``questions``
+    and the ``tag_links`` (Question.tags.through rows) of visible questions."""
+    counts = {}
+    by_category = (
+        questions.filter(hidden=False)
+        .annotate(day=TruncDate("date_created", tzinfo=site_timezone()))
+        .values_list("day", "category_id")
+        .annotate(questions=Count("id"))
+        .order_by()
+    )
+    for day, category_id, count in by_category:
+        counts[day, None, None] = counts.get((day, None, None), 0) + count
+        if category_id is not None:
+            counts[day, category_id, None] = count
+    by_tag = (
+        tag_links.filter(question__hidden=False)
+        .annotate(day=TruncDate("question__date_created", tzinfo=site_timezone()))
+        .values_list("day", "tag_id")
+        .annotate(questions=Count("*"))
+        .order_by()
+    )
+    for day, tag_id, count in by_tag:
+        counts[day, None, tag_id] = count
+    return counts
+
+
+def save_counts(model, counts, using="default"):
+    model.objects.using(using).bulk_create(
+        [
+            model(day=day, category_id=category_id, tag_id=tag_id, count=count)
+            for (day, category_id, tag_id), count in counts.items()
+        ],
+        batch_size=1000,
+    )
+
+
+def buckets(question_ids):
+    """``{(day, category_id, tag_id): count}`` the questions ``question_ids``
+    (ids or a subquery) currently add to the day counts."""
+    return day_counts(
+        Question.objects.filter(pk__in=question_ids),
+        Question.tags.through.objects.filter(question__in=question_ids),
+    )
+
+
+def _bucket_filter(keys):
+    # category=None/tag=None become IS NULL
+    condition = Q()
+    for day, category_id, tag_id in keys:
+        condition |= Q(day=day, category_id=category_id, tag_id=tag_id)
+    return condition
+
+
+def add(deltas):
+    """Add ``deltas[(day, category_id, tag_id)]`` to the buckets."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Make sure every bucket has a row first; ignore_conflicts leaves the
+    # ones that exist (or that a concurrent write just created) alone, and
+    # the F() updates then add up whatever order the writes run in
+    QuestionDayCount.objects.bulk_create(
+        [
+            QuestionDayCount(day=day, category_id=category_id, tag_id=tag_id, count=0)
+            for (day, category_id, tag_id), delta in deltas.items()
+            if delta > 0
+        ],
+        ignore_conflicts=True,
+    )
+    rows = QuestionDayCount.objects.filter(_bucket_filter(deltas)).values_list(
+        "pk", "day", "category_id", "tag_id"
+    )
+    counters.add(
+        QuestionDayCount,
+        "count",
+        {pk: deltas[day, category_id, tag_id] for pk, day, category_id, tag_id in rows},
+    )
+
+
+def apply_change(before, question_ids):
+    """Add the difference between ``before`` (``buckets`` taken before a
+    change) and the questions' buckets now."""
+    deltas = {key: -count for key, count in before.items()}
+    for key, count in buckets(question_ids).items():
+        deltas[key] = deltas.get(key, 0) + count
+    add(deltas)
+
+
+def rebuild():
+    """Recount every bucket from the questions, for backfills."""
+    with transaction.atomic():
+        QuestionDayCount.objects.all().delete()
+        save_counts(
+            QuestionDayCount,
+            day_counts(Question.objects.all(), Question.tags.through.objects.all()),
+        )
+
+
+def window_counts(category_slug=None, tag_slug=None, today=None):
+    """Questions in each tab's window: ``{"today": n, "week": n, "month": n}``,
+    overall or for one category or tag, in one query."""
+    today = today or day_of(timezone.now())
+    rows = QuestionDayCount.objects.filter(day__gt=today - timedelta(days=max(WINDOWS.values())))
+    if category_slug:
+        rows = rows.filter(category__slug=category_slug, tag=None)
+    elif tag_slug:
+        rows = rows.filter(tag__slug=tag_slug, category=None)
+    else:
+        rows = rows.filter(category=None, tag=None)
+    per_day = list(rows.values_list("day", "count"))
+    return {
+        tab: sum(count for day, count in per_day if day > today - timedelta(days=days))
+        for tab, days in WINDOWS.items()
+    }
+
+
+def trending_tags(days=7, limit=10, today=None):
+    """The tags with the most questions in the last ``days`` days."""
+    today = today or day_of(timezone.now())
+    return list(
+        QuestionDayCount.objects.filter(
+            day__gt=today - timedelta(days=days), category=None, tag__isnull=False
+        )
+        .values("tag__name", "tag__slug")
+        .annotate(questions=Sum("count"))
+        # Buckets stay behind at 0 when their questions go
+        .filter(questions__gt=0)
+        .order_by("-questions", "tag__name")[:limit]
+    )
@@ -1,31 +1,43 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+from .caching import cached_page, home_scopes, list_scopes, question_scopes
+from .models import Comment, Question
 
 app_name = 'stackbase'
 
+# Read-heavy pages, async under ASGI (see stackbase.async_views)
+reads = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
-    path('', views.home, name="home"),
+    path('', cached_page(home_scopes)(views.home), name="home"),
     path('about/', views.about, name="about"),
 
     # CRUD Function
-    path('questions/', views.QuestionListView.as_view(), name="question-lists"),
+    path('questions/', cached_page(list_scopes)(reads.QuestionListView.as_view()), name="question-lists"),
     path('questions/new/', views.QuestionCreateView.as_view(), name="question-create"),
-    path('questions/<int:pk>/', views.QuestionDetailView.as_view(), name="question-detail"),
+    path('questions/windows/', views.question_windows, name="question-windows"),
+    path('questions/<int:pk>/', cached_page(question_scopes)(reads.QuestionDetailView.as_view()), name="question-detail"),
     path('questions/<int:pk>/update/', views.QuestionUpdateView.as_view(), name="question-update"),
     path('questions/<int:pk>/delete/', views.QuestionDeleteView.as_view(), name="question-delete"),
     path('questions/<int:pk>/comment/', views.AddCommentView.as_view(), name="question-comment"),
     path('like/<int:pk>', views.like_view, name="like_post"),
-    path('questions/tags/<str:tag>/', views.TagQuestionListView.as_view(), name="tag-question-lists"),
-    path('get_tags/', views.get_tags, name='get_tags'),
-    path('questions/category/<str:category>/', views.CategoryQuestionListView.as_view(), name="category-question-lists"),
+    path('questions/tags/<str:tag>/', cached_page(list_scopes)(reads.TagQuestionListView.as_view()), name="tag-question-lists"),
+    path('get_tags/', reads.get_tags, name='get_tags'),
+    path('questions/category/<str:category>/', cached_page(list_scopes)(reads.CategoryQuestionListView.as_view()), name="category-question-lists"),
     path('questions/<int:question_id>/export/', views.export_question_comments, name="export_question_comments"),
 
     path('questions/category/<str:category>/export_data/', views.ExportDataView.as_view(), name="export-data-category"),
     path('questions/tags/<str:tag>/export_data/', views.ExportDataView.as_view(), name="export-data-tag"),
     path('questions/export_data/', views.ExportDataView.as_view(), name="export-data"),
+    path('exports/', views.ExportJobCreateView.as_view(), name="export-job-create"),
+    path('exports/<int:pk>/', views.export_job_status, name="export-job"),
     
     path('like-comment/<int:pk>/', views.like_comment, name="like_comment"),
+    path('questions/<int:pk>/like/', views.LikeToggleView.as_view(model=Question), name="question-like"),
+    path('answers/<int:pk>/like/', views.LikeToggleView.as_view(model=Comment, only_fields=("id", "question_id")), name="comment-like"),
     path('questions/<int:pk>/report/', views.ReportDetailView.as_view(), name="report-question"),
 
-    path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('leaderboard/', reads.leaderboard, name='leaderboard'),
+    path('_metrics', views.metrics, name='metrics'),
 ]
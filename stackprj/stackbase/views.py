@@ -9,23 +9,36 @@ from django.views.generic import (
     DeleteView,
 )
 from django.contrib.auth.mixins import UserPassesTestMixin, LoginRequiredMixin
-from .models import Question, Comment, Tag, Category, Report
+from django.contrib.auth.decorators import login_required
+from .models import Question, Comment, Tag, Category, Report, ExportJob
 from .forms import CommentForm, ReportForm
+from .pagination import KeysetPaginationMixin
+from .search import search_questions
+from .moderation import is_valid_text
+from .likes import change_like, liked_by
+from . import instrumentation, taxonomy, trending
+from .routers import read_alias, replica_view
+from .exports import (
+    EXPORT_HEADER,
+    available_compressions,
+    enqueue_export,
+    export_queryset,
+    export_rows,
+)
 from django.urls import reverse, reverse_lazy
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 from urllib.parse import unquote
-from django.http import JsonResponse, HttpResponse
-from datetime import datetime, timedelta
-from django.http import QueryDict
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views import View
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_GET
 import csv
 from urllib.parse import urlencode
-from django.utils.encoding import smart_str
-from io import StringIO
 from django.utils.safestring import mark_safe
 from django.contrib import messages
-from stackusers.models import Profile
-from django.db.models import F
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from stackusers import leaderboard as ranking
 
 def home(request):
     return render(request, "home.html")
@@ -36,37 +49,90 @@ def about(request):
 
 
 # CRUD Function
+@login_required
 def like_view(request, pk):
-    post = get_object_or_404(Question, id=request.POST.get("question_id"))
-    liked = False
-    if post.likes.filter(id=request.user.id).exists():
-        post.likes.remove(request.user)
-        liked = False
-    else:
-        post.likes.add(request.user)
-        liked = True
-    user_profile = Profile.objects.get(user=request.user)
-    user_profile.update_score()
+    post = get_object_or_404(Question.objects.visible(), id=request.POST.get("question_id"))
+    change_like(post, request.user)
     return HttpResponseRedirect(reverse("stackbase:question-detail", args=[str(pk)]))
 
 
+@login_required
 def like_comment(request, pk):
-    comment = get_object_or_404(Comment, id=pk)
-    liked = False
-    if comment.likes.filter(id=request.user.id).exists():
-        comment.likes.remove(request.user)
-        liked = False
-    else:
-        comment.likes.add(request.user)
-        liked = True
-    user_profile = Profile.objects.get(user=request.user)
-    user_profile.update_score()
+    comment = get_object_or_404(Comment, id=pk, question__hidden=False)
+    change_like(comment, request.user)
     return HttpResponseRedirect(
-        reverse("stackbase:question-detail", args=[str(comment.question.pk)])
+        reverse("stackbase:question-detail", args=[str(comment.question_id)])
     )
 
 
-class QuestionListView(ListView):
+class LikeToggleView(LoginRequiredMixin, View):
+    """Like/unlike without reloading the page.
+
+    POST ``liked=1`` or ``liked=0`` to set the state, nothing to toggle.
+    """
+
+    model = None
+    # All change_like() and the signal receivers need from the object
+    only_fields = ("id",)
+    raise_exception = True
+
+    def get_queryset(self):
+        objects = self.model.objects.only(*self.only_fields)
+        # Hidden questions and their answers can't be liked
+        if self.model is Comment:
+            return objects.filter(question__hidden=False)
+        return objects.filter(hidden=False)
+
+    def post(self, request, pk):
+        obj = get_object_or_404(self.get_queryset(), pk=pk)
+        wanted = {"1": True, "0": False}.get(request.POST.get("liked"))
+        liked, count = change_like(obj, request.user, wanted)
+        return JsonResponse({"liked": liked, "likes": count})
+
+
+class QuestionFeedMixin(KeysetPaginationMixin):
+    """Cursor-paginated question lists, also served as JSON for "load more"."""
+
+    paginate_by = 20
+    replica_reads = True
+    # Popularity tabs sort on the stored counters
+    tab_orderings = {
+        "liked": ("-like_count", "-id"),
+        "answered": ("-comment_count", "-id"),
+    }
+
+    def get_keyset_ordering(self):
+        tab = self.request.GET.get("tab")
+        return self.tab_orderings.get(tab, self.keyset_ordering)
+
+    def get_scope_filter(self):
+        """Lookups selecting the questions of this list."""
+        return {}
+
+    def get_queryset(self):
+        # One path for every list; today/week/month start at local midnight
+        return (
+            Question.objects.for_listing()
+            .filter(**self.get_scope_filter())
+            .in_window(self.request.GET.get("tab"))
+            .order_by("-date_created")
+        )
+
+    def serialize_object(self, question):
+        return {
+            "id": question.id,
+            "title": question.title,
+            "url": question.get_absolute_url(),
+            "user": question.user.username,
+            "date_created": question.date_created.isoformat(),
+            "category": question.category.name if question.category else None,
+            "tags": [tag.name for tag in question.tags.all()],
+            "likes": question.like_count,
+            "comments": question.comment_count,
+        }
+
+
+class QuestionListView(QuestionFeedMixin, ListView):
     model = Question
     context_object_name = "questions"
     ordering = "-date_created"
@@ -75,134 +141,68 @@ class QuestionListView(ListView):
         context = super().get_context_data(**kwargs)
         search_input = self.request.GET.get("search-bar") or ""
         if search_input:
-            # Extract tags and titles using regex pattern matching
-            import re
-
-            pattern = r"\[([^]]+)\]"
-            tags = re.findall(pattern, search_input)
-            titles = re.sub(pattern, "", search_input).strip().split()
-
-            # Generate queries for tags and titles
-            tag_query = Q(tags__name__in=tags)
-            title_query = Q()
-            content_query = Q()
-
-            for title in titles:
-                title_query |= Q(title__icontains=title)
-                content_query |= Q(content__icontains=title)
-
-            # Apply filters to the questions queryset
-            if tags:
-                context["questions"] = context["questions"].filter(
-                    tag_query & (title_query | content_query)
-                )
-            else:
-                context["questions"] = context["questions"].filter(
-                    title_query | content_query
-                )
-
             context["search_input"] = search_input
 
         context["tab"] = self.request.GET.get("tab", None)
         return context
-    
-    def get_queryset(self):
-        tab = self.request.GET.get("tab", None)
-        if tab == "today":
-            # Filter questions from today
-            start_date = datetime.now().date()
-            end_date = start_date + timedelta(days=1)
-            queryset = Question.objects.filter(
-                date_created__gte=start_date, date_created__lt=end_date
-            ).order_by("-date_created")
-        elif tab == "week":
-            # Filter questions from the past week
-            start_date = datetime.now() - timedelta(weeks=1)
-            queryset = Question.objects.filter(date_created__gte=start_date).order_by(
-                "-date_created"
-            )
-        elif tab == "month":
-            # Filter questions from the past month
-            start_date = datetime.now() - timedelta(days=30)
-            queryset = Question.objects.filter(date_created__gte=start_date).order_by(
-                "-date_created"
-            )
-        else:
-            # Default: Show all questions
-            queryset = Question.objects.all().order_by("-date_created")
 
+    def get_keyset_ordering(self):
+        # Ranked search results page by relevance instead of date
+        return getattr(self, "search_ordering", None) or super().get_keyset_ordering()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        search_input = self.request.GET.get("search-bar") or ""
+        if search_input:
+            queryset, self.search_ordering = search_questions(queryset, search_input)
         return queryset
 
 
 class QuestionDetailView(DetailView):
     model = Question
+    replica_reads = True
+
+    def get_queryset(self):
+        return Question.objects.visible().select_related("user", "category").prefetch_related(
+            Prefetch(
+                "comment",
+                queryset=Comment.objects.select_related("author__profile").order_by("id"),
+            )
+        )
+
+    def get_liked_ids(self):
+        return liked_by(self.request.user, self.object)
 
     def get_context_data(self, *args, **kwargs):
         context = super(QuestionDetailView, self).get_context_data()
-        something = get_object_or_404(Question, id=self.kwargs["pk"])
-        total_likes = something.total_likes()
-        liked = False
-        if something.likes.filter(id=self.request.user.id).exists():
-            liked = True
-
-        context["total_likes"] = total_likes
-        context["liked"] = liked
+        question = self.object
+        comments = list(question.comment.all())
+        liked_ids = self.get_liked_ids()
+        # The user's own likes still queued, see stackbase.likes
+        pending = liked_ids["pending"]
+        for comment in comments:
+            comment.liked = comment.pk in liked_ids["comment"]
+            comment.like_count += pending["comment"].get(comment.pk, 0)
+
+        context["comments"] = comments
+        context["total_likes"] = question.total_likes() + pending["question"].get(question.pk, 0)
+        context["liked"] = question.pk in liked_ids["question"]
         return context
 
 
-def is_valid_text(text):
-    # List of words that are not allowed in the text
-    blacklist_words = [
-        "fuck",
-        "bitch",
-        "whore",
-        "asshole",
-        "shit",
-        "bastard",
-        "cunt",
-        "dick",
-        "pussy",
-        "cock",
-        "retard",
-        "slut",
-        "wanker",
-        "jerk",
-        "prick",
-        "twat",
-        "douche",
-        "douchebag",
-        "moron",
-        "idiot",
-        "dumbass",
-        "dipshit",
-        "motherfucker",
-        "sonofabitch",
-        "bullshit",
-        "crap",
-        "arse",
-        "bollocks",
-        "frick",
-        "tits",
-        "boobs",
-    ]
-
-    # Minimum length required for the text
-    min_length = 10
-
-    # Check if the text contains any blacklisted words
-    for word in blacklist_words:
-        if word.lower() in text.lower():
-            return False
+class CategoryTagsMixin:
+    """Only offer the tags of the submitted category (see get_tags)."""
 
-    # Check if the text meets the minimum length requirement
-    if len(text) < min_length:
-        return False
-
-    # If the text passes all checks, it is considered valid
-    return True
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        tag_ids = []
+        if self.request.method == "POST":
+            tag_ids = [pk for pk, _ in taxonomy.tags_for(self.request.POST.get("category"))]
+        form.fields["tags"].queryset = Tag.objects.filter(pk__in=tag_ids)
+        return form
 
 
-class QuestionCreateView(LoginRequiredMixin, CreateView):
+class QuestionCreateView(CategoryTagsMixin, LoginRequiredMixin, CreateView):
     model = Question
     fields = ["title", "content", "category", "tags"]
     context_object_name = "question"
@@ -221,26 +221,12 @@ class QuestionCreateView(LoginRequiredMixin, CreateView):
             return self.form_invalid(form)
 
         form.instance.user = self.request.user
-        # Call the update_score function to increase the user's score by 1
-        user_profile = Profile.objects.get(user=self.request.user)
-        user_profile.update_score()
         return super().form_valid(form)
 
-    def get_form(self, form_class=None):
-        form = super().get_form(form_class)
-        if self.request.method == "POST":
-            category_id = self.request.POST.get("category")
-            if category_id:
-                category = Category.objects.get(id=category_id)
-                form.fields["tags"].queryset = category.tags.all()
-            else:
-                form.fields["tags"].queryset = Tag.objects.none()
-        else:
-            form.fields["tags"].queryset = Tag.objects.none()
-        return form
-
 
-class QuestionUpdateView(UserPassesTestMixin, LoginRequiredMixin, UpdateView):
+class QuestionUpdateView(
+    CategoryTagsMixin, UserPassesTestMixin, LoginRequiredMixin, UpdateView
+):
     model = Question
     fields = ["title", "content", "category", "tags"]
 
@@ -259,19 +245,6 @@ class QuestionUpdateView(UserPassesTestMixin, LoginRequiredMixin, UpdateView):
             return True
         return False
 
-    def get_form(self, form_class=None):
-        form = super().get_form(form_class)
-        if self.request.method == "POST":
-            category_id = self.request.POST.get("category")
-            if category_id:
-                category = Category.objects.get(id=category_id)
-                form.fields["tags"].queryset = category.tags.all()
-            else:
-                form.fields["tags"].queryset = Tag.objects.none()
-        else:
-            form.fields["tags"].queryset = Tag.objects.none()
-        return form
-
     def get_success_url(self):
         return reverse_lazy("stackbase:question-detail", kwargs={"pk": self.object.pk})
 
@@ -313,13 +286,10 @@ class AddCommentView(CreateView):
             return self.form_invalid(form)
 
         form.instance.question_id = self.kwargs['pk']
+        form.instance.author = self.request.user
         form.instance.name = self.request.user.username
         response = super().form_valid(form)
 
-        # Call the update_score function to increase the commenter's score by 1
-        commenter_profile = Profile.objects.get(user=self.request.user)
-        commenter_profile.update_score()
-
         # Display a success message
         messages.success(self.request, "Comment successfully added!")
 
@@ -334,53 +304,17 @@ class AddCommentView(CreateView):
 
 
 
-class TagQuestionListView(ListView):
+class TagQuestionListView(QuestionFeedMixin, ListView):
     model = Question
     template_name = "stackbase/question_list.html"
     context_object_name = "questions"
     ordering = ["-date_created"]
 
-    def get_queryset(self):
-        tag = self.kwargs["tag"]
-        tab = self.request.GET.get("tab", None)
-        query_params = QueryDict(mutable=True)
-        query_params.update(self.request.GET)
-        query_params.pop(
-            "tag", None
-        )  # Remove the 'tag' parameter from the query params
-        query_string = query_params.urlencode()
-
-        if tab == "today":
-            # Filter questions from today with the specified tag
-            start_date = datetime.now().date()
-            end_date = start_date + timedelta(days=1)
-            queryset = Question.objects.filter(
-                tags__name=tag, date_created__gte=start_date, date_created__lt=end_date
-            ).order_by("-date_created")
-        elif tab == "week":
-            # Filter questions from the past week with the specified tag
-            start_date = datetime.now() - timedelta(weeks=1)
-            queryset = Question.objects.filter(
-                tags__name=tag, date_created__gte=start_date
-            ).order_by("-date_created")
-        elif tab == "month":
-            # Filter questions from the past month with the specified tag
-            start_date = datetime.now() - timedelta(days=30)
-            queryset = Question.objects.filter(
-                tags__name=tag, date_created__gte=start_date
-            ).order_by("-date_created")
-        else:
-            # Show all questions with the specified tag
-            queryset = Question.objects.filter(tags__name=tag).order_by("-date_created")
-
-        # Add the 'tab' parameter back to the query string
-        if tab:
-            query_string += f"&tab={tab}"
-        queryset = queryset.order_by("-date_created")
-        return queryset
+    def get_scope_filter(self):
+        return {"tags__slug": self.kwargs["tag"]}
 
 
-class CategoryQuestionListView(ListView):
+class CategoryQuestionListView(QuestionFeedMixin, ListView):
     model = Question
     template_name = (
         "stackbase/question_list.html"  # Replace with your actual template name
@@ -388,67 +322,40 @@ class CategoryQuestionListView(ListView):
     context_object_name = "questions"
     ordering = ["-date_created"]
 
-    def get_queryset(self):
-        category_name = self.kwargs["category"]
-        tab = self.request.GET.get("tab", None)
-        query_params = QueryDict(mutable=True)
-        query_params.update(self.request.GET)
-        query_params.pop(
-            "category", None
-        )  # Remove the 'category' parameter from the query params
-        query_string = query_params.urlencode()
-
-        if tab == "today":
-            # Filter questions from today with the specified category
-            start_date = datetime.now().date()
-            end_date = start_date + timedelta(days=1)
-            queryset = Question.objects.filter(
-                category__name=category_name,
-                date_created__gte=start_date,
-                date_created__lt=end_date,
-            ).order_by("-date_created")
-        elif tab == "week":
-            # Filter questions from the past week with the specified category
-            start_date = datetime.now() - timedelta(weeks=1)
-            queryset = Question.objects.filter(
-                category__name=category_name, date_created__gte=start_date
-            ).order_by("-date_created")
-        elif tab == "month":
-            # Filter questions from the past month with the specified category
-            start_date = datetime.now() - timedelta(days=30)
-            queryset = Question.objects.filter(
-                category__name=category_name, date_created__gte=start_date
-            ).order_by("-date_created")
-        else:
-            # Show all questions with the specified category
-            queryset = Question.objects.filter(category__name=category_name).order_by(
-                "-date_created"
-            )
+    def get_scope_filter(self):
+        return {"category__slug": self.kwargs["category"]}
 
-        # Add the 'tab' parameter back to the query string
-        if tab:
-            query_string += f"&tab={tab}"
-        queryset = queryset.order_by("-date_created")
-        return queryset
+
+@replica_view
+@require_GET
+@cache_control(max_age=60)
+def question_windows(request):
+    """Question counts for the today/week/month tabs of a list, and the
+    trending tags, both read from the day buckets (stackbase.trending)."""
+    counts = trending.window_counts(request.GET.get("category"), request.GET.get("tag"))
+    tags = [
+        {"name": row["tag__name"], "slug": row["tag__slug"], "questions": row["questions"]}
+        for row in trending.trending_tags()
+    ]
+    return JsonResponse({"counts": counts, "trending": tags})
+
+
+def taxonomy_etag(request):
+    return f"{taxonomy.current_version()}-{request.GET.get('category_id', '')}"
 
 
+@require_GET
+@cache_control(no_cache=True)
+@etag(taxonomy_etag)
 def get_tags(request):
-    if request.method == "GET":
-        category_id = request.GET.get("category_id")
-        if category_id:
-            try:
-                category = Category.objects.get(id=category_id)
-                tags = category.tags.all()
-                data = [{"id": tag.id, "name": tag.name} for tag in tags]
-                return JsonResponse(data, safe=False)
-            except Category.DoesNotExist:
-                pass
-    return JsonResponse([], safe=False)
+    tags = taxonomy.tags_for(request.GET.get("category_id"))
+    data = [{"id": pk, "name": name} for pk, name in tags]
+    return JsonResponse(data, safe=False)
 
 
 def export_question_comments(request, question_id):
     # Fetch the question and its comments from the database
-    question = get_object_or_404(Question, id=question_id)
+    question = get_object_or_404(Question.objects.visible(), id=question_id)
     comments = question.comment.all()
 
     # Create the content of the file (you can customize this based on your requirement)
@@ -466,78 +373,84 @@ def export_question_comments(request, question_id):
     return response
 
 
+class Echo:
+    """Pseudo-buffer for csv.writer: writerow() returns the line instead of
+    storing it, so rows can be streamed straight to the response."""
+
+    def write(self, value):
+        return value
+
+
 class ExportDataView(View):
+    replica_reads = True
+
     def get(self, request, *args, **kwargs):
-        # Create a StringIO buffer to hold CSV data
-        buffer = StringIO()
-        writer = csv.writer(buffer)
+        category_slug = self.kwargs.get("category")
+        tag_slug = self.kwargs.get("tag")
+
+        if category_slug:
+            category = get_object_or_404(Category, slug=category_slug)
+            questions = export_queryset(category=category)
+        elif tag_slug:
+            tags = get_object_or_404(Tag, slug=tag_slug)
+            questions = export_queryset(tag=tags)
+        else:
+            questions = export_queryset()
+        # The rows are streamed after the request has left ReplicaMiddleware
+        questions = questions.using(read_alias())
 
-        response = HttpResponse(content_type="text/csv")
+        response = StreamingHttpResponse(
+            self.stream(questions), content_type="text/csv"
+        )
         response["Content-Disposition"] = 'attachment; filename="questions_data.csv"'
+        return response
 
-        # Write the BOM (Byte Order Mark) to the response to indicate UTF-8 encoding
-        response.write("\ufeff")
-
-        writer.writerow(
-            [
-                "Title",
-                "Content",
-                "Asked By",
-                "Date Asked",
-                "Category",
-                "Tags",
-                "Comment",
-                "Commented By",
-            ]
-        )
+    def stream(self, questions):
+        writer = csv.writer(Echo())
+        # Write the BOM (Byte Order Mark) to indicate UTF-8 encoding
+        yield "\ufeff"
+        yield writer.writerow(EXPORT_HEADER)
+        for row in export_rows(questions):
+            yield writer.writerow(row)
 
-        category_name = self.kwargs.get("category")
-        tag_name = self.kwargs.get("tag")
 
-        if category_name:
-            category = get_object_or_404(Category, name=category_name)
-            questions = Question.objects.filter(category=category)
-        elif tag_name:
-            tags = get_object_or_404(Tag, name=tag_name)
-            questions = Question.objects.filter(tags=tags)
-        else:
-            questions = Question.objects.all()
-
-        for question in questions:
-            title = smart_str(
-                question.title
-            )  # Use smart_str to ensure correct encoding of title
-            content = smart_str(question.content)
-            asked_by = smart_str(question.user.username)
-            date_asked = question.date_created.strftime("%Y-%m-%d %H:%M:%S")
-            category = smart_str(question.category.name if question.category else "")
-            tags = ", ".join([smart_str(tag.name) for tag in question.tags.all()])
-
-            comments = Comment.objects.filter(question=question)
-            if comments.exists():
-                for comment in comments:
-                    comment_content = smart_str(comment.content)
-                    commented_by = smart_str(comment.name)
-                    writer.writerow(
-                        [
-                            title,
-                            content,
-                            asked_by,
-                            date_asked,
-                            category,
-                            tags,
-                            comment_content,
-                            commented_by,
-                        ]
-                    )
-            else:
-                writer.writerow(
-                    [title, content, asked_by, date_asked, category, tags, "", ""]
-                )
-
-        # Set the CSV data to the response and return
-        response.write(buffer.getvalue())
-        return response
+class ExportJobCreateView(LoginRequiredMixin, View):
+    """Queue an export for the worker and hand back where to poll for it."""
+
+    raise_exception = True
+
+    def post(self, request, *args, **kwargs):
+        scope = request.POST.get("scope", "all")
+        value = request.POST.get("value", "")
+        compression = request.POST.get("compression", "gzip")
+        if scope not in dict(ExportJob.SCOPE_CHOICES):
+            return JsonResponse({"error": "Unknown scope."}, status=400)
+        if compression not in available_compressions():
+            return JsonResponse({"error": "Unsupported compression."}, status=400)
+
+        try:
+            job = enqueue_export(scope, value, compression, user=request.user)
+        except (Category.DoesNotExist, Tag.DoesNotExist):
+            return JsonResponse({"error": "Not found."}, status=404)
+        return JsonResponse(export_job_data(job), status=200 if job.file else 202)
+
+
+def export_job_data(job):
+    return {
+        "id": job.id,
+        "status": job.status,
+        "status_url": job.get_absolute_url(),
+        "download_url": job.file.url if job.status == "done" else None,
+        "expires_at": job.expires_at.isoformat() if job.expires_at else None,
+    }
+
+
+def export_job_status(request, pk):
+    if not request.user.is_authenticated:
+        raise PermissionDenied
+    jobs = ExportJob.objects.all() if request.user.is_staff else ExportJob.objects.filter(requested_by=request.user)
+    job = get_object_or_404(jobs, pk=pk)
+    return JsonResponse(export_job_data(job))
 
 
 class ReportDetailView(CreateView):
@@ -561,8 +474,40 @@ class ReportDetailView(CreateView):
             "stackbase:question-detail", kwargs={"pk": self.kwargs["pk"]}
         )
 
+LEADERBOARD_PER_PAGE = 50
+
+
+def leaderboard_page(request):
+    try:
+        return max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        return 1
+
+
+def leaderboard_context(page, entries, my_rank=None):
+    return {
+        "entries": entries,
+        "page": page,
+        "previous_page": page - 1 if page > 1 else None,
+        "next_page": page + 1 if len(entries) == LEADERBOARD_PER_PAGE else None,
+        "my_rank": my_rank,
+    }
+
+
+@replica_view
 def leaderboard(request):
-    # Get user profiles ordered by score in descending order
-    profiles = Profile.objects.annotate(rank=F('score')).order_by('-score')
+    # Served from the cached leaderboard, see stackusers.leaderboard
+    page = leaderboard_page(request)
+    entries = ranking.get_page(page, LEADERBOARD_PER_PAGE)
+    my_rank = None
+    if request.user.is_authenticated:
+        my_rank = ranking.get_rank(request.user.id)
+
+    return render(request, 'stackbase/chart.html', leaderboard_context(page, entries, my_rank))
+
 
-    return render(request, 'stackbase/chart.html', {'profiles': profiles})
\ No newline at end of file
+def metrics(request):
+    # Profiling figures of this process only, see stackbase.instrumentation
+    if not (settings.DEBUG or request.user.is_staff):
+        raise PermissionDenied
+    return JsonResponse({"views": instrumentation.snapshot()})
@@ -47,11 +47,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'stackbase.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'stackbase.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,7 +62,8 @@ ROOT_URLCONF = 'stackprj.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing renders for stackbase.instrumentation
+        'BACKEND': 'stackbase.instrumentation.InstrumentedTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -76,17 +79,145 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'stackprj.wsgi.application'
 
+# Per-request queries and timings (Server-Timing header, /_metrics), see
+# stackbase.instrumentation. A view running more queries than its budget
+# logs a warning, or fails the test under the TEST_RUNNER below, which turns
+# QUERY_BUDGET_STRICT on. The budgets include the session and user lookups
+# of a logged-in request.
+INSTRUMENTATION_ENABLED = True
+QUERY_BUDGETS = {
+    'stackbase:question-lists': 4,
+    'stackbase:tag-question-lists': 4,
+    'stackbase:category-question-lists': 4,
+    'stackbase:question-detail': 5,
+    'stackbase:get_tags': 4,
+    'stackbase:leaderboard': 6,
+}
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'stackbase.testing.StrictQueryBudgetRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# DB_ENGINE picks the database: sqlite (default) or postgres, configured
+# with DB_NAME, DB_USER, DB_PASSWORD, DB_HOST and DB_PORT.
+#
+# PostgreSQL connections are kept open for CONN_MAX_AGE seconds and checked
+# before reuse. Django 4.2 has no built-in pool: run PgBouncer in
+# transaction mode in front of the server, point DB_HOST/DB_PORT at it and
+# set DB_PGBOUNCER=1, which turns off server-side cursors (they don't
+# survive transaction pooling; the CSV exports use .iterator()).
+#
+# SQLite gets the pragmas in SQLITE_PRAGMAS on every new connection
+# (stackbase.database): busy_timeout makes writers wait instead of failing
+# with "database is locked". SQLITE_WAL=1 also switches the database file to
+# WAL, which lets readers run alongside the single writer. That setting is
+# stored in the file itself, so only set it for the serving processes (not
+# for a checkout's db.sqlite3 used by manage.py commands); test and
+# in-memory databases are never switched.
+#
+# A read replica (DB_REPLICA_NAME for SQLite, DB_REPLICA_HOST for
+# PostgreSQL) serves the list, search, detail, export and leaderboard reads,
+# see stackbase.routers. Without one the "replica" alias is just the primary
+# and READ_REPLICA is off.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+
+def database_config():
+    if DB_ENGINE == 'postgres':
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'stackprj'),
+            'USER': os.environ.get('DB_USER', 'stackprj'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_PGBOUNCER') == '1',
+        }
+    return {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            # Seconds the driver waits for a lock before raising
+            'timeout': 20,
+        },
+    }
+
+
+def replica_config():
+    config = database_config()
+    if DB_ENGINE == 'postgres':
+        config['HOST'] = os.environ.get('DB_REPLICA_HOST', config['HOST'])
+        config['PORT'] = os.environ.get('DB_REPLICA_PORT', config['PORT'])
+    else:
+        config['NAME'] = os.environ.get('DB_REPLICA_NAME', config['NAME'])
+    return config
+
+
+DATABASES = {
+    'default': database_config(),
+    'replica': replica_config(),
+}
+DATABASE_ROUTERS = ['stackbase.routers.ReplicaRouter']
+
+READ_REPLICA = bool(os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'))
+# How long a client reads from the primary after a POST
+REPLICA_STICKY_SECONDS = 10
+
+SQLITE_WAL = os.environ.get('SQLITE_WAL') == '1'
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,  # ms
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+
+# Caches
+# CACHE_BACKEND picks the backend for both aliases: locmem (default, also
+# used by the tests), file, or redis. "pages" holds the anonymous page cache
+# (stackbase.caching), "default" everything else, e.g. the leaderboard.
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION')
+
+
+def cache_config(alias):
+    if CACHE_BACKEND == 'redis':
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_LOCATION or 'redis://127.0.0.1:6379',
+            'KEY_PREFIX': alias,
+        }
+    if CACHE_BACKEND == 'file':
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(CACHE_LOCATION or os.path.join(BASE_DIR, 'cache'), alias),
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': alias,
     }
+
+
+CACHES = {
+    'default': cache_config('default'),
+    'pages': cache_config('pages'),
 }
 
+# Serve the read-heavy pages from stackbase.async_views; asgi.py turns it on
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS') == '1'
+
+# Queue likes for the flush_likes command instead of applying them in the
+# request (stackbase.likes)
+LIKES_WRITE_BEHIND = os.environ.get('LIKES_WRITE_BEHIND') == '1'
+
+# Anonymous page cache, see stackbase.caching
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_TIMEOUT = 60 * 15
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -145,4 +276,23 @@ LOGIN_REDIRECT_URL = 'stackbase:home'
 
 LOGIN_URL = 'login'
 
-CRISPY_TEMPLATE_PACK = 'bootstrap4'
\ No newline at end of file
+CRISPY_TEMPLATE_PACK = 'bootstrap4'
+
+# Background exports: finished files are reused for this many seconds
+EXPORT_JOB_TTL = 60 * 60 * 24
+# A running job whose worker has not checked in for this many seconds is
+# requeued, or failed once it has been claimed EXPORT_JOB_MAX_ATTEMPTS times
+EXPORT_JOB_CLAIM_TIMEOUT = 60 * 10
+EXPORT_JOB_MAX_ATTEMPTS = 3
+
+# How often each process re-reads the blocked word list (stackbase.moderation)
+MODERATION_RELOAD_SECONDS = 60
+# How long the category -> tags version lives in the cache
+# (stackbase.taxonomy); with locmem, how long other processes serve old tags
+TAXONOMY_RELOAD_SECONDS = 300
+
+# Cached leaderboard (stackusers.leaderboard): ranks kept materialized, and
+# seconds before the cached copy is rebuilt from the database. With more than
+# one process it needs CACHE_BACKEND=redis, see the module docstring.
+LEADERBOARD_SIZE = 100
+LEADERBOARD_TIMEOUT = 600
@@ -0,0 +1,59 @@
+# stackusers/avatars.py
+"""Resized avatar variants.
+
+Variants are written once, when a new picture is uploaded, and the templates
+link to them directly, so saving a profile for any other reason (score
+changes, logins) never touches the image files.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, features
+
+# field name on Profile -> longest side in pixels
+AVATAR_SIZES = {
+    'avatar_medium': 300,
+    'avatar_small': 64,
+}
+
+if features.check('webp'):
+    AVATAR_FORMAT, AVATAR_EXT = 'WEBP', 'webp'
+else:
+    AVATAR_FORMAT, AVATAR_EXT = 'JPEG', 'jpg'
+
+
+def _render(img, size):
+    variant = img.copy()
+    variant.thumbnail((size, size))
+    buffer = BytesIO()
+    variant.save(buffer, AVATAR_FORMAT, quality=85)
+    return ContentFile(buffer.getvalue())
+
+
+def build_variants(profile):
+    """Write every size in AVATAR_SIZES for ``profile.image``.
+
+    Works on freshly uploaded (not yet committed) files as well as stored
+    ones. The old variants are deleted; nothing is saved to the database.
+    """
+    profile.image.open()
+    profile.image.seek(0)
+    with Image.open(profile.image) as img:
+        img.load()
+        if img.mode not in ('RGB', 'RGBA') or AVATAR_FORMAT == 'JPEG':
+            img = img.convert('RGB')
+        stem = os.path.splitext(os.path.basename(profile.image.name))[0]
+        for field_name, size in AVATAR_SIZES.items():
+            variant = getattr(profile, field_name)
+            if variant:
+                variant.delete(save=False)
+            variant.save(f'{stem}_{size}.{AVATAR_EXT}', _render(img, size), save=False)
+    profile.image.seek(0)
+
+
+def clear_variants(profile):
+    for field_name in AVATAR_SIZES:
+        variant = getattr(profile, field_name)
+        if variant:
+            variant.delete(save=False)
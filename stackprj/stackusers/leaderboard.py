@@ -0,0 +1,189 @@
+# stackusers/leaderboard.py
+"""Materialized leaderboard kept in the Django cache.
+
+The cache holds the best ``LEADERBOARD_SIZE * 2`` profiles as a list of
+``(-score, user_id, username)`` tuples sorted with ``bisect``, plus a
+``user_id -> score`` map. ``stackusers.scoring`` reports every user whose
+score changed, and their entries are moved in place (O(log n) to find, cheap
+list insert) instead of re-sorting the profile table, so rendering the
+leaderboard reads one cache entry. The moved users' scores and names are
+read back from the database (one query) rather than adding the delta to the
+cached score, which would count it twice if the board was rebuilt after the
+change was committed; renames refresh the same way.
+
+The list is always the exact top-k for its own length k: a profile that
+falls to the bottom edge is dropped when unknown profiles might beat it,
+and the list is rebuilt from the database (one query) once it gets shorter
+than ``LEADERBOARD_SIZE``, when it expires, or with ``rebuild_leaderboard``.
+
+Updates are read-modify-write on one cache entry, so they run under a lock
+taken with ``cache.add``. An update that finds the lock held drops the board
+instead of waiting, and marks it dirty so the holder doesn't store a board
+that misses the update; the next read rebuilds it from the database. The
+lock only works across processes with a shared cache backend that has an
+atomic ``add`` (``CACHE_BACKEND=redis``): with locmem every process keeps
+its own board, which goes stale with other processes' updates until it
+expires.
+"""
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Profile
+
+CACHE_KEY = 'leaderboard'
+LOCK_KEY = 'leaderboard:lock'
+DIRTY_KEY = 'leaderboard:dirty'
+# Seconds before a lock left by a crashed process is ignored
+LOCK_TIMEOUT = 30
+
+
+@dataclass
+class Entry:
+    rank: int
+    user_id: int
+    username: str
+    score: int
+
+
+def size():
+    return getattr(settings, 'LEADERBOARD_SIZE', 100)
+
+
+def capacity():
+    return size() * 2
+
+
+def timeout():
+    return getattr(settings, 'LEADERBOARD_TIMEOUT', 600)
+
+
+@contextmanager
+def _lock():
+    """Yield whether this process may write the board."""
+    if not cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+        # Somebody else is writing it: make sure their copy doesn't stick
+        cache.set(DIRTY_KEY, True, LOCK_TIMEOUT)
+        invalidate()
+        yield False
+        return
+    cache.delete(DIRTY_KEY)
+    try:
+        yield True
+        if cache.get(DIRTY_KEY):
+            invalidate()
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _load():
+    rows = (
+        Profile.objects.order_by('-score', 'user_id')
+        .values_list('score', 'user_id', 'user__username')[:capacity()]
+    )
+    entries = [(-score, user_id, username) for score, user_id, username in rows]
+    return {
+        'entries': entries,
+        'scores': {user_id: -neg for neg, user_id, _ in entries},
+        # Every profile is on the board, nobody unknown can overtake
+        'complete': len(entries) < capacity(),
+    }
+
+
+def rebuild():
+    with _lock() as locked:
+        board = _load()
+        if locked:
+            cache.set(CACHE_KEY, board, timeout())
+    return board
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
+
+
+def get_board():
+    board = cache.get(CACHE_KEY)
+    if board is None:
+        board = rebuild()
+    return board
+
+
+def _remove(board, user_id):
+    score = board['scores'].pop(user_id)
+    entries = board['entries']
+    del entries[bisect_left(entries, (-score, user_id))]
+
+
+def _place(board, user_id, username, score):
+    entries = board['entries']
+    key = (-score, user_id, username)
+    if not board['complete'] and entries and key > entries[-1]:
+        return  # somebody not on the board might rank higher
+    insort(entries, key)
+    board['scores'][user_id] = score
+    if len(entries) > capacity():
+        _, dropped, _ = entries.pop()
+        del board['scores'][dropped]
+        board['complete'] = False
+
+
+def refresh(user_ids):
+    """Move the users ``user_ids`` on the board to their current scores."""
+    with _lock() as locked:
+        if locked:
+            _refresh(user_ids)
+
+
+def _refresh(user_ids):
+    board = cache.get(CACHE_KEY)
+    if board is None:
+        return  # the next read rebuilds it
+
+    rows = Profile.objects.filter(user_id__in=user_ids).values_list('score', 'user_id', 'user__username')
+    for user_id in user_ids:
+        if user_id in board['scores']:
+            _remove(board, user_id)
+    for score, user_id, username in rows:
+        # Users off the board are only placed if they now beat its bottom
+        _place(board, user_id, username, score)
+
+    if len(board['entries']) < size() and not board['complete']:
+        invalidate()
+    else:
+        cache.set(CACHE_KEY, board, timeout())
+
+
+def get_page(page=1, per_page=50):
+    """Entries ranked ``(page - 1) * per_page + 1`` onwards."""
+    start = (page - 1) * per_page
+    board = get_board()
+    entries = board['entries']
+    if start + per_page <= len(entries) or board['complete']:
+        rows = entries[start:start + per_page]
+        return [Entry(start + i + 1, user_id, username, -neg) for i, (neg, user_id, username) in enumerate(rows)]
+
+    # Past the materialized top; fall back to the score index
+    rows = (
+        Profile.objects.order_by('-score', 'user_id')
+        .values_list('user_id', 'user__username', 'score')[start:start + per_page]
+    )
+    return [Entry(start + i + 1, *row) for i, row in enumerate(rows)]
+
+
+def get_rank(user_id):
+    """1-based rank of ``user_id``, or None without a profile."""
+    board = get_board()
+    score = board['scores'].get(user_id)
+    if score is not None:
+        return bisect_left(board['entries'], (-score, user_id)) + 1
+
+    score = Profile.objects.filter(user_id=user_id).values_list('score', flat=True).first()
+    if score is None:
+        return None
+    ahead = Profile.objects.filter(Q(score__gt=score) | Q(score=score, user_id__lt=user_id))
+    return ahead.count() + 1
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from stackusers import avatars
+from stackusers.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Write the resized avatar variants for profiles uploaded before they existed."
+
+    def handle(self, *args, **options):
+        default = Profile._meta.get_field("image").default
+        profiles = Profile.objects.exclude(image=default).filter(avatar_medium="")
+        built = 0
+        for profile in profiles.iterator():
+            avatars.build_variants(profile)
+            profile.save(update_fields=list(avatars.AVATAR_SIZES))
+            built += 1
+        self.stdout.write(self.style.SUCCESS(f"Built avatars for {built} profiles."))
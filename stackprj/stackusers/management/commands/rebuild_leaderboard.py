@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from stackusers import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Rebuild the cached leaderboard from profile scores."
+
+    def handle(self, *args, **options):
+        board = leaderboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Leaderboard rebuilt with {len(board['entries'])} entries."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from stackusers.scoring import recompute_scores
+
+
+class Command(BaseCommand):
+    help = "Recompute every profile score from questions, answers and likes."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = recompute_scores()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt scores for {updated} profiles."))
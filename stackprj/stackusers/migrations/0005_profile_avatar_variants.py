@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stackusers', '0004_profile_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_medium',
+            field=models.ImageField(blank=True, editable=False, upload_to='profile_pic/variants'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_small',
+            field=models.ImageField(blank=True, editable=False, upload_to='profile_pic/variants'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stackusers", "0005_profile_avatar_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="profile",
+            name="score",
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+    ]
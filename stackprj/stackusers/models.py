@@ -1,39 +1,62 @@
 # stackusers/models.py
 from django.db import models
 from django.contrib.auth.models import User
-from PIL import Image
 from django.utils import timezone
-from stackbase.models import Comment, Question  # Import the models from the stackbase app
+from . import avatars
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.CharField(max_length=1000)
     phone = models.IntegerField(null=True, blank=True)
     image = models.ImageField(default='default.jpg', upload_to="profile_pic")
-    score = models.PositiveIntegerField(default=0)  # New field for the score
+    score = models.PositiveIntegerField(default=0, db_index=True)  # New field for the score
+    # Resized copies of image, written by stackusers.avatars when it changes
+    avatar_medium = models.ImageField(upload_to="profile_pic/variants", blank=True, editable=False)
+    avatar_small = models.ImageField(upload_to="profile_pic/variants", blank=True, editable=False)
 
     def __str__(self):
         return f'{self.user.username} - Profile'
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        img = Image.open(self.image.path)
-        if img.height > 300 or img.width > 300:
-            output_size = (300, 300)
-            img.thumbnail(output_size)
-            img.save(self.image.path)
-
-    def update_score(self):
-        questions_created = Question.objects.filter(user=self.user).count()
-        comments_made = Comment.objects.filter(name=self.user.username).count()
-        questions_liked = self.user.question_post.count()
-        comments_liked = self.user.comment_likes.count()
-
-        total_score = questions_created + comments_made + questions_liked + comments_liked
-        self.score = total_score
-        self.save()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_image_name = instance.__dict__.get('image')
+        return instance
 
+    def image_changed(self):
+        return self.image.name != getattr(self, '_saved_image_name', None)
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            # The score only changes through F() updates (stackusers.scoring),
+            # a copy loaded before them mustn't overwrite it
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'score'
+            ]
+            kwargs['update_fields'] = update_fields
+        if self.image_changed() and (update_fields is None or 'image' in update_fields):
+            if self.image.name == self._meta.get_field('image').default:
+                avatars.clear_variants(self)
+            else:
+                avatars.build_variants(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *avatars.AVATAR_SIZES}
+        super().save(*args, **kwargs)
+        self._saved_image_name = self.image.name
 
+    @property
+    def avatar_url(self):
+        return (self.avatar_medium or self.image).url
 
+    @property
+    def avatar_small_url(self):
+        return (self.avatar_small or self.image).url
 
+    def update_score(self):
+        # Scores are maintained incrementally (see stackusers.scoring); this
+        # recomputes this one profile from scratch.
+        from .scoring import recompute_scores
+        recompute_scores(Profile.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=['score'])
@@ -0,0 +1,98 @@
+# stackusers/scoring.py
+"""Incremental reputation scoring.
+
+A profile's score is the number of questions the user asked, plus the
+answers they posted, plus the questions and answers they liked. Rather than
+recounting all four every time something happens, the signal handlers in
+``stackusers.signals`` (and ``stackbase.signals`` for likes) apply +1/-1
+deltas here with ``F()`` expressions, and
+``recompute_scores`` rebuilds every score from scratch in one UPDATE (see the
+``rebuild_scores`` management command).
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count
+
+from stackbase.counters import add, count_rows
+from stackbase.models import Comment, Question
+from . import leaderboard
+from .models import Profile
+
+
+def apply_deltas(deltas):
+    """Add ``deltas[user_id]`` to each user's score, never below zero."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    add(Profile, "score", deltas, key="user_id")
+    if deltas:
+        transaction.on_commit(lambda: leaderboard.refresh(list(deltas)))
+
+
+def add_to_users(user_ids, delta=1):
+    """Apply ``delta`` once per occurrence of a user id in ``user_ids``."""
+    apply_deltas({user_id: count * delta for user_id, count in Counter(user_ids).items()})
+
+
+def question_created(question):
+    apply_deltas({question.user_id: 1})
+
+
+def question_deleted(question):
+    # The question's comments are deleted by cascade and handled one by one
+    # through comment_deleted(); here we only take back the owner's point and
+    # the points of everybody who liked the question.
+    likers = question.likes.through.objects.filter(question_id=question.pk)
+    add_to_users([question.user_id], -1)
+    add_to_users(likers.values_list("user_id", flat=True), -1)
+
+
+def comment_added(comment):
+    if comment.author_id is not None:
+        apply_deltas({comment.author_id: 1})
+
+
+def comment_deleted(comment):
+    likers = comment.likes.through.objects.filter(comment_id=comment.pk)
+    user_ids = list(likers.values_list("user_id", flat=True))
+    if comment.author_id is not None:
+        user_ids.append(comment.author_id)
+    add_to_users(user_ids, -1)
+
+
+def questions_deleted(question_ids):
+    """Take back every point the questions, their answers and all their
+    likes gave, as question_deleted() and comment_deleted() would one by one
+    (see stackbase.deletion)."""
+    points = [
+        Question.objects.filter(pk__in=question_ids).values_list("user_id"),
+        Comment.objects.filter(question__in=question_ids, author__isnull=False).values_list("author_id"),
+        Question.likes.through.objects.filter(question__in=question_ids).values_list("user_id"),
+        Comment.likes.through.objects.filter(comment__question__in=question_ids).values_list("user_id"),
+    ]
+    grouped = [rows.annotate(points=Count("*")).order_by() for rows in points]
+    deltas = Counter()
+    for user_id, count in grouped[0].union(*grouped[1:], all=True):
+        deltas[user_id] -= count
+    apply_deltas(deltas)
+
+
+def likes_changed(instance, reverse, pk_set, delta):
+    if reverse:
+        # instance is the user, pk_set holds the questions/comments
+        apply_deltas({instance.pk: delta * len(pk_set)})
+    else:
+        add_to_users(pk_set, delta)
+
+
+def recompute_scores(profiles=None):
+    """Rebuild scores from the source tables in a single set-based UPDATE."""
+    if profiles is None:
+        profiles = Profile.objects.all()
+
+    transaction.on_commit(leaderboard.invalidate)
+    return profiles.update(
+        score=count_rows(Question.objects.all(), "user", outer="user_id")
+        + count_rows(Comment.objects.all(), "author", outer="user_id")
+        + count_rows(Question.likes.through.objects.all(), "user", outer="user_id")
+        + count_rows(Comment.likes.through.objects.all(), "user", outer="user_id")
+    )
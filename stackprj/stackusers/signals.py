@@ -1,13 +1,59 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
+from stackbase.deletion import in_bulk_delete
+from stackbase.models import Question, Comment
 from .models import Profile
+from . import leaderboard, scoring
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
-        
+
+@receiver(post_save, sender=User)
+def save_profile(sender, instance, update_fields=None, **kwargs):
+    # Partial saves such as the last_login update at login don't touch the profile
+    if update_fields is None:
+        instance.profile.save()
+
+
+# New and deleted profiles reshuffle the bottom of the leaderboard
+@receiver(post_save, sender=Profile)
+def leaderboard_profile_saved(sender, instance, created, **kwargs):
+    if created:
+        leaderboard.invalidate()
+
+@receiver(post_delete, sender=Profile)
+def leaderboard_profile_deleted(sender, instance, **kwargs):
+    leaderboard.invalidate()
+
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+def leaderboard_user_renamed(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'username' in update_fields):
+        transaction.on_commit(lambda: leaderboard.refresh([instance.pk]))
+
+
+# Reputation: keep Profile.score up to date with +1/-1 deltas
+@receiver(post_save, sender=Question)
+def score_question_created(sender, instance, created, **kwargs):
+    if created:
+        scoring.question_created(instance)
+
+@receiver(pre_delete, sender=Question)
+def score_question_deleted(sender, instance, **kwargs):
+    if not in_bulk_delete():
+        scoring.question_deleted(instance)
+
+@receiver(post_save, sender=Comment)
+def score_comment_added(sender, instance, created, **kwargs):
+    if created:
+        scoring.comment_added(instance)
+
+@receiver(pre_delete, sender=Comment)
+def score_comment_deleted(sender, instance, **kwargs):
+    if not in_bulk_delete():
+        scoring.comment_deleted(instance)
+
+# Likes are scored by stackbase.signals.count_likes, with the like counters
@@ -1,3 +1,244 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from stackbase.models import Comment, Question
+from . import avatars, leaderboard, scoring
+from .models import Profile
+
+
+class ScoringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f"user{i}") for i in range(3)]
+
+    def scores(self):
+        return list(
+            Profile.objects.filter(user__in=self.users).order_by("user_id").values_list("score", flat=True)
+        )
+
+    def ask(self, user, title="A question"):
+        return Question.objects.create(user=user, title=title, content="<p>Content</p>")
+
+    def answer(self, question, user):
+        return Comment.objects.create(question=question, author=user, name=user.username, content="An answer")
+
+    def test_questions_and_answers(self):
+        question = self.ask(self.users[0])
+        comment = self.answer(question, self.users[1])
+        self.answer(question, self.users[1])
+        self.assertEqual(self.scores(), [1, 2, 0])
+        comment.delete()
+        self.assertEqual(self.scores(), [1, 1, 0])
+        # The answers go with the question
+        question.delete()
+        self.assertEqual(self.scores(), [0, 0, 0])
+
+    def test_likes(self):
+        question = self.ask(self.users[0])
+        comment = self.answer(question, self.users[0])
+        question.likes.add(self.users[1], self.users[2])
+        comment.likes.add(self.users[1])
+        self.assertEqual(self.scores(), [2, 2, 1])
+        # Unliking what was never liked counts for nothing
+        comment.likes.remove(self.users[1], self.users[2])
+        self.assertEqual(self.scores(), [2, 1, 1])
+        question.likes.clear()
+        self.assertEqual(self.scores(), [2, 0, 0])
+
+    def test_likes_from_the_user_side(self):
+        questions = [self.ask(self.users[0], f"Question {i}") for i in range(3)]
+        self.users[1].question_post.add(*questions)
+        self.assertEqual(self.scores(), [3, 3, 0])
+        self.users[1].question_post.remove(questions[0], questions[0])
+        self.assertEqual(self.scores(), [3, 2, 0])
+        self.users[1].question_post.clear()
+        self.assertEqual(self.scores(), [3, 0, 0])
+
+    def test_deleting_liked_content(self):
+        question = self.ask(self.users[0])
+        comment = self.answer(question, self.users[1])
+        question.likes.add(self.users[2])
+        comment.likes.add(self.users[2])
+        self.assertEqual(self.scores(), [1, 1, 2])
+        question.delete()
+        self.assertEqual(self.scores(), [0, 0, 0])
+
+    def test_never_below_zero(self):
+        question = self.ask(self.users[0])
+        Profile.objects.filter(user=self.users[0]).update(score=0)
+        question.delete()
+        self.assertEqual(self.scores(), [0, 0, 0])
+
+    def test_profile_saves_keep_the_score(self):
+        profile = Profile.objects.get(user=self.users[0])
+        self.ask(self.users[0])
+        profile.bio = "Loaded before the question"
+        profile.save()
+        self.users[0].save()
+        self.assertEqual(self.scores(), [1, 0, 0])
+
+    def test_recompute_matches_increments(self):
+        questions = [self.ask(user, f"Asked by {user}") for user in self.users]
+        comments = [self.answer(question, user) for question in questions for user in self.users[1:]]
+        questions[0].likes.add(*self.users)
+        comments[0].likes.add(self.users[0], self.users[2])
+        self.users[2].question_post.remove(questions[0])
+        comments[-1].delete()
+        incremental = self.scores()
+
+        Profile.objects.update(score=42)
+        self.assertEqual(scoring.recompute_scores(), len(self.users))
+        self.assertEqual(self.scores(), incremental)
+        Profile.objects.update(score=0)
+        call_command("rebuild_scores", stdout=StringIO())
+        self.assertEqual(self.scores(), incremental)
+
+
+@override_settings(LEADERBOARD_SIZE=2)
+class LeaderboardTests(TestCase):
+    # Capacity 4: the other users are only ranked from the database
+    SCORES = [5, 9, 7, 7, 1, 3]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f"user{i}") for i in range(len(cls.SCORES))]
+        for user, score in zip(cls.users, cls.SCORES):
+            Profile.objects.filter(user=user).update(score=score)
+
+    def setUp(self):
+        cache.clear()
+
+    def expected(self):
+        rows = Profile.objects.order_by("-score", "user_id").values_list("user_id", "score")
+        return [(rank, user_id, score) for rank, (user_id, score) in enumerate(rows, 1)]
+
+    def ranked(self, entries):
+        return [(entry.rank, entry.user_id, entry.score) for entry in entries]
+
+    def test_pages(self):
+        pages = [leaderboard.get_page(page, per_page=3) for page in (1, 2, 3)]
+        self.assertEqual(self.ranked(pages[0] + pages[1]), self.expected())
+        self.assertEqual(pages[2], [])
+        # Ties are broken by user id
+        self.assertEqual([entry.user_id for entry in pages[0][1:]], [self.users[2].pk, self.users[3].pk])
+
+    def test_get_rank(self):
+        for rank, user_id, _ in self.expected():
+            self.assertEqual(leaderboard.get_rank(user_id), rank)
+        self.assertIsNone(leaderboard.get_rank(0))
+
+    def test_deltas_move_the_cached_board(self):
+        leaderboard.get_board()
+        with self.captureOnCommitCallbacks(execute=True):
+            # From the bottom onto the board, and off it
+            scoring.apply_deltas({self.users[4].pk: 10, self.users[0].pk: -5})
+        board = cache.get(leaderboard.CACHE_KEY)
+        self.assertIsNotNone(board)
+        self.assertEqual(board["entries"], leaderboard._load()["entries"])
+        self.assertEqual(self.ranked(leaderboard.get_page(1, per_page=6)), self.expected())
+
+    def test_board_rebuilt_before_the_commit(self):
+        leaderboard.get_board()
+        with self.captureOnCommitCallbacks(execute=True):
+            scoring.apply_deltas({self.users[5].pk: 10})
+            # A read rebuilds the board with the new score before the update lands
+            leaderboard.invalidate()
+            leaderboard.get_board()
+        self.assertEqual(cache.get(leaderboard.CACHE_KEY)["scores"][self.users[5].pk], 13)
+        self.assertEqual(self.ranked(leaderboard.get_page(1, per_page=6)), self.expected())
+
+    def test_renames_show_up(self):
+        leaderboard.get_board()
+        user = self.users[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            user.username = "renamed"
+            user.save()
+        self.assertEqual(leaderboard.get_page(1, per_page=1)[0].username, "renamed")
+        self.assertIsNotNone(cache.get(leaderboard.CACHE_KEY))
+
+    def test_busy_lock_drops_the_board(self):
+        leaderboard.get_board()
+        with leaderboard._lock() as locked:
+            self.assertTrue(locked)
+            # Another process updates while this one holds the lock
+            with self.captureOnCommitCallbacks(execute=True):
+                scoring.apply_deltas({self.users[5].pk: 10})
+            self.assertIsNone(cache.get(leaderboard.CACHE_KEY))
+            # A rebuild meanwhile is served but not stored
+            self.assertEqual(leaderboard.get_board()["entries"][0][1], self.users[5].pk)
+            self.assertIsNone(cache.get(leaderboard.CACHE_KEY))
+            cache.set(leaderboard.CACHE_KEY, {"entries": [], "scores": {}, "complete": True})
+        # The holder's own write doesn't stick either
+        self.assertIsNone(cache.get(leaderboard.CACHE_KEY))
+        self.assertEqual(self.ranked(leaderboard.get_page(1, per_page=6)), self.expected())
+
+
+class AvatarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="pictured", password="pw")
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.profile = Profile.objects.get(user=self.user)
+
+    def upload(self, name, size=(500, 400)):
+        buffer = BytesIO()
+        Image.new("RGB", size, "teal").save(buffer, "PNG")
+        self.profile.image = SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+        self.profile.save()
+
+    def variant_paths(self):
+        return [getattr(self.profile, name).path for name in avatars.AVATAR_SIZES]
+
+    def test_variants_built_on_upload(self):
+        self.upload("me.png")
+        for name, size in avatars.AVATAR_SIZES.items():
+            with Image.open(getattr(self.profile, name).path) as img:
+                self.assertEqual(max(img.size), size)
+        self.assertTrue(self.profile.avatar_small_url.endswith(f"_64.{avatars.AVATAR_EXT}"))
+
+    def test_other_saves_skip_the_image(self):
+        self.upload("me.png")
+        profile = Profile.objects.get(pk=self.profile.pk)
+        with mock.patch.object(avatars, "build_variants") as build, mock.patch.object(avatars, "clear_variants") as clear:
+            profile.bio = "Hello"
+            profile.save()
+            self.user.first_name = "Pic"
+            self.user.save()
+            Profile.objects.get(pk=profile.pk).save(update_fields=["score"])
+        build.assert_not_called()
+        clear.assert_not_called()
+
+    def test_login_does_not_save_the_profile(self):
+        with mock.patch.object(Profile, "save") as save:
+            self.assertTrue(self.client.login(username="pictured", password="pw"))
+        save.assert_not_called()
+
+    def test_new_image_replaces_variants(self):
+        self.upload("me.png")
+        old = self.variant_paths()
+        self.upload("me-too.png", size=(200, 200))
+        self.assertFalse(any(os.path.exists(path) for path in old))
+        self.assertTrue(all(os.path.exists(path) for path in self.variant_paths()))
+
+    def test_default_image_clears_variants(self):
+        self.upload("me.png")
+        old = self.variant_paths()
+        self.profile.image = Profile._meta.get_field("image").default
+        self.profile.save()
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.avatar_medium or self.profile.avatar_small)
+        self.assertFalse(any(os.path.exists(path) for path in old))
+        self.assertTrue(self.profile.avatar_url.endswith("default.jpg"))